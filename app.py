@@ -1,184 +1,309 @@
+from contextlib import nullcontext
+
 import streamlit as st
-from PIL import Image
-from io import BytesIO
 
-# Import your custom components and utility functions
-from components.image_cropper import image_cropper_component
-from components.color_selector import color_selector_component
-from components.hsv_filter_ui import hsv_filter_component
-from components.hold_segmentation_viewer import hold_segmentation_viewer_component
-from utils.image_processing import apply_hsv_filter, find_fastest_route, visualize_route # Adicionado find_fastest_route, visualize_route
-from streamlit_image_coordinates import streamlit_image_coordinates
+# Only light modules are imported up front: the upload screen is drawn before
+# OpenCV, NumPy, PIL and the image components are loaded (see below)
+from components.profiler_panel import profiler_panel_component
+from utils.profiling import Profiler, span
 
-MAX_IMAGE_WIDTH = 500 # pixels - adjust as needed
+# Nomes das cores de linha de ROUTE_COLORS, na mesma ordem
+ROUTE_COLOR_NAMES = ["verde", "azul", "laranja", "magenta", "ciano", "amarela"]
 
 st.set_page_config(layout="wide")
-st.title("Quero Beta")
-
-# --- Initialize session state variables ---
-if 'clicks' not in st.session_state:
-    st.session_state.clicks = []
-if 'uploaded_image_info' not in st.session_state:
-    st.session_state.uploaded_image_info = {"name": None, "data": None}
-if 'crop_points' not in st.session_state:
-    st.session_state.crop_points = []
-if 'cropped_image_data' not in st.session_state:
-    st.session_state.cropped_image_data = None
-if 'selected_color_rgb' not in st.session_state:
-    st.session_state.selected_color_rgb = None
-if 'selected_color_hsv' not in st.session_state:
-    st.session_state.selected_color_hsv = None
-if 'hsv_tolerances' not in st.session_state:
-    st.session_state.hsv_tolerances = {'H': 4, 'S': 100, 'V': 100}
-if 'erosion_iterations' not in st.session_state:
-    st.session_state.erosion_iterations = 0
-if 'dilation_iterations' not in st.session_state:
-    st.session_state.dilation_iterations = 0
-if 'detected_holds_components' not in st.session_state:
-    st.session_state.detected_holds_components = None
-if 'initial_holds' not in st.session_state:
-    st.session_state.initial_holds = []
-if 'final_hold' not in st.session_state:
-    st.session_state.final_hold = None
-
-# --- File Uploader ---
-uploaded_file = st.file_uploader("Escolha uma imagem...", type=["jpg", "jpeg", "png", "gif"])
-
-if uploaded_file is not None:
-    # Check if a new file is uploaded or if the file has changed
-    if st.session_state.uploaded_image_info["name"] != uploaded_file.name:
-        st.session_state.uploaded_image_info["name"] = uploaded_file.name
-        st.session_state.uploaded_image_info["data"] = uploaded_file.getvalue()
-        # Reset all relevant states for a new image
+
+# --- Desempenho por etapa (opcional) ---
+# Com o painel desligado nenhum profiler é ativado e os spans das etapas não medem nada
+profiler = None
+if st.session_state.get("show_profile"):
+    if 'profiler' not in st.session_state:
+        st.session_state.profiler = Profiler()
+    profiler = st.session_state.profiler
+    profiler.allocations = st.session_state.get("profile_allocations", False)
+
+# A execução é registrada até o fim do script, e encerrada mesmo quando interrompida
+# (st.rerun, st.stop ou erro): nenhuma execução fica aberta entre os reruns
+with profiler.session() if profiler is not None else nullcontext():
+    st.title("Quero Beta")
+
+    # --- Initialize session state variables ---
+    if 'clicks' not in st.session_state:
         st.session_state.clicks = []
+    if 'uploaded_image_info' not in st.session_state:
+        st.session_state.uploaded_image_info = {"name": None}
+    if 'crop_points' not in st.session_state:
         st.session_state.crop_points = []
-        st.session_state.cropped_image_data = None
+    if 'selected_color_rgb' not in st.session_state:
         st.session_state.selected_color_rgb = None
+    if 'selected_color_hsv' not in st.session_state:
         st.session_state.selected_color_hsv = None
-        st.session_state.hsv_tolerances = {'H': 4, 'S': 100, 'V': 100} # Reset tolerances
+    if 'hsv_tolerances' not in st.session_state:
+        st.session_state.hsv_tolerances = {'H': 4, 'S': 100, 'V': 100}
+    if 'erosion_iterations' not in st.session_state:
         st.session_state.erosion_iterations = 0
+    if 'dilation_iterations' not in st.session_state:
         st.session_state.dilation_iterations = 0
-        st.session_state.detected_holds_components = None # Reset detected holds
+    if 'holds_requested' not in st.session_state:
+        st.session_state.holds_requested = False
+    if 'routes_requested' not in st.session_state:
+        st.session_state.routes_requested = False
+    if 'initial_holds' not in st.session_state:
         st.session_state.initial_holds = []
+    if 'final_hold' not in st.session_state:
         st.session_state.final_hold = None
-        st.rerun()
-
-    # Load original image from session state data
-    original_image = Image.open(BytesIO(st.session_state.uploaded_image_info["data"]))
-
-    # --- 1. Image Cropping Section ---
-    st.subheader("1. Cortar Retângulo da Imagem")
-    current_cropped_image_pil = image_cropper_component(original_image)
-
-    if current_cropped_image_pil is not None:
-        st.image(current_cropped_image_pil, caption="Imagem Cortada")
-
-        # --- 2. Select Color from Cropped Image ---
-        st.subheader("2. Selecionar Cor")
-        color_selector_component(current_cropped_image_pil)
-
-        # Variáveis para armazenar a imagem filtrada e a máscara binária
-        filtered_image_np_rgb = None
-        binary_mask_np = None
-
-        if st.session_state.selected_color_hsv:
-            # --- 3. Filtro HSV ---
-            st.subheader("3. Ajustar Filtro HSV")
-            # hsv_filter_component agora retorna a imagem filtrada E a máscara
-            filtered_image_np_rgb, binary_mask_np = hsv_filter_component(
-                current_cropped_image_pil,
-                st.session_state.selected_color_hsv,
-                MAX_IMAGE_WIDTH
+
+    # --- File Uploader ---
+    uploaded_file = st.file_uploader("Escolha uma imagem...", type=["jpg", "jpeg", "png", "gif"])
+
+    if uploaded_file is not None:
+        # Dependências pesadas: carregadas só depois do primeiro upload (e uma vez por processo)
+        with span("app.import"):
+            from components.image_cropper import image_cropper_component
+            from components.color_selector import color_selector_component
+            from components.hsv_filter_ui import hsv_filter_component
+            from components.hold_segmentation_viewer import hold_segmentation_viewer_component
+            from utils.image_processing import ROUTE_COLORS, routes_layer
+            from utils.pipeline import Pipeline
+            from utils.render_cache import RenderCache
+            from utils.rendering import composite_layer
+            from utils.pyramid import MAX_IMAGE_WIDTH, to_display, to_full_resolution
+            from utils.routing import DEFAULT_REACH_FRACTION, REACH_VARIANTS
+            from streamlit_image_coordinates import streamlit_image_coordinates
+
+        if 'pipeline' not in st.session_state:
+            st.session_state.pipeline = Pipeline()
+        if 'render_cache' not in st.session_state:
+            st.session_state.render_cache = RenderCache()
+        # Decodificação, recorte, filtro, agarras e rotas: cada etapa é refeita apenas quando suas entradas mudam
+        pipeline = st.session_state.pipeline
+
+        # Check if a new file is uploaded or if the file has changed
+        if st.session_state.uploaded_image_info["name"] != uploaded_file.name:
+            st.session_state.uploaded_image_info["name"] = uploaded_file.name
+            # The upload is decoded once per session; every stage reads the same RGB array
+            with span("app.read_upload"):
+                upload_bytes = uploaded_file.getvalue()
+            pipeline.load(uploaded_file.name, upload_bytes)
+            pipeline.reset()
+            # Reset all relevant states for a new image
+            st.session_state.clicks = []
+            st.session_state.crop_points = []
+            st.session_state.selected_color_rgb = None
+            st.session_state.selected_color_hsv = None
+            st.session_state.hsv_tolerances = {'H': 4, 'S': 100, 'V': 100} # Reset tolerances
+            st.session_state.erosion_iterations = 0
+            st.session_state.dilation_iterations = 0
+            st.session_state.holds_requested = False # Reset detected holds
+            st.session_state.routes_requested = False
+            st.session_state.initial_holds = []
+            st.session_state.final_hold = None
+            st.rerun()
+
+        # --- 1. Image Cropping Section ---
+        st.subheader("1. Cortar Retângulo da Imagem")
+        report = pipeline.store.report
+        if report is not None:
+            # Custo da leitura do upload: tempo até a primeira imagem e pico de memória
+            ingest_caption = (
+                f"Imagem {report.full_size[0]}x{report.full_size[1]} lida em {report.first_image_seconds * 1000:.0f} ms"
+                f" (pré-visualização {report.preview_size[0]}x{report.preview_size[1]}"
             )
-        else:
-            st.info("Por favor, selecione uma cor para habilitar o filtro HSV.")
-        
-        # --- 4. Identificação de Agarras (Chamada ao NOVO componente) ---
-        if filtered_image_np_rgb is not None and binary_mask_np is not None:
-            # Passamos a imagem cortada (PIL) e a máscara binária (NumPy)
-            hold_segmentation_viewer_component(current_cropped_image_pil, binary_mask_np, MAX_IMAGE_WIDTH)
-        else:
-            st.info("Aguardando o filtro HSV para identificar as agarras.")
-
-        # --- 5. Cliques Gerais na Imagem Cortada (Opcional - reindexado de 4 para 5) ---
-        st.subheader("5. Seleção de Agarras Iniciais e Final")
-        st.write("Clique nas duas agarras iniciais e uma agarra final (nessa ordem). Limite de 3 cliques.")
-
-        general_click_coords = streamlit_image_coordinates(
-            current_cropped_image_pil,
-            key="cropped_image_for_general_clicks",
-        )
-        if general_click_coords:
-            clicked_x = general_click_coords['x']
-            clicked_y = general_click_coords['y']
-            
-            if len(st.session_state.clicks) < 3:
-                if not st.session_state.clicks or \
-                   (st.session_state.clicks[-1][0] != clicked_x or st.session_state.clicks[-1][1] != clicked_y):
-                    st.session_state.clicks.append((clicked_x, clicked_y))
-                    st.toast(f"Clique registrado: ({clicked_x}, {clicked_y}). Total: {len(st.session_state.clicks)}/3")
-                    if len(st.session_state.clicks) == 3:
-                        # Sort clicks by y-coordinate to identify final hold
-                        sorted_clicks = sorted(st.session_state.clicks, key=lambda p: p[1])
-                        st.session_state.final_hold = sorted_clicks[0] # Highest point (smallest y-coordinate)
-                        st.session_state.initial_holds = sorted_clicks[1:] # The other two are initial
-                        st.success("Três agarras selecionadas! Agarras iniciais e final identificadas.")
-            else:
-                st.warning("Você já selecionou 3 agarras. Por favor, reinicie o processo para selecionar novamente.")
-
-    # Exibir cliques gerais registrados
-    if st.session_state.clicks:
-        st.subheader("Cliques Registrados (na imagem cortada):")
-        for i, (x, y) in enumerate(st.session_state.clicks):
-            st.write(f"{i+1}. X: {x}, Y: {y}")
-        
-        if st.session_state.final_hold:
-            st.write(f"**Agarra Final:** X: {st.session_state.final_hold[0]}, Y: {st.session_state.final_hold[1]}")
-            st.write(f"**Agarras Iniciais:**")
-            for i, (x, y) in enumerate(st.session_state.initial_holds):
-                st.write(f"  {i+1}. X: {x}, Y: {y}")
-    else:
-        st.write("Nenhum clique geral registrado ainda na imagem cortada.")
-
-    # --- 6. Rota Mais Rápida ---
-    st.subheader("6. Rota Mais Rápida")
-    if st.session_state.detected_holds_components and st.session_state.initial_holds and st.session_state.final_hold:
-        if st.button("Calcular Rota Mais Rápida", key="calculate_route_button"):
-            fastest_route = find_fastest_route(
-                st.session_state.detected_holds_components,
-                st.session_state.initial_holds,
-                st.session_state.final_hold
+            if report.draft_scale > 1:
+                ingest_caption += f", JPEG reduzido 1/{report.draft_scale}"
+            ingest_caption += ")"
+            if report.crop_seconds is not None:
+                ingest_caption += f"; recorte decodificado em {report.crop_seconds * 1000:.0f} ms"
+            st.caption(f"{ingest_caption}; pico de memória ~{report.peak_bytes / 1e6:.1f} MB.")
+        current_cropped_image = image_cropper_component(pipeline.store, MAX_IMAGE_WIDTH)
+        # Agarras segmentadas em dia com o filtro (None até o botão da etapa 4 ser pressionado)
+        holds = None
+
+        if current_cropped_image is not None:
+            # Todas as etapas interativas usam uma versão reduzida (proxy) da imagem cortada
+            display_cropped = current_cropped_image.proxy(MAX_IMAGE_WIDTH)
+            display_cropped_image_pil = display_cropped.pil
+            # Os bytes codificados ficam em cache: a imagem não é recodificada a cada rerun
+            cropped_view = st.session_state.render_cache.encoded(
+                "cropped", (display_cropped.key,), lambda: display_cropped.rgb, "JPEG"
             )
+            with span("app.display_crop"):
+                st.image(cropped_view, caption="Imagem Cortada")
+
+            # --- 2. Select Color from Cropped Image ---
+            st.subheader("2. Selecionar Cor")
+            color_selector_component(pipeline, MAX_IMAGE_WIDTH)
+
+            # Variáveis para armazenar a imagem filtrada e a máscara binária
+            filtered_image_np_rgb = None
+            binary_mask_np = None
+
+            if st.session_state.selected_color_hsv:
+                # --- 3. Filtro HSV ---
+                st.subheader("3. Ajustar Filtro HSV")
+                # hsv_filter_component agora retorna a imagem filtrada E a máscara
+                filtered_image_np_rgb, binary_mask_np = hsv_filter_component(pipeline, MAX_IMAGE_WIDTH)
+            else:
+                st.info("Por favor, selecione uma cor para habilitar o filtro HSV.")
 
-            if fastest_route:
-                st.success("Rota mais rápida encontrada!")
-                route_image = visualize_route(current_cropped_image_pil, fastest_route)
-                st.image(route_image, caption="Rota Mais Rápida")
+            # --- 4. Identificação de Agarras (Chamada ao NOVO componente) ---
+            if filtered_image_np_rgb is not None and binary_mask_np is not None:
+                # A segmentação em resolução total usa a mesma imagem cortada e os mesmos parâmetros do filtro
+                holds = hold_segmentation_viewer_component(pipeline, MAX_IMAGE_WIDTH)
             else:
-                st.warning("Não foi possível encontrar uma rota válida com as agarras selecionadas.")
+                st.info("Aguardando o filtro HSV para identificar as agarras.")
+
+            # --- 5. Cliques Gerais na Imagem Cortada (Opcional - reindexado de 4 para 5) ---
+            st.subheader("5. Seleção de Agarras Iniciais e Final")
+            st.write("Clique nas duas agarras iniciais e uma agarra final (nessa ordem). Limite de 3 cliques.")
+
+            with span("app.display_clicks"):
+                general_click_coords = streamlit_image_coordinates(
+                    display_cropped_image_pil,
+                    key="cropped_image_for_general_clicks",
+                )
+            if general_click_coords:
+                # Cliques são feitos no proxy e guardados em coordenadas de resolução total
+                clicked_x, clicked_y = to_full_resolution(
+                    (general_click_coords['x'], general_click_coords['y']),
+                    current_cropped_image.size,
+                    display_cropped_image_pil.size
+                )
+
+                if len(st.session_state.clicks) < 3:
+                    if not st.session_state.clicks or \
+                       (st.session_state.clicks[-1][0] != clicked_x or st.session_state.clicks[-1][1] != clicked_y):
+                        st.session_state.clicks.append((clicked_x, clicked_y))
+                        st.toast(f"Clique registrado: ({clicked_x}, {clicked_y}). Total: {len(st.session_state.clicks)}/3")
+                        if len(st.session_state.clicks) == 3:
+                            # Sort clicks by y-coordinate to identify final hold
+                            sorted_clicks = sorted(st.session_state.clicks, key=lambda p: p[1])
+                            st.session_state.final_hold = sorted_clicks[0] # Highest point (smallest y-coordinate)
+                            st.session_state.initial_holds = sorted_clicks[1:] # The other two are initial
+                            st.success("Três agarras selecionadas! Agarras iniciais e final identificadas.")
+                else:
+                    st.warning("Você já selecionou 3 agarras. Por favor, reinicie o processo para selecionar novamente.")
+
+        # Exibir cliques gerais registrados
+        if st.session_state.clicks:
+            st.subheader("Cliques Registrados (na imagem cortada):")
+            for i, (x, y) in enumerate(st.session_state.clicks):
+                st.write(f"{i+1}. X: {x}, Y: {y}")
+
+            if st.session_state.final_hold:
+                st.write(f"**Agarra Final:** X: {st.session_state.final_hold[0]}, Y: {st.session_state.final_hold[1]}")
+                st.write(f"**Agarras Iniciais:**")
+                for i, (x, y) in enumerate(st.session_state.initial_holds):
+                    st.write(f"  {i+1}. X: {x}, Y: {y}")
+        else:
+            st.write("Nenhum clique geral registrado ainda na imagem cortada.")
+
+        # --- 6. Rota Mais Rápida ---
+        st.subheader("6. Rota Mais Rápida")
+        # As agarras da etapa 4: desatualizadas (None) enquanto o filtro mudou e não foram segmentadas de novo
+        if holds and st.session_state.initial_holds and st.session_state.final_hold:
+            # Alcance em pixels da imagem em resolução total
+            max_reach = st.number_input(
+                "Alcance máximo entre agarras (pixels, 0 = sem limite)",
+                min_value=0,
+                value=int(current_cropped_image.size[1] * DEFAULT_REACH_FRACTION),
+                step=10,
+                key="max_reach"
+            )
+            compare_reach = st.checkbox(
+                "Incluir rotas para escaladores mais baixos e mais altos (alcance menor e maior)",
+                value=False,
+                disabled=not max_reach,
+                key="compare_reach"
+            )
+            # Cada rota tem sua própria cor: as rotas dos outros alcances usam as últimas cores da paleta
+            max_routes = len(ROUTE_COLORS) - (len(REACH_VARIANTS) if compare_reach else 0)
+            st.session_state.num_routes = min(st.session_state.get("num_routes", 1), max_routes)
+            num_routes = st.number_input(
+                "Número de rotas (incluindo a mais rápida)",
+                min_value=1,
+                max_value=max_routes,
+                key="num_routes"
+            )
+            # O grafo de alcance e as rotas só são refeitos quando as agarras, o alcance ou os cliques mudam;
+            # com os outros alcances, um só grafo (do maior alcance) responde a todas as consultas
+            pipeline.set(
+                max_reach=max_reach or None,
+                reach_variants=REACH_VARIANTS if compare_reach and max_reach else (),
+                k=num_routes,
+                starts=st.session_state.initial_holds,
+                finish=st.session_state.final_hold
+            )
+            if st.button("Calcular Rota Mais Rápida", key="calculate_route_button"):
+                st.session_state.routes_requested = True
+                if pipeline.routes():
+                    st.success("Rota mais rápida encontrada!")
+                else:
+                    st.warning("Não foi possível encontrar uma rota válida com as agarras selecionadas.")
+
+            routes = pipeline.routes() if st.session_state.routes_requested else None
+            if routes:
+                routes = list(routes)
+                route_names = [f"Rota {i + 1}" for i in range(len(routes))]
+                # Rotas para os outros alcances (também em cache no pipeline), quando diferentes das já exibidas
+                variant_names = ["alcance menor", "alcance maior"]
+                for factor, name, route in zip(REACH_VARIANTS, variant_names, pipeline.variant_routes() or []):
+                    if route and route not in routes:
+                        routes.append(route)
+                        route_names.append(f"Rota para {name} ({int(max_reach * factor)} px)")
+                # As rotas são calculadas em resolução total e desenhadas sobre o proxy:
+                # a camada das rotas e a imagem codificada só são refeitas quando as rotas mudam
+                display_cropped = current_cropped_image.proxy(MAX_IMAGE_WIDTH)
+                display_size = display_cropped.size
+                display_routes = tuple(
+                    tuple(to_display(point, current_cropped_image.size, display_size) for point in route)
+                    for route in routes
+                )
+                render_cache = st.session_state.render_cache
+                def compose_route_view():
+                    layer = render_cache.layer("routes", (display_size, display_routes),
+                                               lambda: routes_layer(display_size[::-1], display_routes))
+                    return composite_layer(display_cropped.rgb, layer)
+                route_image = render_cache.encoded("route_view", (display_cropped.key, display_routes),
+                                                   compose_route_view, "JPEG")
+                with span("app.display_routes"):
+                    st.image(route_image, caption="Rota Mais Rápida" if len(routes) == 1 else "Rotas encontradas")
+                if len(routes) > 1:
+                    for i, (name, route) in enumerate(zip(route_names, routes)):
+                        color = ROUTE_COLOR_NAMES[i % len(ROUTE_COLOR_NAMES)]
+                        st.write(f"**{name}** (linha {color}): {len(route)} agarras")
+        else:
+            st.info("Por favor, complete as etapas 4 e 5 para calcular a rota mais rápida.")
+
+
     else:
-        st.info("Por favor, complete as etapas 4 e 5 para calcular a rota mais rápida.")
-
-
-else:
-    st.info("Por favor, faça o upload de uma imagem.")
-    # Limpar todo o estado da sessão se nenhum arquivo for carregado
-    st.session_state.clicks = []
-    st.session_state.crop_points = []
-    st.session_state.cropped_image_data = None
-    st.session_state.uploaded_image_info = {"name": None, "data": None}
-    st.session_state.selected_color_rgb = None
-    st.session_state.selected_color_hsv = None
-    st.session_state.hsv_tolerances = {'H': 4, 'S': 100, 'V': 100}
-    st.session_state.erosion_iterations = 0
-    st.session_state.dilation_iterations = 0
-    st.session_state.detected_holds_components = None
-    st.session_state.initial_holds = []
-    st.session_state.final_hold = None
-
-
-st.sidebar.header("Sobre")
-st.sidebar.info("Está com dificuldade em um boulder? Quero Beta encontra uma rota para você!")
-st.sidebar.info("Lembre-se de fazer todas as etapas!")
-st.sidebar.info("Na pasta do projeto, encontra-se uma pasta 'imgs' com imagens de exemplo.")
-st.sidebar.info("Caso você queira reiniciar, basta recarregar a página.")
\ No newline at end of file
+        st.info("Por favor, faça o upload de uma imagem.")
+        # Limpar todo o estado da sessão se nenhum arquivo for carregado
+        st.session_state.clicks = []
+        st.session_state.crop_points = []
+        if 'pipeline' in st.session_state:
+            st.session_state.pipeline.clear()
+        st.session_state.uploaded_image_info = {"name": None}
+        st.session_state.selected_color_rgb = None
+        st.session_state.selected_color_hsv = None
+        st.session_state.hsv_tolerances = {'H': 4, 'S': 100, 'V': 100}
+        st.session_state.erosion_iterations = 0
+        st.session_state.dilation_iterations = 0
+        st.session_state.holds_requested = False
+        st.session_state.routes_requested = False
+        if 'render_cache' in st.session_state:
+            st.session_state.render_cache.clear()
+        st.session_state.initial_holds = []
+        st.session_state.final_hold = None
+
+
+    st.sidebar.header("Sobre")
+    st.sidebar.info("Está com dificuldade em um boulder? Quero Beta encontra uma rota para você!")
+    st.sidebar.info("Lembre-se de fazer todas as etapas!")
+    st.sidebar.info("Na pasta do projeto, encontra-se uma pasta 'imgs' com imagens de exemplo.")
+    st.sidebar.info("Caso você queira reiniciar, basta recarregar a página.")
+
+    st.sidebar.checkbox("Mostrar desempenho por etapa", key="show_profile")
+
+# O painel mostra esta execução inteira; o trace guarda as últimas execuções
+if profiler is not None and st.session_state.show_profile:
+    profiler_panel_component(profiler)
@@ -0,0 +1,76 @@
+"""
+Per-tick latency and peak memory of the HSV filter preview: the allocating
+path (apply_hsv_filter + apply_morphology + boolean-indexed composite, as
+the sliders used to run it) against the fused, buffer-reusing HSVFilterStage.
+Both receive the cached HSV image, so only the per-tick work is measured.
+
+Usage (from the project root):
+    python -m benchmarks.bench_filter_stage --scale 2
+"""
+import argparse
+import tracemalloc
+
+import numpy as np
+import cv2
+
+from benchmarks.common import (
+    DILATION_ITERATIONS,
+    EROSION_ITERATIONS,
+    EXAMPLE_IMAGES,
+    TOLERANCES,
+    best_time,
+    load_example,
+    reference_color,
+)
+from utils.filter_stage import HSVFilterStage
+from utils.image_processing import apply_hsv_filter, apply_morphology
+
+def allocating_tick(image_np_rgb, image_hsv, color):
+    _, mask = apply_hsv_filter(image_np_rgb, color, *TOLERANCES, image_hsv=image_hsv)
+    mask = apply_morphology(mask, EROSION_ITERATIONS, DILATION_ITERATIONS)
+    preview = np.zeros_like(image_np_rgb)
+    preview[mask == 255] = image_np_rgb[mask == 255]
+    return preview, mask
+
+def peak_bytes(function):
+    """
+    Peak bytes allocated (as seen by tracemalloc) while running function once.
+    """
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="Fator de ampliação das imagens de exemplo.")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetições por medida (vale a melhor).")
+    parser.add_argument("--images", nargs="+", default=EXAMPLE_IMAGES)
+    args = parser.parse_args()
+
+    print(f"{'imagem':<10}{'MP':>6}{'alocando':>12}{'fundido':>12}{'ganho':>8}{'pico aloc.':>13}{'pico fund.':>13}")
+    for name in args.images:
+        image = load_example(name, args.scale)
+        image_hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
+        color = reference_color(image)
+        stage = HSVFilterStage()
+
+        def fused_tick():
+            stage.invalidate() # Measure a tolerance tick, not a morphology cache hit
+            return stage.run(image, color, *TOLERANCES, EROSION_ITERATIONS, DILATION_ITERATIONS, image_hsv=image_hsv)
+
+        expected_preview, expected_mask = allocating_tick(image, image_hsv, color)
+        preview, mask = fused_tick() # Also allocates the stage buffers before measuring
+        assert np.array_equal(preview, expected_preview) and np.array_equal(mask, expected_mask)
+
+        old_time = best_time(lambda: allocating_tick(image, image_hsv, color), args.repeat)
+        new_time = best_time(fused_tick, args.repeat)
+        old_peak = peak_bytes(lambda: allocating_tick(image, image_hsv, color))
+        new_peak = peak_bytes(fused_tick)
+        print(f"{name:<10}{image.shape[0] * image.shape[1] / 1e6:>6.1f}"
+              f"{old_time * 1e3:>10.1f}ms{new_time * 1e3:>10.1f}ms{old_time / new_time:>7.1f}x"
+              f"{old_peak / 1e6:>11.1f}MB{new_peak / 1e6:>11.1f}MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Speedup curve of the parallel segmentation pipeline against the number of
+workers, on the example walls scaled up.
+
+Usage (from the project root):
+    python -m benchmarks.bench_parallel_segmentation --scale 3 --workers 1 2 4 8 16
+"""
+import argparse
+import os
+
+import cv2
+
+from benchmarks.common import (
+    DILATION_ITERATIONS,
+    EROSION_ITERATIONS,
+    EXAMPLE_IMAGES,
+    TOLERANCES,
+    best_time,
+    load_example,
+    reference_color,
+)
+from utils.image_processing import segment_image
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=3.0, help="Fator de ampliação das imagens de exemplo.")
+    parser.add_argument("--workers", type=int, nargs="+", default=None, help="Números de workers a medir.")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições por medida (vale a melhor).")
+    parser.add_argument("--opencv-threads", type=int, default=None,
+                        help="Threads internas do OpenCV (padrão: não altera).")
+    parser.add_argument("--images", nargs="+", default=EXAMPLE_IMAGES)
+    args = parser.parse_args()
+
+    if args.opencv_threads is not None:
+        cv2.setNumThreads(args.opencv_threads)
+    cpus = os.cpu_count() or 1
+    worker_counts = args.workers or sorted(w for w in {1, 2, 4, 8, 16, cpus} if w <= cpus)
+
+    print(f"CPUs: {cpus}  escala: {args.scale}x  threads OpenCV: {cv2.getNumThreads()}")
+    print(f"{'imagem':<10}{'MP':>7}" + "".join(f"{f'w={w}':>14}" for w in worker_counts))
+    totals = dict.fromkeys(worker_counts, 0.0)
+    for name in args.images:
+        image = load_example(name, args.scale)
+        color = reference_color(image)
+        row = f"{name:<10}{image.shape[0] * image.shape[1] / 1e6:>7.1f}"
+        baseline = None
+        for workers in worker_counts:
+            elapsed = best_time(lambda: segment_image(
+                image, color, *TOLERANCES, EROSION_ITERATIONS, DILATION_ITERATIONS, workers=workers
+            ), args.repeat)
+            totals[workers] += elapsed
+            baseline = baseline or elapsed
+            row += f"{elapsed:>8.3f}s {baseline / elapsed:>4.1f}x"
+        print(row)
+
+    base_total = totals[worker_counts[0]]
+    print(f"{'total':<17}" + "".join(f"{totals[w]:>8.3f}s {base_total / totals[w]:>4.1f}x" for w in worker_counts))
+
+if __name__ == "__main__":
+    main()
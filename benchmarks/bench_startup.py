@@ -0,0 +1,113 @@
+"""
+Cold start benchmark: import time of the app's modules and time until the
+upload screen is drawn, each measured in a fresh interpreter.
+
+For every module the suite reports the median over --repeat interpreters
+of its import time on its own and after streamlit (which the app always
+loads first), from python -X importtime. The first paint is the first run
+of app.py (without an upload) through Streamlit's AppTest, together with
+the heavy modules it loaded.
+
+Usage (from the project root):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 9 --modules cv2 utils.pipeline
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules measured by default: third-party dependencies, then the project's
+MODULES = [
+    "streamlit", "numpy", "PIL.Image", "cv2", "streamlit_image_coordinates",
+    "utils", "utils.profiling", "utils.pyramid", "utils.image_processing", "utils.pipeline",
+    "components.profiler_panel", "components.image_cropper", "components.color_selector",
+    "components.hsv_filter_ui", "components.hold_segmentation_viewer",
+]
+
+# Modules the upload screen should not need
+HEAVY_MODULES = ["cv2", "numpy", "PIL.Image", "streamlit_image_coordinates", "utils.image_processing"]
+
+# Run in a fresh interpreter: one run of app.py without an upload
+_FIRST_PAINT_SCRIPT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+before = set(sys.modules)
+start = time.perf_counter()
+at = AppTest.from_file({app!r}, default_timeout=120)
+at.run()
+seconds = time.perf_counter() - start
+if at.exception:
+    raise SystemExit(str(at.exception))
+print(json.dumps({{"seconds": seconds, "loaded": sorted(m for m in {heavy!r} if m in sys.modules and m not in before)}}))
+"""
+
+def import_time(module, after=None):
+    """
+    Cumulative import time of a module in a fresh interpreter, in seconds.
+    Args:
+        module (str): Module name.
+        after (str, optional): Module imported first (its cost, and that of
+                               what it shares with module, is not counted).
+    """
+    statement = f"import {after}; import {module}" if after else f"import {module}"
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                               capture_output=True, text=True, cwd=PROJECT_DIR)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    # Lines are "import time: self [us] | cumulative | name"; the module's own
+    # line is the last one whose name (without indentation) is the module
+    for line in reversed(completed.stderr.splitlines()):
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.strip() == module:
+            return int(cumulative) / 1e6
+    return 0.0 # Already loaded by `after`
+
+def first_paint():
+    """
+    Time of the first run of app.py (upload screen) in a fresh interpreter.
+    Returns:
+        dict: seconds and the heavy modules loaded by the run.
+    """
+    script = _FIRST_PAINT_SCRIPT.format(app=os.path.join(PROJECT_DIR, "app.py"), heavy=HEAVY_MODULES)
+    completed = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, cwd=PROJECT_DIR)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=MODULES, help="Módulos medidos.")
+    parser.add_argument("--repeat", type=int, default=5, help="Interpretadores por medida (vale a mediana).")
+    parser.add_argument("--output", default=None, help="Arquivo JSON com os resultados.")
+    args = parser.parse_args()
+
+    results = {"modules": {}, "first_paint": None}
+    print(f"{'módulo':<40}{'sozinho':>12}{'após streamlit':>16}")
+    for module in args.modules:
+        alone = statistics.median(import_time(module) for _ in range(args.repeat))
+        after = alone if module == "streamlit" else statistics.median(
+            import_time(module, "streamlit") for _ in range(args.repeat)
+        )
+        results["modules"][module] = {"seconds": alone, "after_streamlit_seconds": after}
+        print(f"{module:<40}{alone * 1e3:>10.1f}ms{after * 1e3:>14.1f}ms", flush=True)
+
+    runs = [first_paint() for _ in range(args.repeat)]
+    seconds = statistics.median(run["seconds"] for run in runs)
+    loaded = runs[-1]["loaded"]
+    results["first_paint"] = {"seconds": seconds, "heavy_modules_loaded": loaded}
+    print(f"Primeira tela (upload): {seconds * 1e3:.0f} ms; módulos pesados carregados: {', '.join(loaded) or 'nenhum'}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+        print(f"Resultados salvos em {args.output}")
+
+if __name__ == "__main__":
+    main()
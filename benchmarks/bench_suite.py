@@ -0,0 +1,511 @@
+"""
+Benchmark suite: every stage and the end-to-end pipeline on the example
+walls, on synthetic walls (tiled and upscaled to 1, 12 and 50 MP) and on
+synthetic hold fields for the router, with fixed parameters.
+
+The router cases also record the number of edges of their reach graphs.
+wall_graph builds the graph at the app's default reach, a fraction of
+the field height: a graph keeping every move would have edges per hold
+growing with the number of holds, so the run fails if they grow by more
+than MAX_EDGE_GROWTH from the smallest field to a larger one.
+
+Each case runs in its own subprocess, so its peak RSS is not mixed with
+the other cases. A subprocess times --repeat runs of its case (after a
+warm-up run) and keeps their median, the peak RSS of the warm-up run and
+the peak of the allocations seen by tracemalloc (NumPy arrays and Python
+objects; OpenCV and PIL buffers are only in the RSS).
+
+The runs of one subprocess follow each other within a second, so on a
+shared machine they all land in the same fast or slow spell and their
+median can be off by tens of percent. The suite therefore goes through
+all the cases --rounds times, spreading the subprocesses of a case over
+the whole run, and reports the lowest of their medians.
+
+The results are saved as JSON and, with --baseline, compared against a
+stored run, flagging the cases whose time or memory got worse than
+--threshold (the exit status is 1 if any did). A time is only flagged
+when it is worse than the slowest round of the baseline: a slowdown
+within the noise the baseline itself showed is printed as a warning
+instead, without failing the run. Cases under 10 ms are only flagged
+beyond +50% and 3 ms, as they move that much between runs of the same
+code.
+
+A baseline is only meaningful in the environment it was measured in, so
+the comparison is refused when the Python, NumPy or OpenCV version, the
+platform, the number of CPUs or of OpenCV threads differ from the
+baseline's. benchmarks/baseline.json was measured on a single-CPU
+machine and is kept as a record of it, not as a reference for other
+machines. To look for regressions, store a baseline of the code before
+the change on the same machine, then compare the changed code against
+it (store a new one after a change that is meant to be slower).
+
+Usage (from the project root):
+    python -m benchmarks.bench_suite --output results.json
+    python -m benchmarks.bench_suite --groups examples --stages filter label route --rounds 1
+    python -m benchmarks.bench_suite --save-baseline --baseline local-baseline.json
+    python -m benchmarks.bench_suite --baseline local-baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import cv2
+
+from benchmarks.common import (
+    DILATION_ITERATIONS,
+    EROSION_ITERATIONS,
+    EXAMPLE_IMAGES,
+    IMGS_DIR,
+    TOLERANCES,
+    load_example,
+    reference_color,
+    route_endpoints,
+    synthetic_hold_field,
+    synthetic_wall,
+)
+
+# Stages measured on the example walls
+EXAMPLE_STAGES = ("decode", "filter", "morphology", "label", "bfs_segmentation", "route", "render", "end_to_end")
+
+# Stages measured on the synthetic walls (the per-pixel stages and the whole pipeline)
+SYNTHETIC_STAGES = ("filter", "segment", "render", "end_to_end")
+SYNTHETIC_SIZES = (1, 12, 50) # megapixels
+SYNTHETIC_MODES = ("tile", "upscale")
+
+# Router cases on synthetic hold fields
+ROUTER_STAGES = ("graph", "wall_graph", "route", "k_routes")
+ROUTER_FIELDS = (10_000, 50_000) # holds
+ROUTER_REACH = 100 # pixels, a bit over three grid steps of synthetic_hold_field
+ROUTER_K = 3
+
+# Largest growth of the edges per hold of a reach graph, from the smallest
+# hold field to a larger one
+MAX_EDGE_GROWTH = 1.5
+
+# Walls above this size are segmented in tiles, as in the app
+TILED_SEGMENTATION_MIN_PIXELS = 20_000_000
+
+# Where --save-baseline stores the results without --baseline
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Relative change above which a case is flagged, and absolute changes
+# below which it is noise whatever the ratio
+DEFAULT_THRESHOLD = 0.15
+MIN_SECONDS_DELTA = 0.003
+MIN_BYTES_DELTA = 8 * 1024 * 1024
+
+# Cases faster than this vary by tens of percent between runs (scheduling,
+# caches): they are only flagged beyond FAST_CASE_THRESHOLD
+FAST_CASE_SECONDS = 0.010
+FAST_CASE_THRESHOLD = 0.5
+
+def list_cases(groups, images, sizes, modes, fields, stages=None):
+    """
+    Ids of the cases to run, as "group/stage".
+    """
+    cases = []
+    if "examples" in groups:
+        cases += [f"{name}/{stage}" for name in images for stage in EXAMPLE_STAGES]
+    if "synthetic" in groups:
+        cases += [f"{mode}-{size}mp/{stage}" for size in sizes for mode in modes for stage in SYNTHETIC_STAGES]
+    if "router" in groups:
+        cases += [f"field-{count}/{stage}" for count in fields for stage in ROUTER_STAGES]
+    if stages:
+        cases = [case for case in cases if case.split("/")[1] in stages]
+    return cases
+
+def _encode(image_np_rgb, extension):
+    ok, data = cv2.imencode(extension, cv2.cvtColor(image_np_rgb, cv2.COLOR_RGB2BGR))
+    if not ok:
+        raise ValueError("Não foi possível codificar a imagem do benchmark.")
+    return data.tobytes()
+
+def _end_to_end(data, color, memory_budget, endpoints=None):
+    """
+    Decode, crop (whole image), filter, morphology, labeling, reach graph
+    and route through a fresh Pipeline. Returns the pipeline.
+    """
+    from utils.pipeline import Pipeline
+    from utils.routing import DEFAULT_REACH_FRACTION
+
+    pipeline = Pipeline()
+    pipeline.load("benchmark", data)
+    pipeline.store.set_crop((0, 0, *pipeline.store.size))
+    pipeline.set(color_hsv=color, tolerances=TOLERANCES, erosion=EROSION_ITERATIONS,
+                 dilation=DILATION_ITERATIONS, memory_budget=memory_budget,
+                 max_reach=pipeline.store.size[1] * DEFAULT_REACH_FRACTION)
+    if endpoints is None:
+        pipeline.holds()
+    else:
+        pipeline.set(starts=endpoints[0], finish=endpoints[1])
+        pipeline.routes()
+    return pipeline
+
+def prepare(case):
+    """
+    Builds the inputs of a case (not measured).
+    Returns:
+        tuple: (function running the measured work once, dict describing the input).
+    """
+    from utils.image_processing import (
+        apply_hsv_filter, apply_morphology, bfs_segmentation, find_fastest_route,
+        find_routes, hsv_mask, segment_holds, segment_image, visualize_components_colored,
+    )
+    from utils.image_store import ImageStore
+    from utils.routing import DEFAULT_REACH_FRACTION, reach_graph_for
+
+    group, stage = case.split("/")
+    if group.startswith("field-"):
+        holds = synthetic_hold_field(int(group[len("field-"):]))
+        starts, finish = route_endpoints(holds)
+        info = {"holds": len(holds), "megapixels": holds.labels.size / 1e6}
+        if stage in ("graph", "wall_graph"):
+            reach = ROUTER_REACH if stage == "graph" else holds.shape[0] * DEFAULT_REACH_FRACTION
+            info.update(reach=reach, edges=reach_graph_for(holds, reach).num_edges)
+            return (lambda: reach_graph_for(holds, reach)), info
+        if stage == "route":
+            return (lambda: find_fastest_route(holds, starts, finish, max_reach=ROUTER_REACH)), info
+        if stage == "k_routes":
+            return (lambda: find_routes(holds, starts, finish, k=ROUTER_K, max_reach=ROUTER_REACH)), info
+        raise ValueError(f"Etapa desconhecida: {stage}")
+
+    if group in EXAMPLE_IMAGES:
+        image = load_example(group)
+        with open(os.path.join(IMGS_DIR, group), "rb") as f:
+            data = f.read()
+    else:
+        mode, size = group.split("-")
+        image = synthetic_wall(float(size[:-len("mp")]), mode)
+        data = _encode(image, ".jpg") if stage == "end_to_end" else None
+    color = reference_color(image)
+    large = image.shape[0] * image.shape[1] > TILED_SEGMENTATION_MIN_PIXELS
+    memory_budget = None
+    if large:
+        from utils.tiled_segmentation import DEFAULT_MEMORY_BUDGET
+        memory_budget = DEFAULT_MEMORY_BUDGET
+    info = {"megapixels": image.shape[0] * image.shape[1] / 1e6}
+
+    if stage == "decode":
+        return (lambda: ImageStore().load(group, data)), info
+    if stage == "filter":
+        return (lambda: apply_hsv_filter(image, color, *TOLERANCES)), info
+    if stage == "segment":
+        return (lambda: segment_image(image, color, *TOLERANCES, EROSION_ITERATIONS, DILATION_ITERATIONS,
+                                      memory_budget=memory_budget)), info
+    if stage == "end_to_end":
+        # Clicks picked from a first (unmeasured) run, like a user would
+        holds = _end_to_end(data, color, memory_budget).holds()
+        endpoints = route_endpoints(holds) if len(holds) >= 3 else None
+        info["holds"] = len(holds)
+        return (lambda: _end_to_end(data, color, memory_budget, endpoints)), info
+
+    mask = apply_morphology(hsv_mask(image, color, *TOLERANCES), EROSION_ITERATIONS, DILATION_ITERATIONS)
+    if stage == "morphology":
+        raw_mask = hsv_mask(image, color, *TOLERANCES)
+        return (lambda: apply_morphology(raw_mask, EROSION_ITERATIONS, DILATION_ITERATIONS)), info
+    if stage == "label":
+        return (lambda: segment_holds(mask)), info
+    if stage == "bfs_segmentation":
+        return (lambda: bfs_segmentation(mask)), info
+    holds = segment_holds(mask)
+    info["holds"] = len(holds)
+    if stage == "render":
+        return (lambda: visualize_components_colored(holds, image.shape[:2])), info
+    if stage == "route":
+        if len(holds) < 3:
+            raise ValueError("Poucas agarras para medir a rota.")
+        starts, finish = route_endpoints(holds)
+        reach = image.shape[0] * DEFAULT_REACH_FRACTION
+        return (lambda: find_fastest_route(holds, starts, finish, max_reach=reach)), info
+    raise ValueError(f"Etapa desconhecida: {stage}")
+
+def _reset_peak_rss():
+    # Linux: writing 5 to clear_refs resets the peak RSS (VmHWM) of the process
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def _peak_rss():
+    """
+    Peak resident memory of this process in bytes, or None if unknown.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def measure(case, repeat):
+    """
+    Runs one case in this process.
+    Returns:
+        dict: seconds (best), median_seconds, mean_seconds, peak_rss_bytes,
+              alloc_peak_bytes and the input info.
+    """
+    function, info = prepare(case)
+    # Warm-up run: peak RSS (since the reset, if the OS allows it)
+    exact = _reset_peak_rss()
+    function()
+    peak_rss = _peak_rss()
+
+    tracemalloc.start()
+    function()
+    _, alloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times = []
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {
+        "seconds": min(times),
+        "median_seconds": statistics.median(times),
+        "mean_seconds": sum(times) / len(times),
+        "peak_rss_bytes": peak_rss,
+        "peak_rss_exact": exact, # False: the peak includes preparing the inputs
+        "alloc_peak_bytes": alloc_peak,
+        **info,
+    }
+
+def run_case_subprocess(case, repeat, timeout):
+    """
+    Runs one case in a fresh interpreter and returns its result.
+    """
+    command = [sys.executable, "-m", "benchmarks.bench_suite", "--case", case, "--repeat", str(repeat)]
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout,
+                                   cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    except subprocess.TimeoutExpired:
+        return {"error": f"tempo esgotado ({timeout} s)"}
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        error = (completed.stderr.strip().splitlines() or [f"código de saída {completed.returncode}"])[-1]
+        return {"error": error}
+    return json.loads(lines[-1])
+
+def merge_rounds(results):
+    """
+    Combines the results of one case over several rounds: the best time,
+    the lowest median (and the median of every round), and the lowest
+    memory peaks, as the noise of a shared machine only adds to them.
+    """
+    errors = [result for result in results if "error" in result]
+    if errors:
+        return errors[0]
+    merged = dict(min(results, key=lambda result: result["median_seconds"]))
+    merged["round_median_seconds"] = [result["median_seconds"] for result in results]
+    for metric in ("seconds", "peak_rss_bytes", "alloc_peak_bytes"):
+        values = [result[metric] for result in results if result.get(metric) is not None]
+        merged[metric] = min(values) if values else None
+    return merged
+
+def environment():
+    """
+    Versions and machine the results were measured on.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(IMGS_DIR)).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "opencv_threads": cv2.getNumThreads(),
+    }
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, reference=max):
+    """
+    Compares results against a baseline: the (lowest) median time against
+    the slowest round median of the baseline (its median, or best time, for
+    baselines without rounds), the peak RSS and the allocation peak.
+    Args:
+        reference (function): Picks the baseline time among its round
+                              medians (min: its fastest round).
+    Returns:
+        list: (case, metric, baseline value, new value, ratio) of every regression.
+    """
+    regressions = []
+    for case, new in results["cases"].items():
+        old = baseline.get("cases", {}).get(case)
+        if not old or "error" in old or "error" in new:
+            continue
+        time_metric = "median_seconds" if "median_seconds" in old else "seconds"
+        for metric, min_delta in ((time_metric, MIN_SECONDS_DELTA), ("peak_rss_bytes", MIN_BYTES_DELTA),
+                                  ("alloc_peak_bytes", MIN_BYTES_DELTA)):
+            before, after = old.get(metric), new.get(metric)
+            if metric == time_metric and old.get("round_median_seconds"):
+                before = reference(old["round_median_seconds"])
+            if not before or after is None:
+                continue
+            limit = threshold
+            if metric == time_metric and before < FAST_CASE_SECONDS:
+                limit = max(threshold, FAST_CASE_THRESHOLD)
+            if after > before * (1 + limit) and after - before > min_delta:
+                regressions.append((case, metric, before, after, after / before))
+    return regressions
+
+def edge_growth(results, limit=MAX_EDGE_GROWTH):
+    """
+    Checks that the reach graphs stay close to linear in the number of
+    holds: the edges per hold of every router graph case against those of
+    the smallest field of the same stage.
+    Returns:
+        list: (case, "edges_per_hold", value on the smallest field, value, ratio)
+              of every case growing beyond the limit.
+    """
+    fields = {}
+    for case, result in results["cases"].items():
+        group, stage = case.split("/")
+        if group.startswith("field-") and "edges" in result:
+            fields.setdefault(stage, []).append((result["holds"], case, result["edges"] / result["holds"]))
+    regressions = []
+    for stage_fields in fields.values():
+        stage_fields.sort()
+        smallest = stage_fields[0][2]
+        for _, case, per_hold in stage_fields[1:]:
+            if per_hold > smallest * limit:
+                regressions.append((case, "edges_per_hold", smallest, per_hold, per_hold / smallest))
+    return regressions
+
+def environment_changes(results, baseline):
+    """
+    Environment fields (versions, machine) that differ from the baseline's.
+    """
+    new, old = results["environment"], baseline.get("environment", {})
+    return [key for key in ("python", "numpy", "opencv", "platform", "cpus", "opencv_threads")
+            if old.get(key) != new.get(key)]
+
+def _format_row(case, result, baseline_result=None):
+    if "error" in result:
+        return f"{case:<32}erro: {result['error']}"
+    rss = result.get("peak_rss_bytes")
+    row = (f"{case:<32}{result['median_seconds'] * 1e3:>11.1f}ms"
+           f"{(rss or 0) / 1e6:>11.1f}MB{result['alloc_peak_bytes'] / 1e6:>11.1f}MB")
+    if baseline_result and "error" not in baseline_result:
+        before = baseline_result.get("median_seconds", baseline_result["seconds"])
+        row += f"{result['median_seconds'] / before:>9.2f}x"
+    return row
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", nargs="+", default=["examples", "synthetic", "router"],
+                        choices=["examples", "synthetic", "router"])
+    parser.add_argument("--images", nargs="+", default=EXAMPLE_IMAGES)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SYNTHETIC_SIZES),
+                        help="Tamanhos das paredes sintéticas, em MP.")
+    parser.add_argument("--modes", nargs="+", default=list(SYNTHETIC_MODES), choices=SYNTHETIC_MODES)
+    parser.add_argument("--fields", type=int, nargs="+", default=list(ROUTER_FIELDS),
+                        help="Números de agarras dos campos sintéticos do roteador.")
+    parser.add_argument("--stages", nargs="+", default=None, help="Mede apenas estas etapas.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Repetições medidas por subprocesso, após o aquecimento (vale a mediana).")
+    parser.add_argument("--rounds", type=int, default=3,
+                        help="Passadas por todos os casos, cada uma em novos subprocessos (vale a menor mediana).")
+    parser.add_argument("--timeout", type=int, default=900, help="Tempo máximo por caso, em segundos.")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Roda tudo neste processo (mais rápido, mas o pico de RSS fica misturado).")
+    parser.add_argument("--output", default=None, help="Arquivo JSON com os resultados.")
+    parser.add_argument("--baseline", default=None,
+                        help="Resultados de referência para comparação, medidos neste mesmo ambiente.")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Salva os resultados como a nova referência (no caminho de --baseline, "
+                             "ou em benchmarks/baseline.json).")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Piora relativa a partir da qual um caso é marcado como regressão.")
+    parser.add_argument("--case", default=None, help=argparse.SUPPRESS) # Used by the subprocesses
+    args = parser.parse_args()
+
+    if args.case:
+        # Subprocess mode: one case, result as the last line of stdout
+        print(json.dumps(measure(args.case, args.repeat)))
+        return
+
+    cases = list_cases(args.groups, args.images, args.sizes, args.modes, args.fields, args.stages)
+    rounds = max(args.rounds, 1)
+    results = {"environment": environment(), "repeat": args.repeat, "rounds": rounds, "cases": {}}
+    baseline = None
+    if args.baseline and not args.save_baseline:
+        if not os.path.exists(args.baseline):
+            parser.error(f"Arquivo de referência não encontrado: {args.baseline}")
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        changed = environment_changes(results, baseline)
+        if changed:
+            old = baseline.get("environment", {})
+            differences = ", ".join(f"{key}: {old.get(key)} -> {results['environment'][key]}" for key in changed)
+            parser.error(f"A referência foi medida em outro ambiente ({differences}). "
+                         "Salve uma referência neste ambiente com --save-baseline e compare com ela.")
+    runs = {case: [] for case in cases}
+    for round_number in range(1, rounds + 1):
+        if round_number == rounds:
+            print(f"{'caso':<32}{'tempo':>13}{'pico RSS':>13}{'pico aloc.':>13}" + (f"{'vs base':>9}" if baseline else ""))
+        else:
+            print(f"Passada {round_number} de {rounds}...", flush=True)
+        for case in cases:
+            if args.in_process:
+                try:
+                    result = measure(case, args.repeat)
+                except Exception as e:
+                    result = {"error": f"{type(e).__name__}: {e}"}
+            else:
+                result = run_case_subprocess(case, args.repeat, args.timeout)
+            runs[case].append(result)
+            if round_number == rounds:
+                results["cases"][case] = merge_rounds(runs[case])
+                print(_format_row(case, results["cases"][case], baseline and baseline.get("cases", {}).get(case)),
+                      flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+        print(f"Resultados salvos em {args.output}")
+    if args.save_baseline:
+        path = args.baseline or DEFAULT_BASELINE
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+            f.write("\n")
+        print(f"Nova referência salva em {path}")
+
+    regressions = edge_growth(results)
+    if baseline:
+        timings = compare(results, baseline, args.threshold)
+        flagged = {(case, metric) for case, metric, *_ in timings}
+        for case, metric, before, after, ratio in compare(results, baseline, args.threshold, reference=min):
+            if (case, metric) not in flagged:
+                print(f"Aviso: {case} {metric}: {before:.4g} -> {after:.4g} ({ratio:.2f}x), "
+                      "dentro da variação entre as passadas da base")
+        regressions += timings
+    for case, metric, before, after, ratio in regressions:
+        print(f"REGRESSÃO {case} {metric}: {before:.4g} -> {after:.4g} ({ratio:.2f}x)")
+    if regressions:
+        sys.exit(1)
+    if baseline:
+        print("Nenhuma regressão em relação à base.")
+
+if __name__ == "__main__":
+    main()
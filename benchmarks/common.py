@@ -0,0 +1,102 @@
+import math
+import os
+import time
+
+import numpy as np
+import cv2
+from PIL import Image
+
+IMGS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "imgs")
+EXAMPLE_IMAGES = [f"ex{i}.png" for i in range(1, 9)]
+
+# Fixed filter parameters so runs are comparable
+TOLERANCES = (8, 80, 80)
+EROSION_ITERATIONS = 1
+DILATION_ITERATIONS = 1
+
+def load_example(name, scale=1.0):
+    """
+    Loads one of the bundled example walls as an RGB array, optionally
+    scaled up (nearest neighbour, so the hold layout is preserved).
+    """
+    image = np.array(Image.open(os.path.join(IMGS_DIR, name)).convert("RGB"))
+    if scale != 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_NEAREST)
+    return image
+
+def reference_color(image_np_rgb):
+    """
+    Deterministic reference color: the HSV value of a fixed pixel.
+    """
+    height, width = image_np_rgb.shape[:2]
+    pixel = image_np_rgb[height // 2:height // 2 + 1, width // 3:width // 3 + 1]
+    return tuple(int(c) for c in cv2.cvtColor(pixel, cv2.COLOR_RGB2HSV)[0, 0])
+
+def best_time(function, repeat=3):
+    """
+    Runs function repeat times and returns the fastest wall time in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def synthetic_wall(megapixels, mode="tile", name=EXAMPLE_IMAGES[0]):
+    """
+    Builds a wall of about the given size from an example image, either
+    tiled (many copies of the wall side by side: more holds) or upscaled
+    (nearest neighbour: same holds, bigger).
+    Args:
+        megapixels (float): Target size in millions of pixels.
+        mode (str): "tile" or "upscale".
+        name (str): Example image used as the source.
+    Returns:
+        numpy.ndarray: RGB image with the aspect ratio of the example.
+    """
+    base = load_example(name)
+    factor = math.sqrt(megapixels * 1e6 / (base.shape[0] * base.shape[1]))
+    if mode == "upscale":
+        return load_example(name, factor)
+    if mode != "tile":
+        raise ValueError(f"Modo de parede sintética desconhecido: {mode}")
+    height, width = round(base.shape[0] * factor), round(base.shape[1] * factor)
+    reps = math.ceil(factor)
+    return np.ascontiguousarray(np.tile(base, (reps, reps, 1))[:height, :width])
+
+def synthetic_hold_field(num_holds, spacing=30, seed=0):
+    """
+    Builds a label image with num_holds small round holds on a jittered
+    grid (taller than wide, like a wall), for routing benchmarks.
+    Args:
+        num_holds (int): Number of holds.
+        spacing (int): Grid step in pixels (holds never touch).
+        seed (int): Seed of the jitter and hold sizes.
+    Returns:
+        HoldTable: The holds.
+    """
+    from utils.hold_table import HoldTable
+
+    rng = np.random.default_rng(seed)
+    columns = math.ceil(math.sqrt(num_holds * 0.75))
+    rows = math.ceil(num_holds / columns)
+    labels = np.zeros((rows * spacing, columns * spacing), dtype=np.int32)
+    radius = rng.integers(2, spacing // 4, num_holds)
+    jitter = rng.integers(-(spacing // 6), spacing // 6 + 1, (num_holds, 2))
+    for i in range(num_holds):
+        row, column = divmod(i, columns)
+        center = (column * spacing + spacing // 2 + int(jitter[i, 0]), row * spacing + spacing // 2 + int(jitter[i, 1]))
+        cv2.circle(labels, center, int(radius[i]), i + 1, -1)
+    return HoldTable.from_label_image(labels, num_holds)
+
+def route_endpoints(holds):
+    """
+    Deterministic clicks for route benchmarks: the two lowest holds as the
+    start and the highest one as the finish.
+    Returns:
+        tuple: ([start, start], finish) as integer (x, y) points.
+    """
+    order = np.argsort(holds.centroid[:, 1], kind="stable")
+    points = [tuple(int(round(c)) for c in holds.centroid[i]) for i in (order[-1], order[-2], order[0])]
+    return points[:2], points[2]
@@ -1,15 +1,18 @@
 import streamlit as st
-from PIL import Image
-import numpy as np
-import cv2
-from io import BytesIO
 from streamlit_image_coordinates import streamlit_image_coordinates
 
-def color_selector_component(cropped_image_pil):
+from utils.profiling import span
+from utils.pyramid import MAX_IMAGE_WIDTH, to_full_resolution
+
+def color_selector_component(pipeline, max_display_width=MAX_IMAGE_WIDTH):
     """
     Allows user to select a color from the cropped image and displays it.
+    The click is made on a display-sized proxy and the color is read from
+    the full-resolution pixel under it; it becomes the reference color of
+    the pipeline.
     Args:
-        cropped_image_pil (PIL.Image.Image): The cropped image to select color from.
+        pipeline (Pipeline): The session pipeline (with a crop).
+        max_display_width (int): The maximum width to display the image.
     Returns:
         tuple: (rgb_color, hsv_color) if a color is selected, otherwise (None, None).
     """
@@ -18,25 +21,33 @@ def color_selector_component(cropped_image_pil):
     if 'selected_color_hsv' not in st.session_state:
         st.session_state.selected_color_hsv = None
 
-    if cropped_image_pil is None:
+    cropped_image = pipeline.crop()
+    if cropped_image is None:
         return None, None
 
     st.write("Clique na imagem cortada para selecionar a cor da rota.")
 
     if st.session_state.selected_color_rgb is None:
-        color_selection_coords = streamlit_image_coordinates(
-            cropped_image_pil,
-            key="cropped_image_for_color_selection"
-        )
+        display_image_pil = cropped_image.proxy(max_display_width).pil
+        with span("color_selector.display"):
+            color_selection_coords = streamlit_image_coordinates(
+                display_image_pil,
+                key="cropped_image_for_color_selection"
+            )
 
         if color_selection_coords:
-            pixel_x = color_selection_coords['x']
-            pixel_y = color_selection_coords['y']
+            pixel_x, pixel_y = to_full_resolution(
+                (color_selection_coords['x'], color_selection_coords['y']),
+                cropped_image.size,
+                display_image_pil.size
+            )
 
-            rgb_color = cropped_image_pil.getpixel((pixel_x, pixel_y))
+            rgb_color = tuple(int(c) for c in cropped_image.rgb[pixel_y, pixel_x])
             
-            # Convert RGB to HSV using OpenCV
+            # Convert RGB to HSV using OpenCV (imported here: only needed once a color is clicked)
             # OpenCV uses BGR by default, so convert RGB to BGR first
+            import numpy as np
+            import cv2
             bgr_color = np.array([[[rgb_color[2], rgb_color[1], rgb_color[0]]]], dtype=np.uint8)
             hsv_color = cv2.cvtColor(bgr_color, cv2.COLOR_BGR2HSV)[0][0]
 
@@ -60,4 +71,5 @@ def color_selector_component(cropped_image_pil):
             st.session_state.selected_color_hsv = None
             st.rerun()
     
+    pipeline.set(color_hsv=st.session_state.selected_color_hsv)
     return st.session_state.selected_color_rgb, st.session_state.selected_color_hsv
\ No newline at end of file
@@ -1,43 +1,96 @@
 import streamlit as st
-import numpy as np
-import cv2
-from PIL import Image
-from io import BytesIO
 
-# Importa as funções de processamento de imagem
-from utils.image_processing import bfs_segmentation, visualize_components_colored
+from utils.profiling import span
+from utils.pyramid import downscale_array
+from utils.rendering import blend_labels, make_palette, render_labels
+from utils.tiled_segmentation import DEFAULT_MEMORY_BUDGET
 
-def hold_segmentation_viewer_component(cropped_image_pil, binary_mask_np, max_display_width):
+# Recortes acima deste número de pixels são segmentados em blocos (memória limitada)
+TILED_SEGMENTATION_MIN_PIXELS = 20_000_000
+
+def hold_segmentation_viewer_component(pipeline, max_display_width):
     """
     Componente Streamlit para segmentação de agarras (holds) e visualização.
+    A segmentação roda em resolução total, com os parâmetros atuais do filtro
+    HSV e da morfologia, somente quando o botão é pressionado. Se o filtro
+    mudar depois disso, as agarras deixam de ser exibidas (e usadas nas
+    rotas) até um novo clique, e a máscara da prévia é mostrada no lugar. O
+    resultado é exibido reduzido para a largura de exibição.
     Args:
-        cropped_image_pil (PIL.Image.Image): A imagem cortada (original para dimensão).
-        binary_mask_np (numpy.ndarray): A máscara binária da imagem (255 para agarras, 0 para fundo).
+        pipeline (Pipeline): O pipeline da sessão (com recorte, cor e filtro definidos).
         max_display_width (int): A largura máxima para exibir a imagem.
     Updates:
-        st.session_state.detected_holds_components (list): Lista de componentes BFS encontrados.
+        st.session_state.holds_requested (bool): Se as agarras devem ser exibidas.
+    Returns:
+        HoldTable or None: As agarras encontradas, se pedidas e em dia com o filtro.
     """
     st.subheader("4. Identificação de Agarras")
 
+    if 'holds_requested' not in st.session_state:
+        st.session_state.holds_requested = False
+
     # Botão para iniciar a segmentação. Colocado em uma coluna para melhor layout.
-    if st.button("Identificar Agarras", key="identify_holds_button"):
-        # A máscara binária já é o que precisamos para o BFS
-        st.session_state.detected_holds_components = bfs_segmentation(binary_mask_np)
-        st.toast("Agarras identificadas!")
-        st.rerun() # Força um rerun para exibir os resultados após a detecção
+    segment_requested = st.button("Identificar Agarras", key="identify_holds_button")
+    if segment_requested:
+        st.session_state.holds_requested = True
+        st.toast("Identificando agarras...")
+
+    if not st.session_state.holds_requested:
+        return None
+
+    width, height = pipeline.crop().size
+    large_crop = width * height > TILED_SEGMENTATION_MIN_PIXELS
+    pipeline.set(memory_budget=DEFAULT_MEMORY_BUDGET if large_crop else None)
+    # A segmentação em resolução total só roda quando o botão é pressionado: mover um slider
+    # depois disso não a refaz, só deixa as agarras desatualizadas até o próximo clique
+    holds = pipeline.cached("label")
+    if holds is None and segment_requested:
+        with st.spinner("Identificando agarras em resolução total..."):
+            holds = pipeline.holds()
+    if holds is None:
+        st.info("O filtro mudou desde a última identificação. Clique em \"Identificar Agarras\" para "
+                "segmentar de novo; até lá, a máscara da prévia é exibida.")
+        _, preview_mask = pipeline.preview(max_display_width)
+        with span("hold_segmentation_viewer.display"):
+            st.image(preview_mask, caption="Máscara do filtro (prévia reduzida)")
+        return None
 
     # Exibir os resultados da segmentação se houver agarras detectadas
-    if st.session_state.get('detected_holds_components'):
+    if holds:
         st.write("Agarras segmentadas (cada agarrara com uma cor diferente):")
-        
-        # Gerar a imagem colorida
-        colored_components_image = visualize_components_colored(
-            st.session_state.detected_holds_components,
-            cropped_image_pil.size[::-1] # .size retorna (width, height), precisamos (height, width)
+        opacity = st.slider(
+            "Opacidade das cores sobre a foto",
+            min_value=0.0, max_value=1.0, value=0.7, step=0.05,
+            key="holds_overlay_opacity"
         )
-        st.image(colored_components_image, caption="Agarras Identificadas")
 
-        # Opcional: Exibir número de agarras e talvez um botão para "Reiniciar Identificação"
-        if st.button("Reiniciar Identificação de Agarras", key="reset_holds_button"):
-            st.session_state.detected_holds_components = None
-            st.rerun()
\ No newline at end of file
+        # A camada de cores das agarras (no tamanho de exibição) só é refeita quando as
+        # agarras mudam, e a imagem codificada só quando a camada, a foto ou a opacidade mudam
+        render_cache = st.session_state.render_cache
+        display_photo = pipeline.crop().proxy(max_display_width)
+
+        def render_hold_layer():
+            display_labels = downscale_array(holds.labels, max_display_width, nearest=True)
+            return display_labels, render_labels(display_labels, make_palette(len(holds)))
+
+        def compose_holds_view():
+            display_labels, colored = render_cache.layer(
+                "hold_labels", (holds.token, max_display_width), render_hold_layer
+            )
+            if display_photo.rgb.shape[:2] != display_labels.shape:
+                return colored
+            return blend_labels(display_photo.rgb, colored, display_labels, opacity)
+
+        holds_view = render_cache.encoded("holds_view", (holds.token, display_photo.key, opacity),
+                                          compose_holds_view, "JPEG")
+        with span("hold_segmentation_viewer.display"):
+            st.image(holds_view, caption=f"Agarras Identificadas ({len(holds)})")
+    else:
+        st.warning("Nenhuma agarra encontrada com os parâmetros atuais do filtro.")
+
+    # Opcional: Exibir número de agarras e talvez um botão para "Reiniciar Identificação"
+    if st.button("Reiniciar Identificação de Agarras", key="reset_holds_button"):
+        st.session_state.holds_requested = False
+        st.rerun()
+
+    return holds
@@ -1,20 +1,20 @@
 import streamlit as st
-import numpy as np
-import cv2
-from PIL import Image # For converting back to PIL Image for display
 
-def hsv_filter_component(input_image_pil, selected_color_hsv, max_display_width):
+from utils.profiling import span
+
+def hsv_filter_component(pipeline, max_display_width):
     """
     Displays HSV sliders and applies filtering to the image.
+    The slider values become the threshold and morphology parameters of the
+    pipeline; the preview runs on a display-sized proxy of the crop, and the
+    full-resolution stages only run when the holds are requested.
     Args:
-        input_image_pil (PIL.Image.Image): The image to filter.
-        selected_color_hsv (tuple): The (H, S, V) tuple of the selected base color.
+        pipeline (Pipeline): The session pipeline (with a crop and a color).
         max_display_width (int): The maximum width to display the image.
     Returns:
-        numpy.ndarray: The filtered image as a NumPy array if successful, otherwise None.
+        tuple: (filtered proxy image, proxy binary mask) as NumPy arrays if
+               successful, otherwise (None, None).
     """
-    from utils.image_processing import apply_hsv_filter
-
     if 'hsv_tolerances' not in st.session_state:
         st.session_state.hsv_tolerances = {'H': 4, 'S': 100, 'V': 100}
     if 'erosion_iterations' not in st.session_state:
@@ -22,7 +22,8 @@ def hsv_filter_component(input_image_pil, selected_color_hsv, max_display_width)
     if 'dilation_iterations' not in st.session_state:
         st.session_state.dilation_iterations = 0
 
-    if selected_color_hsv is None or input_image_pil is None:
+    selected_color_hsv = pipeline.params["color_hsv"]
+    if selected_color_hsv is None or pipeline.crop() is None:
         st.info("Por favor, selecione uma cor e certifique-se de que a imagem esteja cortada para habilitar o filtro")
         return None, None
 
@@ -58,33 +59,28 @@ def hsv_filter_component(input_image_pil, selected_color_hsv, max_display_width)
         if new_dilation != current_dilation:
             st.session_state.dilation_iterations = new_dilation
 
-    cropped_image_np_rgb = np.array(input_image_pil.convert('RGB'))
+        pipeline.set(
+            tolerances=(new_h_tol, new_s_tol, new_v_tol),
+            erosion=new_erosion,
+            dilation=new_dilation
+        )
 
-    filtered_image_np_rgb, binary_mask = apply_hsv_filter(
-        cropped_image_np_rgb,
-        selected_color_hsv,
-        st.session_state.hsv_tolerances['H'],
-        st.session_state.hsv_tolerances['S'],
-        st.session_state.hsv_tolerances['V']
-    )
+        # Prévia instantânea pelo histograma HSV do proxy (antes da morfologia): é uma estimativa,
+        # com erro relativo maior quando poucos pixels são selecionados
+        with span("hsv_filter_ui.histogram"):
+            selected_fraction = pipeline.crop().proxy(max_display_width).histogram.fraction(
+                selected_color_hsv, new_h_tol, new_s_tol, new_v_tol
+            )
+        st.caption(
+            f"Pixels selecionados pelo filtro (estimativa, antes da erosão/dilatação): ~{selected_fraction:.1%} da imagem"
+        )
 
-    # Apply erosion and dilation
-    if binary_mask is not None:
-        kernel = np.ones((3,3), np.uint8)
-        if st.session_state.erosion_iterations > 0:
-            binary_mask = cv2.erode(binary_mask, kernel, iterations=st.session_state.erosion_iterations)
-        if st.session_state.dilation_iterations > 0:
-            binary_mask = cv2.dilate(binary_mask, kernel, iterations=st.session_state.dilation_iterations)
-        
-        # Re-apply the mask to the original image to show the effect of erosion/dilation
-        # Create a blank image with the same dimensions as the original
-        processed_image_rgb = np.zeros_like(cropped_image_np_rgb)
-        # Apply the binary mask to each channel of the original image
-        processed_image_rgb[binary_mask == 255] = cropped_image_np_rgb[binary_mask == 255]
-        filtered_image_np_rgb = processed_image_rgb
+    # Threshold, morphology and composite of the proxy run fused into the pipeline's buffers
+    filtered_image_np_rgb, binary_mask = pipeline.preview(max_display_width)
 
     with col_image:
         st.subheader("Imagem Filtrada")
-        st.image(filtered_image_np_rgb, caption="Imagem Filtrada")
+        with span("hsv_filter_ui.display"):
+            st.image(filtered_image_np_rgb, caption="Imagem Filtrada")
     
     return filtered_image_np_rgb, binary_mask
\ No newline at end of file
@@ -1,35 +1,39 @@
 import streamlit as st
-from PIL import Image
-from io import BytesIO
 from streamlit_image_coordinates import streamlit_image_coordinates
 
-MAX_IMAGE_WIDTH = 500
+from utils.profiling import span
+from utils.pyramid import MAX_IMAGE_WIDTH, box_to_full_resolution
 
-def image_cropper_component(original_image_pil):
+def image_cropper_component(image_store, max_display_width=MAX_IMAGE_WIDTH):
     """
     Streamlit component to handle image cropping based on two user clicks.
-    Updates st.session_state.crop_points and st.session_state.cropped_image_data.
+    Updates st.session_state.crop_points and the crop of the image store.
     Displays the original image for cropping and the cropped image if available.
+    The clicks are made on a display-sized proxy and the crop is taken from
+    the full-resolution image, as a view over the decoded pixels.
 
     Args:
-        original_image_pil (PIL.Image.Image): The original PIL Image object to be cropped.
+        image_store (ImageStore): The session image store holding the upload.
+        max_display_width (int): The maximum width to display the image.
 
     Returns:
-        PIL.Image.Image or None: The cropped PIL Image object if available, otherwise None.
+        CachedImage or None: The cropped image if available, otherwise None.
     """
 
-    # If already cropped, just load and display the cropped image
-    if st.session_state.cropped_image_data is not None:
-        cropped_pil_image = Image.open(BytesIO(st.session_state.cropped_image_data))
-        return cropped_pil_image
+    # If already cropped, just return the crop (a view over the decoded upload,
+    # nothing is decoded or encoded again across reruns)
+    if image_store.crop is not None:
+        return image_store.crop
     
     # If not yet cropped, show the original image for cropping interface
     else:
         st.write("Clique em dois pontos na imagem para definir os cantos superior esquerdo e inferior direito do retângulo de recorte.")
-        current_coordinates = streamlit_image_coordinates(
-            original_image_pil,
-            key="original_image_for_cropping",
-        )
+        display_image_pil = image_store.original.proxy(max_display_width).pil
+        with span("image_cropper.display"):
+            current_coordinates = streamlit_image_coordinates(
+                display_image_pil,
+                key="original_image_for_cropping",
+            )
 
         if current_coordinates:
             clicked_x = current_coordinates['x']
@@ -51,19 +55,18 @@ def image_cropper_component(original_image_pil):
                         x1, y1 = min(p1[0], p2[0]), min(p1[1], p2[1])
                         x2, y2 = max(p1[0], p2[0]), max(p1[1], p2[1])
 
-                        # Ensure coordinates are within image bounds
-                        x1 = max(0, x1)
-                        y1 = max(0, y1)
-                        x2 = min(original_image_pil.width, x2)
-                        y2 = min(original_image_pil.height, y2)
+                        # Map the proxy box to full resolution (also clips it to the image bounds)
+                        x1, y1, x2, y2 = box_to_full_resolution(
+                            (x1, y1, x2, y2), image_store.size, display_image_pil.size
+                        )
 
-                        cropped_image = original_image_pil.crop((x1, y1, x2, y2))
-                        
-                        buf = BytesIO()
-                        # Save the cropped image as a standard format (e.g., PNG)
-                        # This conversion is important for PIL to later identify it.
-                        cropped_image.save(buf, format="PNG")
-                        st.session_state.cropped_image_data = buf.getvalue()
+                        # The crop is only an offset/shape over the decoded image: no copy, no PNG
+                        try:
+                            image_store.set_crop((x1, y1, x2, y2))
+                        except ValueError as e:
+                            st.session_state.crop_points = []
+                            st.error(f"{e} Selecione os dois pontos novamente.")
+                            return None
                         
                         st.success("Imagem cortada com sucesso! Exibindo imagem cortada abaixo.")
                         st.rerun() # Rerun to display the cropped image by the next pass
@@ -0,0 +1,56 @@
+import json
+
+import streamlit as st
+
+def profiler_panel_component(profiler):
+    """
+    Painel da barra lateral com o tempo e a memória de cada etapa da última
+    execução do script, e o download de todas as execuções guardadas como
+    trace (formato Chrome trace, abre no Perfetto ou em chrome://tracing).
+    Args:
+        profiler (Profiler): O profiler da sessão (ver utils.profiling).
+    """
+    st.sidebar.subheader("Desempenho")
+    st.sidebar.checkbox(
+        "Medir alocações (tracemalloc, deixa as etapas mais lentas)",
+        key="profile_allocations"
+    )
+
+    rerun = profiler.last
+    if rerun is None:
+        st.sidebar.caption("Nenhuma execução medida ainda.")
+        return
+
+    caption = f"Última execução: {rerun.seconds * 1000:.0f} ms, {len(rerun.spans)} etapas medidas"
+    if rerun.dropped:
+        caption += f" ({rerun.dropped} descartadas)"
+    st.sidebar.caption(caption + ".")
+
+    rows = []
+    for stage in profiler.summary(rerun):
+        row = {
+            "etapa": stage["name"],
+            "chamadas": stage["calls"],
+            "total (ms)": round(stage["total_ms"], 1),
+            "máx. (ms)": round(stage["max_ms"], 1),
+        }
+        if stage["rss_delta_mb"] is not None:
+            row["Δ RSS (MB)"] = round(stage["rss_delta_mb"], 1)
+        if stage["alloc_peak_mb"] is not None:
+            row["pico aloc. (MB)"] = round(stage["alloc_peak_mb"], 1)
+        rows.append(row)
+    if rows:
+        st.sidebar.dataframe(rows, hide_index=True)
+    else:
+        st.sidebar.caption("Nenhuma etapa foi executada (tudo veio do cache).")
+
+    st.sidebar.download_button(
+        f"Baixar trace ({len(profiler.reruns)} execuções)",
+        data=json.dumps(profiler.to_chrome_trace(), separators=(",", ":")),
+        file_name="querobeta-trace.json",
+        mime="application/json",
+        key="download_profile_trace"
+    )
+    if st.sidebar.button("Limpar medições", key="clear_profile"):
+        profiler.clear()
+        st.rerun()
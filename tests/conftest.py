@@ -0,0 +1,73 @@
+"""
+Shared helpers of the test suite: the bundled example walls (imgs/ex1-ex8)
+filtered with the fixed parameters of the benchmarks.
+
+Run from the project root:
+    python -m pytest -q
+"""
+import functools
+import os
+import sys
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+from benchmarks.common import (  # noqa: E402
+    DILATION_ITERATIONS, EROSION_ITERATIONS, EXAMPLE_IMAGES, TOLERANCES, load_example, reference_color,
+)
+
+# Width the walls are scaled down to where the pure-Python reference
+# implementations would take seconds per full-size image
+SMALL_WIDTH = 400
+
+@functools.lru_cache(maxsize=None)
+def example_image(name, small=False):
+    """
+    An example wall as an RGB array, scaled down (nearest neighbour) to
+    SMALL_WIDTH when small is set. The arrays are shared: do not modify them.
+    """
+    scale = 1.0
+    if small:
+        scale = min(1.0, SMALL_WIDTH / load_example(name).shape[1])
+    return load_example(name, scale)
+
+def filter_parameters(image):
+    """
+    Filter arguments of segment_image for an example wall: its reference
+    color, the tolerances and the morphology passes of the benchmarks.
+    """
+    return (reference_color(image),) + TOLERANCES + (EROSION_ITERATIONS, DILATION_ITERATIONS)
+
+@functools.lru_cache(maxsize=None)
+def example_mask(name, small=False):
+    """
+    Binary mask (0 or 255) of an example wall after the HSV filter and the morphology.
+    """
+    from utils.image_processing import apply_morphology, hsv_mask
+
+    image = example_image(name, small)
+    color, tol_h, tol_s, tol_v, erosion, dilation = filter_parameters(image)
+    return apply_morphology(hsv_mask(image, color, tol_h, tol_s, tol_v), erosion, dilation)
+
+@functools.lru_cache(maxsize=None)
+def example_holds(name):
+    """
+    Holds of an example wall, segmented at full size.
+    """
+    from utils.image_processing import segment_image
+
+    image = example_image(name)
+    return segment_image(image, *filter_parameters(image))
+
+def assert_same_holds(actual, expected):
+    """
+    Checks that two HoldTables describe the same holds, numbered alike.
+    """
+    assert len(actual) == len(expected)
+    np.testing.assert_array_equal(actual.labels, expected.labels)
+    np.testing.assert_array_equal(actual.area, expected.area)
+    np.testing.assert_array_equal(actual.bbox, expected.bbox)
+    np.testing.assert_allclose(actual.centroid, expected.centroid, rtol=0, atol=1e-9)
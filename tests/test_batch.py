@@ -0,0 +1,49 @@
+"""
+Resuming a batch run: completed images are skipped, failed ones are run
+again, and the output keeps one record per image.
+"""
+import json
+
+import cv2
+
+from conftest import example_image, filter_parameters
+from utils.batch import DEFAULT_SETTINGS, run_batch
+
+NAMES = ["ex7.png", "ex8.png"]
+
+def write_image(directory, name):
+    cv2.imwrite(str(directory / name), cv2.cvtColor(example_image(name, small=True), cv2.COLOR_RGB2BGR))
+
+def batch_settings():
+    return {name: {**DEFAULT_SETTINGS, "color_hsv": list(filter_parameters(example_image(name, small=True))[0])}
+            for name in NAMES}
+
+def read_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def test_resume_skips_completed_images(tmp_path):
+    for name in NAMES:
+        write_image(tmp_path, name)
+    output = tmp_path / "results.jsonl"
+    assert run_batch(str(tmp_path), batch_settings(), str(output), workers=1) == {"ok": 2, "error": 0, "skipped": 0}
+    first_run = output.read_text(encoding="utf-8")
+    assert run_batch(str(tmp_path), batch_settings(), str(output), workers=1) == {"ok": 0, "error": 0, "skipped": 2}
+    assert output.read_text(encoding="utf-8") == first_run
+
+def test_resume_after_failure(tmp_path):
+    write_image(tmp_path, NAMES[0])
+    output = tmp_path / "results.jsonl"
+    # The second image is missing: its record is an error
+    assert run_batch(str(tmp_path), batch_settings(), str(output), workers=1) == {"ok": 1, "error": 1, "skipped": 0}
+    assert run_batch(str(tmp_path), batch_settings(), str(output), workers=1) == {"ok": 0, "error": 1, "skipped": 1}
+    assert [record["status"] for record in read_records(output)] == ["ok", "error"]
+
+    # A run interrupted in the middle of a line, then the missing image shows up
+    with open(output, "a", encoding="utf-8") as f:
+        f.write('{"image": "ex8.png", "sta')
+    write_image(tmp_path, NAMES[1])
+    assert run_batch(str(tmp_path), batch_settings(), str(output), workers=1) == {"ok": 1, "error": 0, "skipped": 1}
+    records = read_records(output)
+    assert [record["image"] for record in records] == NAMES
+    assert all(record["status"] == "ok" for record in records)
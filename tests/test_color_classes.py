@@ -0,0 +1,79 @@
+"""
+Multi-color classification against one threshold_hsv per color, and the
+circuits of the batch mode.
+"""
+import os
+
+import numpy as np
+import pytest
+import cv2
+
+from conftest import EXAMPLE_IMAGES, assert_same_holds, example_image, filter_parameters
+from utils.batch import process_image
+from utils.color_classes import classify_colors, segment_colors
+from utils.hsv_threshold import threshold_hsv
+from utils.image_processing import segment_image
+
+TOLERANCES = (10, 70, 70)
+
+def circuit_colors(image):
+    # The benchmark reference color plus the colors of a few other fixed pixels
+    height, width = image.shape[:2]
+    points = [(height // 2, width // 3), (height // 4, width // 2), (3 * height // 4, 2 * width // 3)]
+    pixels = np.array([[image[y, x] for y, x in points]], dtype=np.uint8)
+    colors = [filter_parameters(image)[0]]
+    colors += [tuple(int(c) for c in hsv) for hsv in cv2.cvtColor(pixels, cv2.COLOR_RGB2HSV)[0]]
+    return colors
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_classes_match_thresholds(name):
+    image = example_image(name, small=True)
+    image_hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
+    colors = circuit_colors(image)
+    classes = classify_colors(image_hsv, colors, *TOLERANCES)
+    masks = np.stack([threshold_hsv(image_hsv, color, *TOLERANCES) == 255 for color in colors])
+    # A pixel gets a class iff some color selects it, and only a color that selects it
+    np.testing.assert_array_equal(classes > 0, masks.any(axis=0))
+    for index in range(1, len(colors) + 1):
+        assert masks[index - 1][classes == index].all()
+    # Pixels selected by a single color get that color
+    single = masks.sum(axis=0) == 1
+    np.testing.assert_array_equal(classes[single], masks.argmax(axis=0)[single] + 1)
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_every_hold_gets_one_class(name):
+    image = example_image(name, small=True)
+    image_hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
+    colors = circuit_colors(image)
+    classes = classify_colors(image_hsv, colors, *TOLERANCES)
+    tables = segment_colors(image, colors, *TOLERANCES, image_hsv=image_hsv)
+    assert len(tables) == len(colors)
+    owners = np.zeros(classes.shape, dtype=np.int32)
+    for index, holds in enumerate(tables, start=1):
+        inside = holds.labels > 0
+        np.testing.assert_array_equal(inside, classes == index)
+        assert not owners[inside].any()
+        owners[inside] = index
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_single_color_matches_segment_image(name):
+    image = example_image(name)
+    color, tol_h, tol_s, tol_v, erosion, dilation = filter_parameters(image)
+    holds = segment_colors(image, [color], tol_h, tol_s, tol_v, erosion, dilation)[0]
+    assert_same_holds(holds, segment_image(image, color, tol_h, tol_s, tol_v, erosion, dilation))
+
+def test_batch_circuits(tmp_path):
+    name = EXAMPLE_IMAGES[0]
+    image = example_image(name)
+    colors = circuit_colors(image)[:2]
+    path = tmp_path / name
+    cv2.imwrite(str(path), cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+    settings = {"crop": None, "tolerances": dict(zip("HSV", TOLERANCES)), "erosion": 1, "dilation": 1,
+                "max_reach": None, "routes": 1,
+                "circuits": [{"color_hsv": list(color)} for color in colors]}
+    record = process_image(str(path), settings)
+    assert record["status"] == "ok", record.get("error")
+    expected = segment_colors(image, colors, *TOLERANCES, 1, 1)
+    assert [circuit["num_holds"] for circuit in record["circuits"]] == [len(holds) for holds in expected]
+    assert record["num_holds"] == sum(len(holds) for holds in expected)
+    assert os.path.basename(record["image"]) == name
@@ -0,0 +1,66 @@
+"""
+Per-hold statistics from the label image against OpenCV's connected
+component stats and image moments, on the example walls and on shapes
+of known orientation.
+"""
+import math
+
+import cv2
+import numpy as np
+import pytest
+
+from conftest import EXAMPLE_IMAGES, example_mask
+from utils import component_stats as component_stats_module
+from utils.component_stats import PIXEL_MOMENT, component_stats
+from utils.hold_table import HoldTable
+
+@pytest.mark.parametrize("chunk_rows", [component_stats_module.STATS_CHUNK_ROWS, 7])
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_stats_match_opencv(name, chunk_rows, monkeypatch):
+    # A small chunk puts holds across chunk boundaries
+    monkeypatch.setattr(component_stats_module, "STATS_CHUNK_ROWS", chunk_rows)
+    count, labels, cv_stats, cv_centroids = cv2.connectedComponentsWithStats(example_mask(name), connectivity=8)
+    stats = component_stats(labels)
+    assert len(stats) == count - 1
+    np.testing.assert_array_equal(stats.area, cv_stats[1:, cv2.CC_STAT_AREA])
+    np.testing.assert_array_equal(stats.bbox, cv_stats[1:, :4])
+    np.testing.assert_allclose(stats.centroid, cv_centroids[1:], atol=1e-9)
+    for label in range(1, count, max(count // 25, 1)):
+        moments = cv2.moments((labels == label).astype(np.uint8), binaryImage=True)
+        expected = np.array([moments["mu20"], moments["mu11"], moments["mu02"]]) / moments["m00"]
+        expected[[0, 2]] += PIXEL_MOMENT
+        np.testing.assert_allclose(stats.moments[label - 1], expected, rtol=1e-6, atol=1e-6)
+
+@pytest.mark.parametrize("angle", [0, 30, 90, 135])
+def test_orientation_and_elongation_of_an_ellipse(angle):
+    labels = np.zeros((200, 200), dtype=np.int32)
+    cv2.ellipse(labels, (100, 100), (60, 20), angle, 0, 360, 1, -1)
+    # A square next to it: no preferred direction
+    labels[10:30, 10:30] = 2
+    stats = component_stats(labels)
+    # Both cv2.ellipse and the orientation turn clockwise on screen (y down)
+    difference = (stats.orientation[0] - math.radians(angle) + math.pi / 2) % math.pi - math.pi / 2
+    assert abs(difference) < 0.02
+    assert stats.elongation[0] == pytest.approx(3.0, rel=0.05)
+    assert stats.elongation[1] == pytest.approx(1.0)
+
+def test_missing_labels_and_single_pixels():
+    labels = np.zeros((5, 5), dtype=np.int32)
+    labels[2, 3] = 1
+    stats = component_stats(labels, num_components=2)
+    np.testing.assert_array_equal(stats.area, [1, 0])
+    np.testing.assert_array_equal(stats.bbox, [[3, 2, 1, 1], [0, 0, 0, 0]])
+    np.testing.assert_allclose(stats.moments[0], [PIXEL_MOMENT, 0.0, PIXEL_MOMENT])
+    assert stats.elongation[0] == pytest.approx(1.0)
+    assert len(component_stats(np.zeros((0, 0), dtype=np.int32))) == 0
+
+def test_selected_table_keeps_its_stats():
+    labels = cv2.connectedComponents(example_mask(EXAMPLE_IMAGES[0]), connectivity=8)[1]
+    table = HoldTable.from_label_image(labels)
+    keep = table.area >= np.median(table.area)
+    selected = table.select(keep)
+    fresh = component_stats(selected.labels, len(selected))
+    np.testing.assert_array_equal(selected.stats.area, fresh.area)
+    np.testing.assert_array_equal(selected.stats.bbox, fresh.bbox)
+    np.testing.assert_allclose(selected.moments, fresh.moments)
+    np.testing.assert_allclose(selected.orientation, fresh.orientation)
@@ -0,0 +1,61 @@
+"""
+HSVHistogram pixel counts against the exact count of threshold_hsv: exact
+when the S and V bounds fall on bin edges, an estimate otherwise.
+"""
+import numpy as np
+import pytest
+import cv2
+
+from conftest import EXAMPLE_IMAGES, example_image
+from utils.hsv_threshold import HSVHistogram, threshold_hsv
+
+# (base color, tolerances) whose S and V ranges start and end on the edges
+# of the default 4-level bins (clipped at 0 or 255 on one side at least),
+# with plain, wrapped and full-circle hue ranges
+EXACT_BOXES = [
+    ((60, 200, 128), (10, 60, 255)),
+    ((175, 50, 200), (12, 77, 56)),
+    ((3, 128, 128), (8, 255, 255)),
+    ((90, 128, 128), (90, 255, 255)),
+]
+
+# Every HSV value
+FULL_COLOR, FULL_TOLERANCES = EXACT_BOXES[-1]
+
+# Boxes cutting through S and V bins, over the whole hue circle
+ESTIMATED_BOXES = [((hue, 120, 120), (10, 60, 60)) for hue in range(0, 180, 15)] + [
+    ((175, 150, 200), (12, 80, 80)),
+    ((0, 10, 250), (0, 30, 30)),
+]
+
+# Largest error of an estimate, as a fraction of the image
+ESTIMATE_TOLERANCE = 0.002
+
+def image_hsv(name):
+    return cv2.cvtColor(example_image(name, small=True), cv2.COLOR_RGB2HSV)
+
+def exact_count(image, base_hsv_color, tolerances):
+    return int(np.count_nonzero(threshold_hsv(image, base_hsv_color, *tolerances)))
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_count_on_bin_edges_is_exact(name):
+    image = image_hsv(name)
+    histogram = HSVHistogram(image)
+    for base_hsv_color, tolerances in EXACT_BOXES:
+        expected = exact_count(image, base_hsv_color, tolerances)
+        assert histogram.count(base_hsv_color, *tolerances) == expected
+        assert histogram.fraction(base_hsv_color, *tolerances) == pytest.approx(expected / histogram.total)
+    assert histogram.count(FULL_COLOR, *FULL_TOLERANCES) == image.shape[0] * image.shape[1]
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_count_inside_bins_is_close(name):
+    image = image_hsv(name)
+    histogram = HSVHistogram(image)
+    for base_hsv_color, tolerances in ESTIMATED_BOXES:
+        error = histogram.count(base_hsv_color, *tolerances) - exact_count(image, base_hsv_color, tolerances)
+        assert abs(error) <= ESTIMATE_TOLERANCE * histogram.total
+
+def test_empty_image():
+    histogram = HSVHistogram(np.zeros((0, 0, 3), dtype=np.uint8))
+    assert histogram.count(FULL_COLOR, *FULL_TOLERANCES) == 0
+    assert histogram.fraction(FULL_COLOR, *FULL_TOLERANCES) == 0.0
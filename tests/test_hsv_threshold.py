@@ -0,0 +1,73 @@
+"""
+The lookup-table HSV threshold against cv2.inRange, and the fused filter
+stage against the separate filter and morphology functions.
+"""
+import numpy as np
+import pytest
+import cv2
+
+from conftest import EXAMPLE_IMAGES, example_image
+from utils.filter_stage import HSVFilterStage
+from utils.hsv_threshold import threshold_hsv
+from utils.image_processing import apply_hsv_filter, apply_morphology
+
+# (base color, tolerances): plain boxes, hues wrapping past 179 and below 0,
+# S/V ranges clipped at both ends and a hue tolerance covering the circle
+BOXES = [
+    ((60, 120, 120), (10, 60, 60)),
+    ((175, 150, 200), (12, 80, 80)),
+    ((3, 200, 90), (8, 100, 100)),
+    ((0, 10, 250), (0, 30, 30)),
+    ((90, 128, 128), (90, 255, 255)),
+]
+
+def in_range_mask(image_hsv, base_hsv_color, tol_h, tol_s, tol_v):
+    # Reference: one cv2.inRange per hue interval, the wrapped part of the circle OR-ed in
+    h, s, v = base_hsv_color
+    s_range = (max(s - tol_s, 0), min(s + tol_s, 255))
+    v_range = (max(v - tol_v, 0), min(v + tol_v, 255))
+    if 2 * tol_h + 1 >= 180:
+        hue_ranges = [(0, 179)]
+    elif h - tol_h < 0:
+        hue_ranges = [(0, h + tol_h), (h - tol_h + 180, 179)]
+    elif h + tol_h > 179:
+        hue_ranges = [(h - tol_h, 179), (0, h + tol_h - 180)]
+    else:
+        hue_ranges = [(h - tol_h, h + tol_h)]
+    mask = np.zeros(image_hsv.shape[:2], dtype=np.uint8)
+    for h0, h1 in hue_ranges:
+        lower = np.array([h0, s_range[0], v_range[0]], dtype=np.uint8)
+        upper = np.array([h1, s_range[1], v_range[1]], dtype=np.uint8)
+        mask |= cv2.inRange(image_hsv, lower, upper)
+    return mask
+
+@pytest.mark.parametrize("base_hsv_color,tolerances", BOXES)
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_threshold_matches_in_range(name, base_hsv_color, tolerances):
+    image_hsv = cv2.cvtColor(example_image(name, small=True), cv2.COLOR_RGB2HSV)
+    expected = in_range_mask(image_hsv, base_hsv_color, *tolerances)
+    np.testing.assert_array_equal(threshold_hsv(image_hsv, base_hsv_color, *tolerances), expected)
+
+def test_threshold_writes_into_buffers():
+    image_hsv = cv2.cvtColor(example_image(EXAMPLE_IMAGES[0], small=True), cv2.COLOR_RGB2HSV)
+    dst = np.empty(image_hsv.shape[:2], dtype=np.uint8)
+    passed = np.empty_like(image_hsv)
+    base_hsv_color, tolerances = BOXES[1]
+    mask = threshold_hsv(image_hsv, base_hsv_color, *tolerances, dst=dst, passed=passed)
+    assert mask is dst
+    np.testing.assert_array_equal(mask, in_range_mask(image_hsv, base_hsv_color, *tolerances))
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_filter_stage_matches_filter_and_morphology(name):
+    image = example_image(name, small=True)
+    stage = HSVFilterStage()
+    # Slider moves in both directions, then a new color on the same buffers
+    steps = [(0, 0), (2, 0), (2, 3), (1, 3), (0, 1), (3, 3)]
+    for base_hsv_color, tolerances in BOXES[:2]:
+        filtered, mask = apply_hsv_filter(image, base_hsv_color, *tolerances)
+        for erosion, dilation in steps:
+            preview, stage_mask = stage.run(image, base_hsv_color, *tolerances, erosion, dilation)
+            expected_mask = apply_morphology(mask, erosion, dilation)
+            np.testing.assert_array_equal(stage_mask, expected_mask)
+            np.testing.assert_array_equal(preview, np.where(expected_mask[..., None] == 255, image, 0))
+        np.testing.assert_array_equal(stage.run(image, base_hsv_color, *tolerances)[0], filtered)
@@ -0,0 +1,62 @@
+"""
+ImageStore crops against slices of the fully decoded example walls, for
+stored images kept at native resolution and for JPEGs decoded reduced.
+"""
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from conftest import EXAMPLE_IMAGES
+from benchmarks.common import IMGS_DIR
+from utils.image_store import ImageStore
+
+# (x1, y1, x2, y2): inside the image, and running past its right/bottom edges
+BOXES = [(100, 200, 500, 700), (-20, 300, 5000, 5000)]
+
+def read_example(name):
+    with open(os.path.join(IMGS_DIR, name), "rb") as f:
+        return f.read()
+
+@pytest.mark.parametrize("box", BOXES)
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_crop_matches_full_decode(name, box):
+    data = read_example(name)
+    full = np.asarray(Image.open(os.path.join(IMGS_DIR, name)).convert("RGB"))
+    store = ImageStore()
+    store.load(name, data)
+    assert store.size == (full.shape[1], full.shape[0])
+    assert store.original.size[0] >= min(full.shape[1], 500)
+
+    crop = store.set_crop(box)
+    x1, y1 = max(box[0], 0), max(box[1], 0)
+    x2, y2 = min(box[2], full.shape[1]), min(box[3], full.shape[0])
+    assert store.crop_box == (x1, y1, x2 - x1, y2 - y1)
+    np.testing.assert_array_equal(crop.rgb, full[y1:y2, x1:x2])
+    assert not crop.rgb.flags.writeable
+    if not store.reduced:
+        # The crop is a view over the stored image
+        assert np.shares_memory(crop.rgb, store.original.rgb)
+
+def test_large_jpeg_is_stored_reduced():
+    name = "ex4.png" # a 1200x1599 JPEG
+    store = ImageStore()
+    store.load(name, read_example(name))
+    assert store.reduced
+    assert store.report.draft_scale == 2
+    assert store.original.size == (600, 800)
+    assert store.size == (1200, 1599)
+    store.set_crop((0, 0, 10, 10))
+    assert store.report.crop_seconds is not None
+
+def test_load_replaces_crop():
+    store = ImageStore()
+    with pytest.raises(ValueError):
+        store.set_crop((0, 0, 10, 10))
+    store.load(EXAMPLE_IMAGES[0], read_example(EXAMPLE_IMAGES[0]))
+    with pytest.raises(ValueError):
+        store.set_crop((50, 50, 50, 80))
+    store.set_crop((0, 0, 10, 10))
+    store.load(EXAMPLE_IMAGES[1], read_example(EXAMPLE_IMAGES[1]))
+    assert store.crop is None and store.crop_box is None
@@ -0,0 +1,73 @@
+"""
+Upload ingestion against PIL: EXIF orientation, reduced JPEG previews and
+full-resolution region decodes, on an example wall re-encoded with every
+EXIF orientation.
+"""
+import functools
+import os
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image, ImageOps
+
+from benchmarks.common import IMGS_DIR
+from utils.ingestion import EXIF_ORIENTATION, decode_preview, decode_region, oriented_view
+
+ORIENTATIONS = range(1, 9)
+# A 1200x1599 JPEG: its preview is decoded at half scale
+JPEG_EXAMPLE = "ex4.png"
+# (x1, y1, x2, y2) in upright full-resolution pixels
+REGION = (50, 60, 400, 500)
+
+@functools.lru_cache(maxsize=None)
+def encoded(orientation, image_format):
+    # The example wall re-encoded with an EXIF orientation tag
+    image = Image.open(os.path.join(IMGS_DIR, JPEG_EXAMPLE)).convert("RGB")
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = orientation
+    buffer = BytesIO()
+    image.save(buffer, image_format, exif=exif.tobytes())
+    return buffer.getvalue()
+
+def upright(data, draft=None):
+    # Reference: PIL decode (reduced if draft is given) and ImageOps.exif_transpose
+    image = Image.open(BytesIO(data))
+    if draft:
+        image.draft("RGB", (draft, draft))
+    return np.asarray(ImageOps.exif_transpose(image).convert("RGB"))
+
+@pytest.mark.parametrize("orientation", ORIENTATIONS)
+def test_oriented_view_matches_exif_transpose(orientation):
+    data = encoded(orientation, "PNG")
+    decoded = np.asarray(Image.open(BytesIO(data)).convert("RGB"))
+    view = oriented_view(decoded, orientation)
+    assert np.shares_memory(view, decoded)
+    np.testing.assert_array_equal(view, upright(data))
+
+@pytest.mark.parametrize("image_format", ["JPEG", "PNG"])
+@pytest.mark.parametrize("orientation", ORIENTATIONS)
+def test_preview_matches_pil(orientation, image_format):
+    data = encoded(orientation, image_format)
+    rgb, read_orientation, report = decode_preview(data, max_width=500)
+    assert read_orientation == orientation
+    assert rgb.flags.c_contiguous and not rgb.flags.writeable
+    full = upright(data)
+    assert report.full_size == (full.shape[1], full.shape[0])
+    if image_format == "JPEG":
+        assert report.draft_scale == 2
+        np.testing.assert_array_equal(rgb, upright(data, draft=500))
+    else:
+        assert report.draft_scale == 1
+        np.testing.assert_array_equal(rgb, full)
+    assert report.preview_size == (rgb.shape[1], rgb.shape[0])
+
+@pytest.mark.parametrize("image_format", ["JPEG", "PNG"])
+@pytest.mark.parametrize("orientation", ORIENTATIONS)
+def test_region_matches_full_decode(orientation, image_format):
+    data = encoded(orientation, image_format)
+    region, peak_bytes = decode_region(data, REGION, orientation)
+    x1, y1, x2, y2 = REGION
+    assert region.flags.c_contiguous
+    np.testing.assert_array_equal(region, upright(data)[y1:y2, x1:x2])
+    assert peak_bytes >= region.nbytes
@@ -0,0 +1,59 @@
+"""
+The labeling engines against the pure-Python BFS labeler they replaced.
+"""
+import functools
+
+import numpy as np
+import pytest
+
+from conftest import EXAMPLE_IMAGES, example_mask
+from utils.hold_table import HoldTable
+from utils.image_processing import (
+    LABELING_ENGINES, bfs_segmentation, components_from_labels, label_components, segment_holds,
+)
+
+FAST_ENGINES = sorted(set(LABELING_ENGINES) - {"bfs"})
+
+@functools.lru_cache(maxsize=None)
+def bfs_labels(name, connectivity=4):
+    # The reference labeling takes about a second per wall: run it once
+    return label_components(example_mask(name, small=True), connectivity, "bfs")
+
+@pytest.mark.parametrize("connectivity", [4, 8])
+@pytest.mark.parametrize("engine", FAST_ENGINES)
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_engine_matches_bfs(name, engine, connectivity):
+    mask = example_mask(name, small=True)
+    expected_labels, expected_stats, expected_centroids = bfs_labels(name, connectivity)
+    labels, stats, centroids = label_components(mask, connectivity, engine)
+    assert len(expected_stats) > 0
+    np.testing.assert_array_equal(labels, expected_labels)
+    np.testing.assert_array_equal(stats, expected_stats)
+    np.testing.assert_allclose(centroids, expected_centroids, rtol=0, atol=1e-9)
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_components_match_bfs(name):
+    mask = example_mask(name, small=True)
+    components = bfs_segmentation(mask)
+    expected = components_from_labels(bfs_labels(name)[0], len(bfs_labels(name)[1]))
+    assert [sorted(c) for c in components] == [sorted(c) for c in expected]
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_hold_table_matches_components(name):
+    mask = example_mask(name, small=True)
+    holds = segment_holds(mask)
+    labels, stats, _ = bfs_labels(name)
+    components = components_from_labels(labels, len(stats))
+    from_components = HoldTable.from_components(components, mask.shape)
+    np.testing.assert_array_equal(holds.labels, from_components.labels)
+    np.testing.assert_array_equal(holds.area, [len(c) for c in components])
+    np.testing.assert_array_equal(holds.bbox, from_components.bbox)
+    np.testing.assert_allclose(holds.centroid, from_components.centroid, rtol=0, atol=1e-9)
+    assert [sorted(holds.pixels(i)) for i in range(len(holds))] == [sorted(c) for c in components]
+
+def test_rejects_unknown_engine_and_connectivity():
+    mask = np.zeros((4, 4), dtype=np.uint8)
+    with pytest.raises(ValueError):
+        label_components(mask, engine="unknown")
+    with pytest.raises(ValueError):
+        label_components(mask, connectivity=6)
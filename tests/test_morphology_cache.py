@@ -0,0 +1,60 @@
+"""
+MorphologyCache against apply_morphology over slider moves, with the
+number of kernel passes each move costs, under a memory budget and across
+threshold changes.
+"""
+import numpy as np
+import pytest
+
+from conftest import EXAMPLE_IMAGES, example_image, filter_parameters
+from utils.filter_stage import MorphologyCache
+from utils.image_processing import apply_hsv_filter, apply_morphology
+
+# (erosion, dilation) slider positions, and the kernel passes each one
+# costs with an unbounded cache: one per new notch of a slider, the whole
+# dilation again when the erosion changes, none for positions already seen
+MOVES = [(0, 0), (1, 0), (2, 0), (2, 1), (2, 2), (2, 3), (1, 3), (2, 3), (3, 3), (0, 0), (3, 3)]
+PASSES = [0, 1, 1, 1, 1, 1, 3, 3, 4, 0, 0]
+
+def threshold_mask(name, tolerance_offset=0):
+    image = example_image(name, small=True)
+    color, tol_h, tol_s, tol_v, _, _ = filter_parameters(image)
+    return apply_hsv_filter(image, color, tol_h + tolerance_offset, tol_s, tol_v)[1]
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_slider_moves_match_apply_morphology(name):
+    mask = threshold_mask(name)
+    cache = MorphologyCache()
+    cache.reset("threshold", mask)
+    for (erosion, dilation), passes in zip(MOVES, PASSES):
+        before = cache.passes
+        np.testing.assert_array_equal(cache.get(erosion, dilation), apply_morphology(mask, erosion, dilation))
+        assert cache.passes - before == passes
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_budget_bounds_the_cached_masks(name):
+    mask = threshold_mask(name)
+    cache = MorphologyCache(max_bytes=3 * mask.nbytes)
+    cache.reset("threshold", mask)
+    for erosion, dilation in MOVES:
+        np.testing.assert_array_equal(cache.get(erosion, dilation), apply_morphology(mask, erosion, dilation))
+        assert cache.nbytes <= cache.max_bytes
+    # Dropped masks are computed again
+    assert cache.passes > sum(PASSES)
+
+def test_reset_reuses_the_buffers():
+    mask, other_mask = threshold_mask(EXAMPLE_IMAGES[0]), threshold_mask(EXAMPLE_IMAGES[0], tolerance_offset=5)
+    cache = MorphologyCache()
+    cache.reset("threshold", mask)
+    for erosion, dilation in MOVES:
+        cache.get(erosion, dilation)
+    buffers = {id(m) for m in [*cache._eroded.values(), *cache._dilated.values(), *cache._pool]}
+    cache.reset("other threshold", other_mask)
+    result = cache.get(2, 2)
+    assert id(result) in buffers and cache.nbytes == len(buffers) * mask.nbytes
+    np.testing.assert_array_equal(result, apply_morphology(other_mask, 2, 2))
+    # Buffers of another size are not reused
+    small_mask = np.ascontiguousarray(other_mask[: other_mask.shape[0] // 2])
+    cache.reset("smaller crop", small_mask)
+    assert cache.get(1, 1).shape == small_mask.shape
+    np.testing.assert_array_equal(cache.get(1, 1), apply_morphology(small_mask, 1, 1))
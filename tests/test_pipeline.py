@@ -0,0 +1,91 @@
+"""
+Pipeline invalidation: a parameter change only reruns the stages after it,
+and only when one of their results is asked for.
+"""
+import cv2
+import pytest
+
+from conftest import assert_same_holds, example_image, filter_parameters
+from utils.image_processing import segment_image
+from utils.pipeline import Pipeline
+
+NAME = "ex8.png"
+
+def loaded_pipeline():
+    image = example_image(NAME)
+    ok, data = cv2.imencode(".png", cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+    assert ok
+    color, tol_h, tol_s, tol_v, erosion, dilation = filter_parameters(image)
+    pipeline = Pipeline()
+    pipeline.load(NAME, data.tobytes())
+    pipeline.store.set_crop((0, 0, *pipeline.store.size))
+    pipeline.set(color_hsv=color, tolerances=(tol_h, tol_s, tol_v), erosion=erosion, dilation=dilation)
+    return pipeline
+
+def test_holds_match_segment_image():
+    pipeline = loaded_pipeline()
+    image = example_image(NAME)
+    assert_same_holds(pipeline.holds(), segment_image(image, *filter_parameters(image)))
+    assert pipeline.holds() is pipeline.cached("label")
+    assert pipeline.runs == {**pipeline.runs, "threshold": 1, "morphology": 1, "label": 1}
+
+def test_change_reruns_later_stages_only():
+    pipeline = loaded_pipeline()
+    holds = pipeline.holds()
+    pipeline.set(dilation=pipeline.params["dilation"] + 1)
+    # Nothing runs until a result is asked for
+    assert pipeline.cached("label") is None
+    assert pipeline.cached("threshold") is not None
+    assert pipeline.runs["label"] == 1
+    assert pipeline.holds() is not holds
+    assert (pipeline.runs["threshold"], pipeline.runs["morphology"], pipeline.runs["label"]) == (1, 2, 2)
+
+    pipeline.set(tolerances=(10, 90, 90))
+    pipeline.holds()
+    assert (pipeline.runs["threshold"], pipeline.runs["morphology"], pipeline.runs["label"]) == (2, 3, 3)
+
+def test_route_parameters_keep_holds():
+    pipeline = loaded_pipeline()
+    holds = pipeline.holds()
+    starts = [tuple(point) for point in holds.centroid[holds.centroid[:, 1].argsort()[-2:]]]
+    finish = tuple(holds.centroid[holds.centroid[:, 1].argmin()])
+    pipeline.set(starts=starts, finish=finish, max_reach=500)
+    routes = pipeline.routes()
+    pipeline.set(k=2)
+    assert pipeline.cached("label") is holds and pipeline.cached("graph") is not None
+    assert pipeline.cached("route") is None
+    assert routes and pipeline.routes()[0] == routes[0]
+    assert (pipeline.runs["label"], pipeline.runs["graph"], pipeline.runs["route"]) == (1, 1, 2)
+    # A larger reach rebuilds the graph, but not the holds
+    pipeline.set(max_reach=600)
+    pipeline.routes()
+    assert (pipeline.runs["label"], pipeline.runs["graph"], pipeline.runs["route"]) == (1, 2, 3)
+
+def test_memory_budget_is_not_part_of_the_key():
+    pipeline = loaded_pipeline()
+    holds = pipeline.holds()
+    pipeline.set(memory_budget=1 << 20)
+    assert pipeline.cached("label") is holds
+    pipeline.set(erosion=pipeline.params["erosion"] + 1)
+    tiled = pipeline.holds()
+    pipeline.set(memory_budget=None)
+    pipeline.set(dilation=pipeline.params["dilation"] + 1)
+    pipeline.set(dilation=pipeline.params["dilation"] - 1)
+    # Same key as the tiled run: the result is reused
+    assert pipeline.holds() is tiled
+    image = example_image(NAME)
+    color, tol_h, tol_s, tol_v, erosion, dilation = filter_parameters(image)
+    assert_same_holds(tiled, segment_image(image, color, tol_h, tol_s, tol_v, erosion + 1, dilation))
+
+def test_preview_and_new_upload():
+    pipeline = loaded_pipeline()
+    preview, mask = pipeline.preview(200)
+    assert mask.shape[1] == 200 and preview.shape[:2] == mask.shape
+    # The preview runs on the proxy, not through the full-resolution stages
+    assert pipeline.runs["threshold"] == 0
+    pipeline.holds()
+    ok, data = cv2.imencode(".png", cv2.cvtColor(example_image("ex7.png"), cv2.COLOR_RGB2BGR))
+    pipeline.load("ex7.png", data.tobytes())
+    assert pipeline.crop() is None and pipeline.holds() is None
+    with pytest.raises(ValueError):
+        pipeline.set(unknown=1)
@@ -0,0 +1,56 @@
+"""
+Profiler sessions: a rerun stopped by an exception (as st.rerun and st.stop
+do) is closed and leaves the profiler idle.
+"""
+import tracemalloc
+
+import pytest
+
+from utils import profiling
+from utils.profiling import Profiler, active, span
+
+class ScriptStopped(BaseException):
+    # Stands for Streamlit's RerunException/StopException, which are not Exceptions
+    pass
+
+def assert_idle():
+    assert profiling._recording == 0
+    assert active() is None
+    assert not tracemalloc.is_tracing()
+
+@pytest.mark.parametrize("error", [ScriptStopped, ValueError])
+@pytest.mark.parametrize("allocations", [False, True])
+def test_interrupted_session_leaves_profiler_idle(error, allocations):
+    profiler = Profiler(allocations=allocations)
+    with pytest.raises(error):
+        with profiler.session("interrupted") as rerun:
+            assert active() is profiler and profiling._recording == 1
+            assert tracemalloc.is_tracing() == allocations
+            with span("stage"):
+                raise error()
+    assert_idle()
+    assert rerun.interrupted and rerun.end is not None
+    assert [s.name for s in rerun.spans] == ["stage"]
+    # Spans outside a session are not recorded
+    with span("outside"):
+        pass
+    assert profiler.last is rerun and len(rerun.spans) == 1
+
+def test_session_records_one_rerun():
+    profiler = Profiler()
+    with profiler.session() as rerun:
+        with span("outer"):
+            with span("inner"):
+                pass
+    assert_idle()
+    assert not rerun.interrupted
+    assert [(s.name, s.depth) for s in rerun.spans] == [("inner", 1), ("outer", 0)]
+    assert {stage["name"]: stage["calls"] for stage in profiler.summary()} == {"inner": 1, "outer": 1}
+
+def test_begin_closes_an_open_rerun():
+    profiler = Profiler()
+    first = profiler.begin()
+    second = profiler.begin()
+    assert first.interrupted and profiling._recording == 1
+    assert profiler.end() is second
+    assert_idle()
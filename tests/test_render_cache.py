@@ -0,0 +1,100 @@
+"""
+RenderCache: layers are rendered again only when their key changes, views
+are composed and encoded once per key, and the encoded views are evicted
+least recently used first beyond the byte budget.
+"""
+import cv2
+import numpy as np
+import pytest
+
+from conftest import example_image
+from utils.render_cache import RenderCache, encode_image
+
+NAME = "ex8.png"
+
+def decode(data):
+    return cv2.cvtColor(cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+
+class Counter:
+    # A render or compose function counting its calls
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+def test_layer_renders_once_per_key():
+    cache = RenderCache()
+    holds, routes = Counter(np.zeros((4, 4, 3), np.uint8)), Counter(np.ones((4, 4, 3), np.uint8))
+    assert cache.layer("holds", (1, 0.5), holds) is holds.value
+    assert cache.layer("holds", (1, 0.5), holds) is holds.value
+    cache.layer("routes", (1, ()), routes)
+    assert (holds.calls, routes.calls, cache.renders) == (1, 1, 2)
+    # A new key replaces the layer; the other layers are kept
+    cache.layer("holds", (2, 0.5), holds)
+    cache.layer("holds", (1, 0.5), holds)
+    cache.layer("routes", (1, ()), routes)
+    assert (holds.calls, routes.calls, cache.renders) == (3, 1, 4)
+
+@pytest.mark.parametrize("image_format", ["PNG", "JPEG"])
+def test_encoded_view_is_composed_once(image_format):
+    image = example_image(NAME, small=True)
+    cache = RenderCache()
+    compose = Counter(image)
+    data = cache.encoded("view", ("photo", 1), compose, image_format)
+    assert cache.encoded("view", ("photo", 1), compose, image_format) is data
+    assert (compose.calls, cache.encodes) == (1, 1)
+    assert data == encode_image(image, image_format)
+    decoded = decode(data)
+    if image_format == "PNG":
+        np.testing.assert_array_equal(decoded, image)
+    else:
+        assert np.abs(decoded.astype(int) - image).mean() < 5
+    # The same view in another format or quality is another entry
+    cache.encoded("view", ("photo", 1), compose, image_format, quality=50)
+    assert compose.calls == 2
+
+def test_encoded_views_are_evicted_least_recently_used():
+    image = example_image(NAME, small=True)
+    size = len(encode_image(image))
+    cache = RenderCache(max_bytes=int(2.5 * size))
+    compose = Counter(image)
+    for key in range(3):
+        cache.encoded("view", key, compose)
+    # The first view was dropped, the others are kept
+    cache.encoded("view", 2, compose)
+    cache.encoded("view", 1, compose)
+    assert compose.calls == 3
+    cache.encoded("view", 0, compose)
+    assert compose.calls == 4 and cache.nbytes <= cache.max_bytes
+    # View 2 was used least recently: it was dropped for view 0
+    cache.encoded("view", 1, compose)
+    cache.encoded("view", 2, compose)
+    assert compose.calls == 5
+
+def test_view_above_the_budget_is_still_cached():
+    image = example_image(NAME, small=True)
+    cache = RenderCache(max_bytes=1)
+    compose = Counter(image)
+    cache.encoded("view", 0, compose)
+    cache.encoded("view", 0, compose)
+    assert compose.calls == 1
+
+def test_nbytes_and_clear():
+    image = example_image(NAME, small=True)
+    cache = RenderCache()
+    labels = np.zeros(image.shape[:2], np.int32)
+    cache.layer("holds", 1, lambda: (labels, image))
+    data = cache.encoded("view", 1, lambda: image)
+    assert cache.nbytes == labels.nbytes + image.nbytes + len(data)
+    cache.clear()
+    assert cache.nbytes == 0
+    compose = Counter(image)
+    cache.encoded("view", 1, compose)
+    assert compose.calls == 1
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        encode_image(example_image(NAME, small=True), "GIF")
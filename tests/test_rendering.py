@@ -0,0 +1,61 @@
+"""
+The palette-lookup renderer against the per-pixel coloring it replaced.
+"""
+import numpy as np
+import pytest
+
+from conftest import EXAMPLE_IMAGES, example_image, example_mask
+from utils.image_processing import bfs_segmentation, segment_holds, visualize_components_colored
+from utils.rendering import blend_labels, make_palette, render_labels
+
+# Colors of the original visualize_components_colored, in order
+CORES = [
+    (255, 0, 0), (0, 255, 0), (0, 0, 255),
+    (255, 255, 0), (255, 0, 255), (0, 255, 255),
+    (128, 0, 0), (0, 128, 0), (0, 0, 128),
+    (128, 128, 0), (128, 0, 128), (0, 128, 128),
+    (255, 128, 0), (0, 255, 128), (128, 0, 255),
+    (128, 255, 0), (0, 128, 255), (255, 0, 128),
+    (75, 0, 130), (0, 100, 0), (255, 165, 0),
+]
+
+def colored_per_pixel(components, image_shape):
+    # The original renderer: every pixel of every component painted in a Python loop
+    result = np.zeros((image_shape[0], image_shape[1], 3), dtype=np.uint8)
+    for idx, comp in enumerate(components):
+        cor = CORES[idx % len(CORES)]
+        for x, y in comp:
+            if 0 <= y < image_shape[0] and 0 <= x < image_shape[1]:
+                result[y, x] = cor
+    return result
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_colored_components_match_per_pixel(name):
+    mask = example_mask(name, small=True)
+    components = bfs_segmentation(mask)
+    expected = colored_per_pixel(components, mask.shape)
+    np.testing.assert_array_equal(visualize_components_colored(components, mask.shape), expected)
+    np.testing.assert_array_equal(visualize_components_colored(segment_holds(mask), mask.shape), expected)
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_render_labels_matches_palette_indexing(name):
+    labels = segment_holds(example_mask(name, small=True)).labels
+    palette = make_palette(int(labels.max()))
+    np.testing.assert_array_equal(render_labels(labels), palette[labels])
+    # A shorter palette is cycled, the background staying black
+    short = palette[:6]
+    expected = np.where(labels[..., None] > 0, short[1 + (labels - 1) % 5], 0)
+    np.testing.assert_array_equal(render_labels(labels, short), expected)
+
+@pytest.mark.parametrize("opacity", [0.0, 0.4, 1.0])
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_blend_matches_weighted_sum(name, opacity):
+    image = example_image(name, small=True)
+    labels = segment_holds(example_mask(name, small=True)).labels
+    colored = render_labels(labels)
+    blended = blend_labels(image, colored, labels, opacity)
+    weighted = np.rint(image * (1.0 - opacity) + colored * opacity)
+    expected = np.where(labels[..., None] > 0, weighted, image)
+    # OpenCV rounds the weighted sum in fixed point: at most one level off
+    assert np.abs(blended.astype(np.int16) - expected).max() <= 1
+    np.testing.assert_array_equal(blended[labels == 0], image[labels == 0])
@@ -0,0 +1,201 @@
+"""
+A*, Yen's k shortest routes and the batched reach queries against a brute
+force enumeration of every loopless route, on small sets of holds taken
+from the example walls; the sparse reach graphs against the exact routes
+on the whole walls.
+"""
+import math
+
+import numpy as np
+import pytest
+
+from conftest import EXAMPLE_IMAGES, example_holds
+from utils.routing import (
+    DEFAULT_REACH_FRACTION, REACH_SECTORS, ReachGraph, k_shortest_routes, reach_moves, routes_for_reaches,
+    shortest_route,
+)
+
+# Holds kept from each wall: the brute force enumerates every loopless route
+NUM_HOLDS = 9
+
+# Reaches tried, as fractions of the height spanned by the kept holds (None: no limit)
+REACH_FRACTIONS = [0.5, 0.8, 1.2, None]
+
+K = 5
+
+# Reaches of the sparse reach graphs, as fractions of the wall height
+GRAPH_REACH_FRACTIONS = [0.1, DEFAULT_REACH_FRACTION]
+
+# Longest detour of a sparse reach graph (see reach_moves)
+STRETCH = 1 / (1 - 2 * math.sin(math.pi / (2 * REACH_SECTORS)))
+
+def small_problem(name):
+    """
+    NUM_HOLDS holds of a wall spread over its height, the two lowest as
+    the start holds and the highest as the goal.
+    Returns:
+        tuple: (HoldTable, start indices, goal index, height spanned).
+    """
+    holds = example_holds(name)
+    order = np.argsort(holds.centroid[:, 1], kind="stable")
+    keep = np.sort(order[np.linspace(0, len(order) - 1, min(NUM_HOLDS, len(order))).round().astype(int)])
+    table = holds.select(keep)
+    y = table.centroid[:, 1]
+    order = np.argsort(y, kind="stable")
+    return table, order[-2:].tolist(), int(order[0]), float(y.max() - y.min())
+
+def brute_force_routes(centroids, start_indices, goal_index, max_reach=None):
+    """
+    Every loopless route from a start hold to the goal: a move goes to a
+    hold at the same or a higher altitude at most max_reach away.
+    Returns:
+        list: (length, path) pairs, shortest first.
+    """
+    routes = []
+
+    def extend(path, length):
+        current = path[-1]
+        if current == goal_index:
+            routes.append((length, path))
+            return
+        for other in range(len(centroids)):
+            if other in path or centroids[other, 1] > centroids[current, 1]:
+                continue
+            distance = math.dist(centroids[current], centroids[other])
+            if max_reach is None or distance <= max_reach:
+                extend(path + [other], length + distance)
+
+    for start in sorted(set(start_indices)):
+        extend([start], 0.0)
+    return sorted(routes)
+
+def path_length(centroids, path):
+    return sum(math.dist(centroids[a], centroids[b]) for a, b in zip(path, path[1:]))
+
+def check_route(centroids, start_indices, goal_index, max_reach, path, length):
+    # A valid route: from a start to the goal, moves upwards and within reach, of the given length
+    assert path[0] in start_indices and path[-1] == goal_index
+    assert len(set(path)) == len(path)
+    for a, b in zip(path, path[1:]):
+        assert centroids[b, 1] <= centroids[a, 1]
+        assert max_reach is None or math.dist(centroids[a], centroids[b]) <= max_reach
+    assert length == pytest.approx(path_length(centroids, path))
+
+def reaches_for(span):
+    return [None if fraction is None else fraction * span for fraction in REACH_FRACTIONS]
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_shortest_route_matches_brute_force(name):
+    table, starts, goal, span = small_problem(name)
+    centroids = table.centroid
+    for max_reach in reaches_for(span):
+        expected = brute_force_routes(centroids, starts, goal, max_reach)
+        path, length = shortest_route(centroids, starts, goal, max_reach)
+        if not expected:
+            assert path is None and length == math.inf
+            continue
+        check_route(centroids, starts, goal, max_reach, path, length)
+        assert length == pytest.approx(expected[0][0])
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_k_shortest_routes_match_brute_force(name):
+    table, starts, goal, span = small_problem(name)
+    centroids = table.centroid
+    for max_reach in reaches_for(span):
+        expected = brute_force_routes(centroids, starts, goal, max_reach)
+        routes = k_shortest_routes(centroids, starts, goal, K, max_reach, sectors=None)
+        assert len(routes) == min(K, len(expected))
+        for path, length in routes:
+            check_route(centroids, starts, goal, max_reach, path, length)
+        assert len({tuple(path) for path, _ in routes}) == len(routes)
+        assert [length for _, length in routes] == pytest.approx([length for length, _ in expected[:K]])
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_routes_for_reaches_match_brute_force(name):
+    table, starts, goal, span = small_problem(name)
+    centroids = table.centroid
+    reaches = [reach for reach in reaches_for(span) if reach is not None]
+    for (path, length), max_reach in zip(routes_for_reaches(centroids, starts, goal, reaches, sectors=None), reaches):
+        expected = brute_force_routes(centroids, starts, goal, max_reach)
+        if not expected:
+            assert path is None and length == math.inf
+            continue
+        check_route(centroids, starts, goal, max_reach, path, length)
+        assert length == pytest.approx(expected[0][0])
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_reach_graph_matches_brute_force(name):
+    table, starts, goal, span = small_problem(name)
+    centroids = table.centroid
+    reaches = [reach for reach in reaches_for(span) if reach is not None]
+    graph = ReachGraph(table, max(reaches), sectors=None)
+    for max_reach in reaches:
+        expected = brute_force_routes(centroids, starts, goal, max_reach)
+        path, length = graph.route(starts, goal, max_reach=max_reach)
+        routes = graph.routes(starts, goal, K, max_reach=max_reach)
+        if not expected:
+            assert path is None and routes == []
+            continue
+        check_route(centroids, starts, goal, max_reach, path, length)
+        assert length == pytest.approx(expected[0][0])
+        assert [length for _, length in routes] == pytest.approx([length for length, _ in expected[:K]])
+    batched = graph.routes_for_reaches(starts, goal, reaches)
+    assert [length for _, length in batched] == pytest.approx([graph.route(starts, goal, max_reach=r)[1] for r in reaches])
+
+def test_reach_graph_rejects_larger_reach():
+    table, starts, goal, span = small_problem(EXAMPLE_IMAGES[0])
+    graph = ReachGraph(table, span / 2)
+    with pytest.raises(ValueError):
+        graph.route(starts, goal, max_reach=span)
+    with pytest.raises(ValueError):
+        graph.routes_for_reaches(starts, goal, [span / 4, span])
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_reach_moves_are_moves_within_reach(name):
+    holds = example_holds(name)
+    for fraction in GRAPH_REACH_FRACTIONS:
+        reach = fraction * holds.shape[0]
+        first, second, distance = reach_moves(holds.centroid, reach)
+        every_first, every_second, every_distance = reach_moves(holds.centroid, reach, sectors=None)
+        every_move = dict(zip(zip(every_first.tolist(), every_second.tolist()), every_distance.tolist()))
+        assert len(first) <= len(every_first)
+        for move, move_distance in zip(zip(first.tolist(), second.tolist()), distance.tolist()):
+            assert move[0] < move[1] and every_move[move] == move_distance
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_sparse_routes_within_stretch(name):
+    holds = example_holds(name)
+    centroids = holds.centroid
+    order = np.argsort(centroids[:, 1], kind="stable")
+    starts = order[-2:].tolist()
+    goals = order[np.linspace(0, len(order) // 2, 5).astype(int)].tolist()
+    for fraction in GRAPH_REACH_FRACTIONS:
+        reach = fraction * holds.shape[0]
+        graph = ReachGraph(holds, reach)
+        for goal in goals:
+            reaches = [0.8 * reach, reach]
+            exact = [shortest_route(centroids, starts, goal, r, holds.spatial_index)[1] for r in reaches]
+            for (path, length), max_reach, exact_length in zip(graph.routes_for_reaches(starts, goal, reaches),
+                                                               reaches, exact):
+                # Same holds reachable, and at most STRETCH times longer
+                if exact_length == math.inf:
+                    assert path is None
+                    continue
+                check_route(centroids, starts, goal, max_reach, path, length)
+                assert exact_length - 1e-9 <= length <= STRETCH * exact_length
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_updated_reach_graph_keeps_the_moves_of_a_new_one(name):
+    holds = example_holds(name)
+    reach = DEFAULT_REACH_FRACTION * holds.shape[0]
+    rng = np.random.default_rng(0)
+    keep = np.sort(rng.choice(len(holds), int(0.9 * len(holds)), replace=False))
+    graph = ReachGraph(holds, reach)
+    # Holds removed (their neighbours are linked again), then added back
+    for table in (holds.select(keep), holds):
+        graph.update_from(table)
+        fresh = ReachGraph(table, reach)
+        for hold in range(len(table)):
+            nodes, _ = graph.neighbors(graph.node_of[hold])
+            expected, _ = fresh.neighbors(hold)
+            assert set(expected.tolist()) <= set(graph.hold_of[nodes].tolist())
@@ -0,0 +1,66 @@
+"""
+HoldIndex queries against a scan of every hold, on the example walls.
+"""
+import numpy as np
+import pytest
+
+from conftest import EXAMPLE_IMAGES, example_holds
+from utils.spatial_index import HoldIndex
+
+def query_points(holds, count=25, seed=0):
+    # Random points over the wall plus the hold centroids themselves
+    rng = np.random.default_rng(seed)
+    height, width = holds.shape
+    points = rng.uniform((0, 0), (width, height), (count, 2))
+    return np.concatenate([points, holds.centroid[:count]])
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_nearest_matches_scan(name):
+    holds = example_holds(name)
+    index = HoldIndex(holds.centroid)
+    for point in query_points(holds):
+        distance = np.hypot(*(holds.centroid - point).T)
+        assert index.nearest(point) == int(np.argmin(distance))
+        above = holds.centroid[:, 1] <= point[1]
+        expected = int(np.flatnonzero(above)[np.argmin(distance[above])]) if above.any() else -1
+        assert index.nearest(point, max_y=point[1]) == expected
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_within_matches_scan(name):
+    holds = example_holds(name)
+    index = HoldIndex(holds.centroid)
+    radius = 0.15 * max(holds.shape)
+    for point in query_points(holds):
+        distance = np.hypot(*(holds.centroid - point).T)
+        np.testing.assert_array_equal(index.within(point, radius), np.flatnonzero(distance <= radius))
+        above = holds.centroid[:, 1] <= point[1]
+        np.testing.assert_array_equal(index.within(point, radius, max_y=point[1]),
+                                      np.flatnonzero((distance <= radius) & above))
+
+@pytest.mark.parametrize("fraction", [0.02, 0.1, 0.3])
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_pairs_within_matches_scan(name, fraction):
+    centroids = example_holds(name).centroid
+    radius = fraction * np.ptp(centroids, axis=0).max()
+    first, second, distance = HoldIndex(centroids).pairs_within(radius)
+    all_distances = np.hypot(*(centroids[:, None] - centroids[None]).transpose(2, 0, 1))
+    expected_first, expected_second = np.nonzero(np.triu(all_distances <= radius, k=1))
+    order = np.lexsort((second, first))
+    np.testing.assert_array_equal(first[order], expected_first)
+    np.testing.assert_array_equal(second[order], expected_second)
+    np.testing.assert_allclose(distance[order], all_distances[expected_first, expected_second])
+
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_in_boxes_matches_scan(name):
+    holds = example_holds(name)
+    rng = np.random.default_rng(0)
+    height, width = holds.shape
+    corners = rng.uniform((-0.1 * width, -0.1 * height), (1.1 * width, 1.1 * height), (40, 2, 2))
+    boxes = np.concatenate([corners.min(axis=1), corners.max(axis=1)], axis=1)
+    # Boxes with holds on their edges, and one off the grid
+    boxes = np.concatenate([boxes, np.repeat(holds.centroid[:5], 2, axis=1), [[-20, -20, -10, -10]]])
+    box, hold = HoldIndex(holds.centroid).in_boxes(boxes)
+    x, y = holds.centroid[:, 0], holds.centroid[:, 1]
+    for index, (x0, y0, x1, y1) in enumerate(boxes):
+        expected = np.flatnonzero((x >= x0) & (x <= x1) & (y >= y0) & (y <= y1))
+        np.testing.assert_array_equal(np.sort(hold[box == index]), expected)
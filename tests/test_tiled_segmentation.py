@@ -0,0 +1,27 @@
+"""
+Tiled segmentation (bands, square tiles, parallel workers) against the
+whole image processed at once.
+"""
+import pytest
+
+from conftest import EXAMPLE_IMAGES, assert_same_holds, example_holds, example_image, filter_parameters
+from utils.image_processing import segment_image
+
+# (memory budget, workers): full-width bands, square tiles on the wider
+# walls, and the default budget split between workers
+TILINGS = [(4 * 1024 * 1024, 1), (1024 * 1024, 1), (None, 3)]
+
+@pytest.mark.parametrize("memory_budget,workers", TILINGS)
+@pytest.mark.parametrize("name", EXAMPLE_IMAGES)
+def test_tiled_matches_untiled(name, memory_budget, workers):
+    image = example_image(name)
+    holds = segment_image(image, *filter_parameters(image), memory_budget=memory_budget, workers=workers)
+    assert_same_holds(holds, example_holds(name))
+
+@pytest.mark.parametrize("connectivity", [4, 8])
+def test_tiled_matches_untiled_connectivity(connectivity):
+    image = example_image(EXAMPLE_IMAGES[0])
+    parameters = filter_parameters(image)
+    expected = segment_image(image, *parameters, connectivity=connectivity)
+    holds = segment_image(image, *parameters, connectivity=connectivity, memory_budget=1024 * 1024, workers=2)
+    assert_same_holds(holds, expected)
@@ -1,3 +1,37 @@
+"""
+Image processing and route search of Quero Beta.
 
+Importing the package is free: the submodules (and OpenCV, NumPy and PIL
+with them) are only loaded when one of the names below, or the submodule
+itself, is first used.
+"""
+import importlib
 
+# Public names of the package and the submodule that defines each one
+_EXPORTS = {
+    "Pipeline": "utils.pipeline",
+    "ImageStore": "utils.image_store",
+    "CachedImage": "utils.image_cache",
+    "HoldTable": "utils.hold_table",
+    "RenderCache": "utils.render_cache",
+    "Profiler": "utils.profiling",
+    "segment_image": "utils.image_processing",
+    "segment_holds": "utils.image_processing",
+    "find_routes": "utils.image_processing",
+    "find_fastest_route": "utils.image_processing",
+    "MAX_IMAGE_WIDTH": "utils.pyramid",
+}
 
+__all__ = sorted(_EXPORTS)
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    # Later lookups find the name directly and skip __getattr__
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,307 @@
+"""
+Headless batch run of the hold detection and route search over a
+directory of wall photos, on a process pool.
+
+Every image listed in the JSON spec goes through the same stages as the
+app (decode, crop, HSV filter, morphology, labeling, routes) and one JSON
+line per image is appended to the output as soon as it is done. An image
+may list several circuits (one reference color each, with their own
+clicks): their holds are then found from one HSV pass over the crop,
+every pixel going to the nearest color (see utils.color_classes). Images
+whose last record has status "ok" are skipped when the run is started
+again, so an interrupted run resumes where it stopped; the others are
+run again and their old records dropped, one record per image.
+
+Usage (from the project root):
+    python -m utils.batch imgs spec.json --output results.jsonl --workers 4
+
+Spec format (coordinates of the clicks are in pixels of the crop, as in
+the app; every key of "defaults" can be overridden per image):
+    {
+        "defaults": {"tolerances": {"H": 4, "S": 100, "V": 100},
+                     "erosion": 0, "dilation": 0, "max_reach": null, "routes": 1},
+        "images": {
+            "ex1.png": {"crop": [x1, y1, x2, y2],
+                        "color_hsv": [h, s, v],   (or "color_rgb" / "color_point": [x, y])
+                        "starts": [[x, y], [x, y]], "finish": [x, y]},
+            "ex2.png": {"circuits": [{"color_hsv": [h, s, v], "starts": [[x, y]], "finish": [x, y]},
+                                     {"color_point": [x, y]}]}
+        }
+    }
+A circuit may also override "routes" and "max_reach"; the tolerances and
+the morphology are shared by the circuits of an image.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from multiprocessing import Pool
+
+import numpy as np
+import cv2
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+from utils.color_classes import segment_colors
+from utils.image_processing import find_routes, segment_image
+from utils.image_store import ImageStore
+from utils.routing import reach_graph_for
+from utils.tiled_segmentation import DEFAULT_MEMORY_BUDGET
+
+# Settings used when neither the image nor the spec defaults give them (same as the app)
+DEFAULT_SETTINGS = {
+    "crop": None,
+    "tolerances": {"H": 4, "S": 100, "V": 100},
+    "erosion": 0,
+    "dilation": 0,
+    "max_reach": None,
+    "routes": 1,
+}
+
+# Images processed by a worker process before it is replaced, which
+# returns whatever memory the worker accumulated to the system
+DEFAULT_MAX_TASKS_PER_CHILD = 8
+
+def load_spec(path):
+    """
+    Reads a batch spec and merges the defaults into the settings of every image.
+    Args:
+        path (str): Path of the JSON spec.
+    Returns:
+        dict: {image name: settings}.
+    """
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    if not isinstance(spec.get("images"), dict):
+        raise ValueError("A especificação precisa de um objeto 'images' com as configurações de cada imagem.")
+    defaults = {**DEFAULT_SETTINGS, **spec.get("defaults", {})}
+    return {name: {**defaults, **(settings or {})} for name, settings in spec["images"].items()}
+
+def reference_hsv(crop_rgb, settings):
+    """
+    Reference color of the filter, from "color_hsv", "color_rgb" or the
+    pixel of the crop at "color_point" (as clicked in the app).
+    Returns:
+        tuple: (H, S, V) in the OpenCV range.
+    """
+    if settings.get("color_hsv") is not None:
+        return tuple(int(c) for c in settings["color_hsv"])
+    if settings.get("color_rgb") is not None:
+        rgb = np.array([[settings["color_rgb"]]], dtype=np.uint8)
+    elif settings.get("color_point") is not None:
+        x, y = (int(v) for v in settings["color_point"])
+        rgb = np.ascontiguousarray(crop_rgb[y:y + 1, x:x + 1])
+        if rgb.size == 0:
+            raise ValueError(f"O ponto de cor {settings['color_point']} está fora do recorte.")
+    else:
+        raise ValueError("Informe a cor de referência ('color_hsv', 'color_rgb' ou 'color_point').")
+    return tuple(int(c) for c in cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV)[0, 0])
+
+def _holds_and_routes(holds, settings):
+    """
+    JSON fields of one set of holds: the holds and the routes between the
+    clicks of the settings, if any.
+    """
+    routes = []
+    if settings.get("starts") and settings.get("finish"):
+        starts = [tuple(point) for point in settings["starts"]]
+        finish = tuple(settings["finish"])
+        max_reach = settings.get("max_reach")
+        graph = reach_graph_for(holds, max_reach) if max_reach else None
+        routes = find_routes(holds, starts, finish, k=int(settings["routes"]), max_reach=max_reach, graph=graph)
+    return {
+        "num_holds": len(holds),
+        "holds": {
+            "centroid": np.round(holds.centroid, 2).tolist(),
+            "area": holds.area.tolist(),
+            "bbox": holds.bbox.tolist(),
+        },
+        "routes": [[[round(x, 2), round(y, 2)] for x, y in route] for route in routes],
+    }
+
+def process_image(path, settings, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """
+    Runs the whole pipeline on one image. Errors are returned as a record
+    with status "error" instead of being raised, so one bad image does not
+    stop the batch.
+    Args:
+        path (str): Path of the image.
+        settings (dict): Settings of the image (see load_spec).
+        memory_budget (int): Working memory budget of the segmentation, in bytes.
+    Returns:
+        dict: The JSON record of the image.
+    """
+    record = {"image": os.path.basename(path)}
+    timings = {}
+    start = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        store = ImageStore()
+        store.load(record["image"], data)
+        crop_box = settings.get("crop") or (0, 0, *store.size)
+        crop = store.set_crop(crop_box)
+        del data
+        timings["decode"] = time.perf_counter() - start
+
+        tolerances = settings["tolerances"]
+        tol_h, tol_s, tol_v = tolerances["H"], tolerances["S"], tolerances["V"]
+        record.update({"size": list(store.size), "crop": list(store.crop_box)})
+        if settings.get("circuits"):
+            # Circuit settings fall back to the image's for the route options only
+            circuits = [{**settings, "color_hsv": None, "color_rgb": None, "color_point": None,
+                         "starts": None, "finish": None, **circuit} for circuit in settings["circuits"]]
+            colors = [reference_hsv(crop.rgb, circuit) for circuit in circuits]
+            step = time.perf_counter()
+            # One classification pass over the whole crop (not tiled: the class map is one byte per pixel)
+            tables = segment_colors(crop.rgb, colors, tol_h, tol_s, tol_v,
+                                    settings["erosion"], settings["dilation"], image_hsv=crop.hsv)
+            timings["segment"] = time.perf_counter() - step
+            step = time.perf_counter()
+            record["circuits"] = [{"color_hsv": list(color), **_holds_and_routes(holds, circuit)}
+                                  for color, holds, circuit in zip(colors, tables, circuits)]
+            timings["route"] = time.perf_counter() - step
+            record["num_holds"] = sum(circuit["num_holds"] for circuit in record["circuits"])
+        else:
+            color = reference_hsv(crop.rgb, settings)
+            step = time.perf_counter()
+            # The tiled segmentation keeps the working memory of every worker within the budget
+            holds = segment_image(crop.rgb, color, tol_h, tol_s, tol_v,
+                                  settings["erosion"], settings["dilation"], memory_budget=memory_budget)
+            timings["segment"] = time.perf_counter() - step
+            step = time.perf_counter()
+            record.update({"color_hsv": list(color), **_holds_and_routes(holds, settings)})
+            timings["route"] = time.perf_counter() - step
+
+        record.update({"status": "ok", "ingest": store.report.to_dict()})
+    except Exception as e:
+        record.update({"status": "error", "error": f"{type(e).__name__}: {e}",
+                       "traceback": traceback.format_exc(limit=3)})
+    timings["total"] = time.perf_counter() - start
+    record["timings"] = {name: round(seconds, 4) for name, seconds in timings.items()}
+    if resource is not None:
+        # ru_maxrss is in KiB on Linux and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        record["worker_peak_rss"] = peak if sys.platform == "darwin" else peak * 1024
+    return record
+
+def latest_records(output_path):
+    """
+    Last record of every image in an output file, in the order of those
+    records (a line cut short by an interrupted run is ignored). An image re-run after an
+    error has several records: only the last one counts.
+    Returns:
+        dict: {image name: (record, JSON line)}.
+    """
+    records = {}
+    if not os.path.exists(output_path):
+        return records
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                records.pop(record.get("image"), None)
+                records[record.get("image")] = (record, line.rstrip("\n"))
+    return records
+
+def _rewrite_records(output_path, lines):
+    # Written next to the output and swapped in, so an interrupted rewrite loses nothing
+    partial_path = output_path + ".partial"
+    with open(partial_path, "w", encoding="utf-8") as f:
+        f.writelines(line + "\n" for line in lines)
+    os.replace(partial_path, output_path)
+
+def _process_task(task):
+    return process_image(*task)
+
+def _init_worker(opencv_threads):
+    # One OpenCV thread per process by default: the pool already uses every CPU
+    cv2.setNumThreads(opencv_threads)
+
+def run_batch(directory, settings_by_image, output_path, workers=None,
+              max_tasks_per_child=DEFAULT_MAX_TASKS_PER_CHILD,
+              memory_budget=DEFAULT_MEMORY_BUDGET, resume=True, opencv_threads=1,
+              progress=None):
+    """
+    Processes every image of the spec on a process pool and appends one
+    JSON line per image to output_path, as each one finishes.
+    Args:
+        directory (str): Directory with the images.
+        settings_by_image (dict): {image name: settings} (see load_spec).
+        output_path (str): JSON Lines output file.
+        workers (int, optional): Number of worker processes (defaults to the CPU count).
+        max_tasks_per_child (int): Images per worker process before it is replaced.
+        memory_budget (int): Segmentation memory budget per worker, in bytes.
+        resume (bool): Skip the images whose last record in output_path has
+                       status "ok", keeping one record per image; if False
+                       the output is overwritten.
+        opencv_threads (int): OpenCV threads inside each worker.
+        progress (callable, optional): Called with each record as it is written.
+    Returns:
+        dict: Counts of "ok", "error" and "skipped" images.
+    """
+    records = latest_records(output_path) if resume else {}
+    done = {name for name, (record, _) in records.items() if record.get("status") == "ok"}
+    pending = [name for name in settings_by_image if name not in done]
+    counts = {"ok": 0, "error": 0, "skipped": len(settings_by_image) - len(pending)}
+    if resume and os.path.exists(output_path):
+        # One record per image: earlier attempts, cut lines and the errors about to be retried are dropped
+        _rewrite_records(output_path, [line for name, (_, line) in records.items() if name not in pending])
+    if not pending:
+        return counts
+
+    tasks = [(os.path.join(directory, name), settings_by_image[name], memory_budget) for name in pending]
+    # Pool recycles its workers after maxtasksperchild images (ProcessPoolExecutor's
+    # max_tasks_per_child can stall once every worker has exited on Python 3.11)
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as out, \
+         Pool(workers, _init_worker, (opencv_threads,), maxtasksperchild=max_tasks_per_child) as pool:
+        for record in pool.imap_unordered(_process_task, tasks):
+            out.write(json.dumps(record, separators=(",", ":")) + "\n")
+            out.flush()
+            counts[record["status"]] += 1
+            if progress is not None:
+                progress(record)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="Diretório com as fotos das paredes.")
+    parser.add_argument("spec", help="Arquivo JSON com as configurações de cada imagem.")
+    parser.add_argument("--output", default="results.jsonl", help="Arquivo de saída (JSON Lines).")
+    parser.add_argument("--workers", type=int, default=None, help="Processos em paralelo (padrão: número de CPUs).")
+    parser.add_argument("--max-tasks-per-child", type=int, default=DEFAULT_MAX_TASKS_PER_CHILD,
+                        help="Imagens por processo antes de ele ser substituído.")
+    parser.add_argument("--memory-budget", type=int, default=DEFAULT_MEMORY_BUDGET // (1024 * 1024),
+                        help="Memória de trabalho da segmentação por processo, em MB.")
+    parser.add_argument("--opencv-threads", type=int, default=1, help="Threads do OpenCV por processo.")
+    parser.add_argument("--restart", action="store_true",
+                        help="Reprocessa todas as imagens, sobrescrevendo a saída.")
+    args = parser.parse_args()
+
+    settings_by_image = load_spec(args.spec)
+
+    def report(record):
+        if record["status"] == "ok":
+            num_routes = sum(len(circuit["routes"]) for circuit in record.get("circuits", [record]))
+            print(f"{record['image']}: {record['num_holds']} agarras, {num_routes} rotas"
+                  f" em {record['timings']['total']:.2f} s")
+        else:
+            print(f"{record['image']}: erro - {record['error']}")
+
+    counts = run_batch(
+        args.directory, settings_by_image, args.output, args.workers, args.max_tasks_per_child,
+        args.memory_budget * 1024 * 1024, resume=not args.restart, opencv_threads=args.opencv_threads,
+        progress=report
+    )
+    print(f"Concluídas: {counts['ok']}  erros: {counts['error']}  já processadas: {counts['skipped']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import numpy as np
+import cv2
+
+from utils.hsv_threshold import CHANNEL_LEVELS, HUE_LEVELS
+from utils.image_processing import DEFAULT_LABELING_ENGINE, apply_morphology, segment_holds
+
+# Per-channel cost of a value at the tolerance limit; costs are squared
+# normalized distances scaled to integers so they fit the uint16 lookup tables
+COST_SCALE = 1000
+# Cost of a value outside the tolerance: three of them still fit in uint16
+OUT_OF_RANGE_COST = 65535 // 3
+
+# Rows classified at a time, so every color is tested while the rows are in cache
+CLASSIFY_CHUNK_ROWS = 128
+
+def _channel_costs(reference, tolerance, levels, circular=False):
+    values = np.arange(CHANNEL_LEVELS)
+    distance = np.abs(values - int(reference))
+    if circular:
+        distance = np.minimum(distance, levels - distance)
+    cost = np.rint(COST_SCALE * (distance / max(int(tolerance), 1)) ** 2)
+    cost[(distance > int(tolerance)) | (values >= levels)] = OUT_OF_RANGE_COST
+    return np.minimum(cost, OUT_OF_RANGE_COST).astype(np.uint16)
+
+def color_cost_lut(reference_hsv_color, tol_h, tol_s, tol_v):
+    """
+    Builds the (1, 256, 3) uint16 lookup table giving, per channel, the
+    squared distance to a reference color normalized by its tolerance
+    (hue is circular). Values outside the tolerance get OUT_OF_RANGE_COST.
+    """
+    h, s, v = reference_hsv_color
+    lut = np.empty((1, CHANNEL_LEVELS, 3), dtype=np.uint16)
+    lut[0, :, 0] = _channel_costs(h, tol_h, HUE_LEVELS, circular=True)
+    lut[0, :, 1] = _channel_costs(s, tol_s, CHANNEL_LEVELS)
+    lut[0, :, 2] = _channel_costs(v, tol_v, CHANNEL_LEVELS)
+    return lut
+
+def classify_colors(image_hsv, reference_hsv_colors, tol_h, tol_s, tol_v):
+    """
+    Assigns every pixel to at most one color class: the nearest reference
+    color whose tolerance box contains it (ties go to the first color).
+    The image is walked once, a block of rows at a time.
+    Args:
+        image_hsv (numpy.ndarray): Image in HSV format (OpenCV range).
+        reference_hsv_colors (list): Reference (H, S, V) colors (at most 255).
+        tol_h (int): Hue tolerance.
+        tol_s (int): Saturation tolerance.
+        tol_v (int): Value tolerance.
+    Returns:
+        numpy.ndarray: uint8 class map, 0 for no color and k for the k-th color.
+    """
+    if len(reference_hsv_colors) > 255:
+        raise ValueError("No máximo 255 cores de referência por imagem.")
+    luts = [color_cost_lut(color, tol_h, tol_s, tol_v) for color in reference_hsv_colors]
+    in_range_limit = 3 * COST_SCALE
+
+    height, width = image_hsv.shape[:2]
+    classes = np.zeros((height, width), dtype=np.uint8)
+    rows = min(CLASSIFY_CHUNK_ROWS, height) or 1
+    channel_costs = np.empty((rows, width, 3), dtype=np.uint16)
+    cost = np.empty((rows, width), dtype=np.uint16)
+    best = np.empty((rows, width), dtype=np.uint16)
+    closer = np.empty((rows, width), dtype=bool)
+
+    for y in range(0, height, rows):
+        chunk = image_hsv[y:y + rows]
+        n = len(chunk)
+        chunk_costs, chunk_cost, chunk_best, chunk_closer = channel_costs[:n], cost[:n], best[:n], closer[:n]
+        chunk_classes = classes[y:y + n]
+        chunk_best.fill(in_range_limit + 1)
+        for index, lut in enumerate(luts, start=1):
+            cv2.LUT(chunk, lut, dst=chunk_costs)
+            np.add(chunk_costs[:, :, 0], chunk_costs[:, :, 1], out=chunk_cost)
+            np.add(chunk_cost, chunk_costs[:, :, 2], out=chunk_cost)
+            np.less(chunk_cost, chunk_best, out=chunk_closer)
+            np.copyto(chunk_best, chunk_cost, where=chunk_closer)
+            chunk_classes[chunk_closer] = index
+    return classes
+
+def segment_colors(image_np_rgb, reference_hsv_colors, tol_h, tol_s, tol_v,
+                   erosion_iterations=0, dilation_iterations=0,
+                   connectivity=4, engine=DEFAULT_LABELING_ENGINE, image_hsv=None):
+    """
+    Segments the holds of several circuits at once: one HSV conversion and
+    one classification pass, then morphology and labeling per color class.
+    Args:
+        image_np_rgb (numpy.ndarray): Input image as a NumPy array in RGB format.
+        reference_hsv_colors (list): Reference (H, S, V) colors, one per circuit.
+        tol_h (int): Hue tolerance.
+        tol_s (int): Saturation tolerance.
+        tol_v (int): Value tolerance.
+        erosion_iterations (int): Number of erosion passes.
+        dilation_iterations (int): Number of dilation passes.
+        connectivity (int): 4 or 8 pixel connectivity.
+        engine (str): Name of the labeling engine (see LABELING_ENGINES).
+        image_hsv (numpy.ndarray, optional): Precomputed HSV version of the image.
+    Returns:
+        list: One HoldTable per reference color, in the same order.
+    """
+    if image_hsv is None:
+        image_hsv = cv2.cvtColor(image_np_rgb, cv2.COLOR_RGB2HSV)
+    classes = classify_colors(image_hsv, reference_hsv_colors, tol_h, tol_s, tol_v)
+
+    tables = []
+    mask = np.empty(classes.shape, dtype=np.uint8)
+    for index in range(1, len(reference_hsv_colors) + 1):
+        cv2.compare(classes, index, cv2.CMP_EQ, dst=mask)
+        class_mask = apply_morphology(mask, erosion_iterations, dilation_iterations)
+        tables.append(segment_holds(class_mask, connectivity, engine))
+    return tables
@@ -0,0 +1,94 @@
+import numpy as np
+
+# Rows reduced at a time, so the per-pixel temporaries stay small
+STATS_CHUNK_ROWS = 256
+
+# Second moment of a unit pixel around its own center, so even one-pixel
+# or one-pixel-wide holds have a well-defined shape
+PIXEL_MOMENT = 1.0 / 12.0
+
+class ComponentStats:
+    """
+    Per-hold statistics computed from a label image, as parallel NumPy
+    arrays indexed by label - 1:
+        area (N,): number of pixels.
+        bbox (N, 4): bounding box (x, y, width, height).
+        centroid (N, 2): mean (cx, cy).
+        moments (N, 3): central second moments (mu20, mu11, mu02) per pixel,
+                        i.e. the covariance of the hold's area.
+        orientation (N,): angle of the major axis in radians, in (-pi/2, pi/2],
+                          measured from the x axis in image coordinates (y down).
+        elongation (N,): major / minor axis length ratio (1 for a disc or square).
+    """
+
+    def __init__(self, area, bbox, centroid, moments):
+        self.area = area
+        self.bbox = bbox
+        self.centroid = centroid
+        self.moments = moments
+        mu20, mu11, mu02 = moments.T
+        self.orientation = 0.5 * np.arctan2(2 * mu11, mu20 - mu02)
+        half_trace = (mu20 + mu02) / 2
+        spread = np.sqrt(((mu20 - mu02) / 2) ** 2 + mu11 ** 2)
+        self.elongation = np.sqrt((half_trace + spread) / (half_trace - spread))
+
+    def __len__(self):
+        return len(self.area)
+
+def component_stats(labels, num_components=None):
+    """
+    Computes area, bounding box, centroid and shape moments of every hold
+    with a few bincount / minimum.at reductions over the label image,
+    STATS_CHUNK_ROWS rows at a time.
+    Args:
+        labels (numpy.ndarray): Label image (0 for the background, k for the k-th hold).
+        num_components (int, optional): Number of holds (defaults to labels.max()).
+    Returns:
+        ComponentStats: The statistics of holds 1..num_components.
+    """
+    if num_components is None:
+        num_components = int(labels.max()) if labels.size else 0
+    size = num_components + 1
+    height, width = labels.shape
+    area = np.zeros(size, dtype=np.int64)
+    sums = np.zeros((5, size)) # x, y, xx, xy, yy
+    low = np.full((2, size), np.iinfo(np.int64).max)
+    high = np.full((2, size), -1, dtype=np.int64)
+
+    for y0 in range(0, height, STATS_CHUNK_ROWS):
+        chunk = labels[y0:y0 + STATS_CHUNK_ROWS]
+        ys, xs = np.nonzero(chunk)
+        if not len(xs):
+            continue
+        owners = chunk[ys, xs]
+        ys = ys + y0
+        area += np.bincount(owners, minlength=size)
+        np.minimum.at(low[0], owners, xs)
+        np.minimum.at(low[1], owners, ys)
+        np.maximum.at(high[0], owners, xs)
+        np.maximum.at(high[1], owners, ys)
+        xs, ys = xs.astype(np.float64), ys.astype(np.float64)
+        sums[0] += np.bincount(owners, xs, minlength=size)
+        sums[1] += np.bincount(owners, ys, minlength=size)
+        sums[2] += np.bincount(owners, xs * xs, minlength=size)
+        sums[3] += np.bincount(owners, xs * ys, minlength=size)
+        sums[4] += np.bincount(owners, ys * ys, minlength=size)
+
+    area, sums, low, high = area[1:], sums[:, 1:], low[:, 1:], high[:, 1:]
+    present = area > 0
+    count = np.maximum(area, 1)
+    cx, cy = sums[0] / count, sums[1] / count
+    moments = np.stack([
+        sums[2] / count - cx * cx + PIXEL_MOMENT,
+        sums[3] / count - cx * cy,
+        sums[4] / count - cy * cy + PIXEL_MOMENT,
+    ], axis=1)
+    # Cancellation can leave tiny negative variances; the pixel term keeps them positive
+    moments[:, [0, 2]] = np.maximum(moments[:, [0, 2]], PIXEL_MOMENT)
+
+    bbox = np.zeros((num_components, 4), dtype=np.int32)
+    bbox[present, 0] = low[0, present]
+    bbox[present, 1] = low[1, present]
+    bbox[present, 2] = high[0, present] - low[0, present] + 1
+    bbox[present, 3] = high[1, present] - low[1, present] + 1
+    return ComponentStats(area, bbox, np.stack([cx, cy], axis=1), moments)
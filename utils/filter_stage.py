@@ -0,0 +1,173 @@
+import numpy as np
+import cv2
+
+from utils.hsv_threshold import threshold_hsv
+from utils.image_processing import MORPHOLOGY_KERNEL
+from utils.profiling import profiled
+
+# Maximum bytes of intermediate masks kept by a MorphologyCache
+DEFAULT_MORPHOLOGY_CACHE_BYTES = 64 * 1024 * 1024
+
+class MorphologyCache:
+    """
+    Incremental erosion -> dilation of one threshold mask.
+    Eroded masks are cached per erosion count, and dilated masks per
+    dilation count for the current erosion count, so moving a slider from
+    N to N+1 costs a single 3x3 kernel pass. Everything is dropped when the
+    threshold mask changes (new tolerances, color or crop), and the freed
+    buffers are reused for the next mask. Above max_bytes, the cached masks
+    farthest from the current slider positions are dropped first.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MORPHOLOGY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.key = None
+        self.passes = 0 # Kernel passes run so far
+        self._base = None
+        self._eroded = {}
+        self._dilated = {}
+        self._dilated_from = None
+        self._target = (0, 0)
+        self._pool = []
+
+    def reset(self, key, base_mask):
+        """
+        Starts caching for a new threshold mask.
+        Args:
+            key (hashable): Identifies the threshold (tolerances, color, crop).
+            base_mask (numpy.ndarray): The thresholded mask. It is not copied,
+                                       so it must not change until the next reset.
+        """
+        recycled = self._pool + list(self._eroded.values()) + list(self._dilated.values())
+        self._pool = [m for m in recycled if m.shape == base_mask.shape]
+        self._eroded, self._dilated = {}, {}
+        self._dilated_from = None
+        self._base = base_mask
+        self.key = key
+
+    @property
+    def nbytes(self):
+        return sum(m.nbytes for m in list(self._eroded.values()) + list(self._dilated.values()) + self._pool)
+
+    def _evict(self, protected):
+        erosion, dilation = self._target
+        candidates = [(abs(k - erosion), self._eroded, k) for k, m in self._eroded.items()
+                      if k != self._dilated_from and m is not protected]
+        candidates += [(abs(k - dilation), self._dilated, k) for k, m in self._dilated.items()
+                       if m is not protected]
+        if not candidates:
+            return False
+        _, chain, count = max(candidates, key=lambda c: c[0])
+        self._pool.append(chain.pop(count))
+        return True
+
+    def _buffer(self, protected):
+        if self._pool:
+            return self._pool.pop()
+        mask_bytes = self._base.nbytes
+        while self.nbytes + mask_bytes > self.max_bytes and self._evict(protected):
+            if self._pool:
+                return self._pool.pop()
+        return np.empty_like(self._base)
+
+    def _extend(self, chain, base, target, operation):
+        start = max((k for k in chain if k <= target), default=0)
+        mask = chain[start] if start else base
+        for count in range(start + 1, target + 1):
+            out = self._buffer(protected=mask)
+            operation(mask, MORPHOLOGY_KERNEL, dst=out)
+            self.passes += 1
+            chain[count] = out
+            mask = out
+        return mask
+
+    def get(self, erosion_iterations, dilation_iterations):
+        """
+        Returns the mask eroded and then dilated the given number of times
+        (same result as apply_morphology). The returned mask is owned by the cache.
+        """
+        self._target = (erosion_iterations, dilation_iterations)
+        eroded = self._extend(self._eroded, self._base, erosion_iterations, cv2.erode)
+        if dilation_iterations == 0:
+            return eroded
+        if self._dilated_from != erosion_iterations:
+            self._pool.extend(self._dilated.values())
+            self._dilated = {}
+            self._dilated_from = erosion_iterations
+        return self._extend(self._dilated, eroded, dilation_iterations, cv2.dilate)
+
+class HSVFilterStage:
+    """
+    Fused HSV threshold -> morphology -> composite stage.
+    Every step writes into buffers preallocated for the current crop size
+    (reallocated only when the size changes), and the preview is composited
+    with a single broadcast AND against the mask instead of boolean gathers,
+    so a slider tick allocates no full-size temporaries. The threshold is
+    only recomputed when the color, tolerances or crop change; erosion and
+    dilation slider moves are served by a MorphologyCache.
+    The returned arrays are owned by the stage and overwritten on the next
+    call: copy them if they must outlive it. Use one stage per session.
+    """
+
+    def __init__(self):
+        self.shape = None
+        self.morphology = MorphologyCache()
+        self._source = None
+
+    def _ensure_buffers(self, shape):
+        if self.shape == shape:
+            return
+        height, width = shape
+        self.shape = shape
+        self._hsv = np.empty((height, width, 3), dtype=np.uint8)
+        self._passed = np.empty((height, width, 3), dtype=np.uint8)
+        self._mask = np.empty((height, width), dtype=np.uint8)
+        self._preview = np.empty((height, width, 3), dtype=np.uint8)
+
+    @property
+    def nbytes(self):
+        if self.shape is None:
+            return 0
+        buffers = sum(b.nbytes for b in (self._hsv, self._passed, self._mask, self._preview))
+        return buffers + self.morphology.nbytes
+
+    def invalidate(self):
+        """
+        Forces the next run to recompute the threshold and morphology.
+        """
+        self._source = None
+
+    @profiled("filter_stage.run")
+    def run(self, image_np_rgb, base_hsv_color, tol_h, tol_s, tol_v,
+            erosion_iterations=0, dilation_iterations=0, image_hsv=None):
+        """
+        Filters an image by color, cleans the mask and composites the preview.
+        Args:
+            image_np_rgb (numpy.ndarray): Input image as a NumPy array in RGB format.
+            base_hsv_color (tuple): The base color (H, S, V) to filter around (OpenCV range).
+            tol_h (int): Hue tolerance.
+            tol_s (int): Saturation tolerance.
+            tol_v (int): Value tolerance.
+            erosion_iterations (int): Number of erosion passes.
+            dilation_iterations (int): Number of dilation passes.
+            image_hsv (numpy.ndarray, optional): Precomputed HSV version of the image.
+        Returns:
+            tuple: (preview in RGB where pixels outside the mask are black,
+                   binary mask with 255 for the selected pixels), both
+                   stage-owned buffers.
+        """
+        self._ensure_buffers(image_np_rgb.shape[:2])
+        threshold_key = (tuple(int(c) for c in base_hsv_color), int(tol_h), int(tol_s), int(tol_v))
+        if image_np_rgb is not self._source or threshold_key != self.morphology.key:
+            if image_hsv is None:
+                image_hsv = cv2.cvtColor(image_np_rgb, cv2.COLOR_RGB2HSV, dst=self._hsv)
+            threshold_hsv(image_hsv, base_hsv_color, tol_h, tol_s, tol_v, dst=self._mask, passed=self._passed)
+            # Keep a reference so the identity check cannot match a recycled object
+            self._source = image_np_rgb
+            self.morphology.reset(threshold_key, self._mask)
+
+        mask = self.morphology.get(erosion_iterations, dilation_iterations)
+
+        # The mask is 0 or 255, so AND-ing every channel with it keeps or blacks out the pixel
+        np.bitwise_and(image_np_rgb, mask[:, :, np.newaxis], out=self._preview)
+        return self._preview, mask
@@ -0,0 +1,234 @@
+import itertools
+
+import numpy as np
+
+from utils.component_stats import component_stats
+from utils.spatial_index import HoldIndex
+
+class Hold:
+    """
+    Lightweight view of a single hold stored in a HoldTable.
+    It behaves like the old list of (x, y) pixels (len, iteration, indexing),
+    but the pixel list is only materialized when it is actually needed.
+    """
+    __slots__ = ("table", "index")
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def label(self):
+        return self.index + 1
+
+    @property
+    def area(self):
+        return int(self.table.area[self.index])
+
+    @property
+    def bbox(self):
+        return tuple(self.table.bbox[self.index].tolist())
+
+    @property
+    def centroid(self):
+        return tuple(self.table.centroid[self.index].tolist())
+
+    @property
+    def pixels(self):
+        return self.table.pixels(self.index)
+
+    def __len__(self):
+        return self.area
+
+    def __iter__(self):
+        return iter(self.pixels)
+
+    def __getitem__(self, item):
+        return self.pixels[item]
+
+    def __repr__(self):
+        return f"Hold(index={self.index}, area={self.area}, centroid={self.centroid})"
+
+# Source of HoldTable.token values
+_table_tokens = itertools.count(1)
+
+class HoldTable:
+    """
+    Compact, array-backed storage for the detected holds.
+    Keeps an int32 label image (0 = background, k = k-th hold) plus parallel
+    NumPy arrays with the area, bounding box (x, y, width, height) and
+    centroid (cx, cy) of every hold. Shape statistics (moments, orientation,
+    elongation) are computed from the label image on first use.
+    Indexing the table returns a Hold view.
+    """
+
+    def __init__(self, labels, area, bbox, centroid):
+        self.labels = np.ascontiguousarray(labels, dtype=np.int32)
+        self.area = np.asarray(area, dtype=np.int64)
+        self.bbox = np.asarray(bbox, dtype=np.int32).reshape(-1, 4)
+        self.centroid = np.asarray(centroid, dtype=np.float64).reshape(-1, 2)
+        self._spatial_index = None
+        self._stats = None
+        # Unique per table and never reused: a cache key that does not keep the table alive
+        self.token = next(_table_tokens)
+
+    @classmethod
+    def from_labels(cls, labels, stats, centroids):
+        """
+        Builds a table from the output of label_components.
+        Args:
+            labels (numpy.ndarray): Label image (0 for the background).
+            stats (numpy.ndarray): (N, 5) array of [x, y, width, height, area].
+            centroids (numpy.ndarray): (N, 2) array of (cx, cy).
+        Returns:
+            HoldTable: The table of holds.
+        """
+        stats = np.asarray(stats).reshape(-1, 5)
+        return cls(labels, stats[:, 4], stats[:, :4], centroids)
+
+    @classmethod
+    def from_label_image(cls, labels, num_components=None):
+        """
+        Builds a table from a label image alone, computing every statistic
+        in one vectorized pass (see utils.component_stats).
+        Args:
+            labels (numpy.ndarray): Label image (0 for the background, k for the k-th hold).
+            num_components (int, optional): Number of holds (defaults to labels.max()).
+        Returns:
+            HoldTable: The table of holds.
+        """
+        stats = component_stats(labels, num_components)
+        table = cls(labels, stats.area, stats.bbox, stats.centroid)
+        table._stats = stats
+        return table
+
+    @classmethod
+    def from_components(cls, components, image_shape):
+        """
+        Builds a table from the legacy list-of-lists of (x, y) pixels.
+        Args:
+            components (list): List of connected components (from bfs_segmentation).
+            image_shape (tuple): The (height, width) of the image.
+        Returns:
+            HoldTable: The table of holds.
+        """
+        labels = np.zeros(image_shape[:2], dtype=np.int32)
+        if components:
+            points = np.concatenate([np.asarray(comp, dtype=np.int64).reshape(-1, 2) for comp in components])
+            owners = np.repeat(np.arange(1, len(components) + 1, dtype=np.int32), [len(comp) for comp in components])
+            labels[points[:, 1], points[:, 0]] = owners
+        return cls.from_label_image(labels, len(components))
+
+    @property
+    def shape(self):
+        return self.labels.shape
+
+    @property
+    def nbytes(self):
+        return self.labels.nbytes + self.area.nbytes + self.bbox.nbytes + self.centroid.nbytes
+
+    @property
+    def stats(self):
+        """
+        ComponentStats of the holds, computed from the label image on first use.
+        """
+        if self._stats is None:
+            self._stats = component_stats(self.labels, len(self))
+        return self._stats
+
+    @property
+    def moments(self):
+        return self.stats.moments
+
+    @property
+    def orientation(self):
+        return self.stats.orientation
+
+    @property
+    def elongation(self):
+        return self.stats.elongation
+
+    def select(self, keep):
+        """
+        Returns a new table with only some of the holds, renumbered in order
+        (e.g. table.select(table.area >= 50) to drop specks).
+        Args:
+            keep (numpy.ndarray): Boolean mask or indices of the holds to keep.
+        Returns:
+            HoldTable: The filtered table.
+        """
+        kept = np.arange(len(self))[keep]
+        lut = np.zeros(len(self) + 1, dtype=np.int32)
+        lut[kept + 1] = np.arange(1, len(kept) + 1, dtype=np.int32)
+        table = HoldTable(lut[self.labels], self.area[kept], self.bbox[kept], self.centroid[kept])
+        if self._stats is not None:
+            stats = self._stats
+            table._stats = type(stats)(stats.area[kept], stats.bbox[kept], stats.centroid[kept], stats.moments[kept])
+        return table
+
+    @property
+    def spatial_index(self):
+        """
+        HoldIndex over the hold centroids, built on first use.
+        """
+        if self._spatial_index is None:
+            self._spatial_index = HoldIndex(self.centroid)
+        return self._spatial_index
+
+    def hold_at(self, x, y):
+        """
+        Returns the index of the hold covering a pixel (label image lookup).
+        Args:
+            x (int): Column of the pixel.
+            y (int): Row of the pixel.
+        Returns:
+            int: Index of the hold, or -1 for background or outside the image.
+        """
+        x, y = int(x), int(y)
+        height, width = self.labels.shape
+        if not (0 <= x < width and 0 <= y < height):
+            return -1
+        return int(self.labels[y, x]) - 1
+
+    def closest_hold(self, point):
+        """
+        Maps a clicked point to a hold: the hold under the point if any,
+        otherwise the hold with the closest centroid.
+        Args:
+            point (tuple): (x, y) pixel coordinates.
+        Returns:
+            int: Index of the hold, or -1 if the table is empty.
+        """
+        index = self.hold_at(*point)
+        if index >= 0:
+            return index
+        return self.spatial_index.nearest(point)
+
+    def pixels(self, index):
+        """
+        Materializes the pixels of one hold.
+        Args:
+            index (int): Index of the hold in the table.
+        Returns:
+            list: (x, y) coordinates of the hold's pixels, in raster order.
+        """
+        x, y, w, h = self.bbox[index].tolist()
+        ys, xs = np.nonzero(self.labels[y:y + h, x:x + w] == index + 1)
+        return list(zip((xs + x).tolist(), (ys + y).tolist()))
+
+    def __len__(self):
+        return len(self.area)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Índice de agarra fora do intervalo.")
+        return Hold(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield Hold(self, index)
+
+    def __repr__(self):
+        return f"HoldTable(holds={len(self)}, shape={self.shape}, nbytes={self.nbytes})"
@@ -0,0 +1,132 @@
+import hashlib
+import threading
+
+import numpy as np
+import cv2
+from PIL import Image
+
+from utils.hsv_threshold import HSVHistogram
+from utils.profiling import span
+from utils.pyramid import downscale_array, downscale_image
+
+def content_key(data):
+    """
+    Returns a short content hash used as cache key.
+    Args:
+        data (bytes or buffer): Encoded image bytes or raw pixel buffer.
+    Returns:
+        str: Hex digest of the content.
+    """
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+class CachedImage:
+    """
+    Decoded image plus its RGB and HSV arrays (and HSV histogram), computed
+    once per content.
+    The arrays are shared between reruns (and sessions), so they are read-only.
+    """
+
+    def __init__(self, key, image_pil=None, rgb=None):
+        """
+        Args:
+            key (str): Cache key of the content.
+            image_pil (PIL.Image.Image, optional): The decoded image.
+            rgb (numpy.ndarray, optional): The RGB array instead of the image
+                                           (may be a view, e.g. a crop); the
+                                           PIL image is then only built on demand.
+        """
+        if image_pil is None and rgb is None:
+            raise ValueError("É preciso uma imagem ou um array RGB.")
+        self.key = key
+        self._pil = image_pil
+        if rgb is not None:
+            rgb.flags.writeable = False
+        self._rgb = rgb
+        self._hsv = None
+        self._histogram = None
+        self._proxies = {}
+        self._lock = threading.Lock()
+
+    @property
+    def pil(self):
+        if self._pil is None:
+            with self._lock:
+                if self._pil is None:
+                    self._pil = Image.fromarray(self._rgb)
+        return self._pil
+
+    @property
+    def size(self):
+        """
+        (width, height) of the image, without building the PIL image.
+        """
+        if self._pil is not None:
+            return self._pil.size
+        return self._rgb.shape[1], self._rgb.shape[0]
+
+    @property
+    def rgb(self):
+        if self._rgb is None:
+            with self._lock:
+                if self._rgb is None:
+                    rgb = np.array(self.pil.convert("RGB"))
+                    rgb.flags.writeable = False
+                    self._rgb = rgb
+        return self._rgb
+
+    @property
+    def hsv(self):
+        if self._hsv is None:
+            rgb = self.rgb
+            with self._lock:
+                if self._hsv is None:
+                    with span("image_cache.hsv"):
+                        hsv = cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV)
+                    hsv.flags.writeable = False
+                    self._hsv = hsv
+        return self._hsv
+
+    @property
+    def histogram(self):
+        if self._histogram is None:
+            hsv = self.hsv
+            with self._lock:
+                if self._histogram is None:
+                    self._histogram = HSVHistogram(hsv)
+        return self._histogram
+
+    def proxy(self, max_width):
+        """
+        Display proxy of the image (see utils.pyramid), itself a CachedImage
+        so its arrays are cached too. Returns self if the image is small enough.
+        """
+        entry = self._proxies.get(max_width)
+        if entry is None:
+            with span("image_cache.proxy", max_width=max_width):
+                if self._pil is None:
+                    # Array-backed entries are downscaled without building their PIL image
+                    rgb = downscale_array(self._rgb, max_width)
+                    if rgb is self._rgb:
+                        return self
+                    proxy = CachedImage(f"{self.key}@{max_width}", rgb=rgb)
+                else:
+                    image = downscale_image(self._pil, max_width)
+                    if image is self._pil:
+                        return self
+                    proxy = CachedImage(f"{self.key}@{max_width}", image)
+            with self._lock:
+                entry = self._proxies.setdefault(max_width, proxy)
+        return entry
+
+    @property
+    def nbytes(self):
+        decoded = 0
+        if self._pil is not None:
+            width, height = self._pil.size
+            decoded = width * height * len(self._pil.getbands())
+        # Views (e.g. a crop of a stored image) do not own their pixels
+        arrays = sum(a.nbytes for a in (self._rgb, self._hsv) if a is not None and not isinstance(a.base, np.ndarray))
+        if self._histogram is not None:
+            arrays += self._histogram.prefix.nbytes
+        proxies = sum(proxy.nbytes for proxy in list(self._proxies.values()))
+        return decoded + arrays + proxies
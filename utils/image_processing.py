@@ -1,43 +1,59 @@
+import logging
 import numpy as np
 import cv2
 from collections import deque
 from math import sqrt
 from PIL import Image
 
-def apply_hsv_filter(image_np_rgb, base_hsv_color, tol_h, tol_s, tol_v):
+from utils.hold_table import Hold, HoldTable
+from utils.profiling import profiled
+from utils.spatial_index import HoldIndex
+from utils.hsv_threshold import threshold_hsv
+from utils.rendering import render_labels
+from utils.routing import k_shortest_routes, routes_for_reaches, shortest_route
+
+logger = logging.getLogger(__name__)
+
+@profiled("image_processing.hsv_mask")
+def hsv_mask(image_np_rgb, base_hsv_color, tol_h, tol_s, tol_v, image_hsv=None):
     """
-    Applies an HSV color filter to an image.
+    Computes the binary mask of the pixels within the HSV tolerance of a color.
+    The hue tolerance wraps around the hue circle (0-179 in OpenCV).
     Args:
         image_np_rgb (numpy.ndarray): Input image as a NumPy array in RGB format.
         base_hsv_color (tuple): The base color (H, S, V) to filter around (OpenCV range).
         tol_h (int): Hue tolerance.
         tol_s (int): Saturation tolerance.
         tol_v (int): Value tolerance.
+        image_hsv (numpy.ndarray, optional): Precomputed HSV version of the image
+                                             (e.g. CachedImage.hsv).
     Returns:
-        numpy.ndarray: The filtered image as a NumPy array in RGB format,
-                       where pixels outside the range are black.
+        numpy.ndarray: A 2D mask with 255 for pixels within the range and 0 otherwise.
     """
-    # Convert the RGB image (NumPy array) to HSV
-    image_hsv = cv2.cvtColor(image_np_rgb, cv2.COLOR_RGB2HSV)
-
-    # Extract the H, S, V from the base color
-    h, s, v = base_hsv_color
-    h, s, v = int(h), int(s), int(v) # Ensure they are integers
-
-    # Calculate min and max bounds for HSV
-    min_h = np.clip(h - tol_h, 0, 179) # H is 0-179 in OpenCV
-    max_h = np.clip(h + tol_h, 0, 179)
-    min_s = np.clip(s - tol_s, 0, 255) # S is 0-255
-    max_s = np.clip(s + tol_s, 0, 255)
-    min_v = np.clip(v - tol_v, 0, 255) # V is 0-255
-    max_v = np.clip(v + tol_v, 0, 255)
+    # Convert the RGB image (NumPy array) to HSV, unless it is already cached
+    if image_hsv is None:
+        image_hsv = cv2.cvtColor(image_np_rgb, cv2.COLOR_RGB2HSV)
 
-    # Create the lower and upper bounds for cv2.inRange
-    lower_bound = np.array([min_h, min_s, min_v], dtype=np.uint8)
-    upper_bound = np.array([max_h, max_s, max_v], dtype=np.uint8)
+    # Threshold through per-channel lookup tables; the hue range wraps
+    # around 179 -> 0, so red holds on both sides of the circle are kept
+    return threshold_hsv(image_hsv, base_hsv_color, tol_h, tol_s, tol_v)
 
-    # Generate the mask based on the HSV range
-    mascara = cv2.inRange(image_hsv, lower_bound, upper_bound)
+@profiled("image_processing.apply_hsv_filter")
+def apply_hsv_filter(image_np_rgb, base_hsv_color, tol_h, tol_s, tol_v, image_hsv=None):
+    """
+    Applies an HSV color filter to an image.
+    Args:
+        image_np_rgb (numpy.ndarray): Input image as a NumPy array in RGB format.
+        base_hsv_color (tuple): The base color (H, S, V) to filter around (OpenCV range).
+        tol_h (int): Hue tolerance.
+        tol_s (int): Saturation tolerance.
+        tol_v (int): Value tolerance.
+        image_hsv (numpy.ndarray, optional): Precomputed HSV version of the image.
+    Returns:
+        tuple: (filtered image as a NumPy array in RGB format, where pixels
+               outside the range are black, binary mask with 255 inside the range).
+    """
+    mascara = hsv_mask(image_np_rgb, base_hsv_color, tol_h, tol_s, tol_v, image_hsv)
 
     # Create the result image: pixels within range keep original color, others become black
     resultado = np.zeros_like(image_np_rgb)
@@ -45,58 +61,234 @@ def apply_hsv_filter(image_np_rgb, base_hsv_color, tol_h, tol_s, tol_v):
 
     return resultado, mascara
 
-def bfs_segmentation(binary_image):
+# 3x3 structuring element used by the erosion/dilation sliders
+MORPHOLOGY_KERNEL = np.ones((3, 3), np.uint8)
+
+@profiled("image_processing.apply_morphology")
+def apply_morphology(binary_mask, erosion_iterations=0, dilation_iterations=0):
     """
-    Performs Breadth-First Search (BFS) to find connected components (agarras)
-    in a binary image.
+    Erodes and then dilates a binary mask with a 3x3 kernel.
+    Each iteration only looks one pixel away, so the result at a pixel depends
+    on the input within erosion_iterations + dilation_iterations pixels.
     Args:
-        binary_image (numpy.ndarray): A 2D binary image (0 or 255).
+        binary_mask (numpy.ndarray): A 2D binary image (0 or 255).
+        erosion_iterations (int): Number of erosion passes.
+        dilation_iterations (int): Number of dilation passes.
     Returns:
-        list: A list of lists, where each inner list contains (x, y) coordinates
-              of pixels belonging to a connected component.
+        numpy.ndarray: The processed mask.
+    """
+    if erosion_iterations > 0:
+        binary_mask = cv2.erode(binary_mask, MORPHOLOGY_KERNEL, iterations=erosion_iterations)
+    if dilation_iterations > 0:
+        binary_mask = cv2.dilate(binary_mask, MORPHOLOGY_KERNEL, iterations=dilation_iterations)
+    return binary_mask
+
+def _foreground(binary_image):
+    """
+    Returns a 0/1 uint8 mask where only pixels equal to 255 are foreground,
+    matching the convention used by the BFS labeler.
+    """
+    binary_image = np.ascontiguousarray(binary_image, dtype=np.uint8)
+    _, foreground = cv2.threshold(binary_image, 254, 1, cv2.THRESH_BINARY)
+    return foreground
+
+def _label_components_opencv(binary_image, connectivity):
+    """
+    Labels connected components with OpenCV's union-find (Wu/SAUF) labeler.
+    SAUF assigns labels in raster order of each component's first pixel,
+    which is the same order in which the BFS labeler discovers components.
+    """
+    _, labels, stats, centroids = cv2.connectedComponentsWithStatsWithAlgorithm(
+        _foreground(binary_image), connectivity, cv2.CV_32S, cv2.CCL_WU
+    )
+    # Row 0 is the background
+    return labels, stats[1:], centroids[1:]
+
+def _label_components_bfs(binary_image, connectivity):
+    """
+    Reference labeler: pure-Python Breadth-First Search over the mask.
+    Slow, but kept to validate the faster engines.
     """
-    visited = np.zeros_like(binary_image, dtype=bool)
     height, width = binary_image.shape
-    components = []
+    labels = np.zeros((height, width), dtype=np.int32)
+    stats = []
+    centroids = []
 
-    # 4-directional connectivity
     directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    if connectivity == 8:
+        directions += [(-1, -1), (-1, 1), (1, -1), (1, 1)]
 
+    current_label = 0
     for y in range(height):
         for x in range(width):
-            if binary_image[y, x] == 255 and not visited[y, x]:
+            if binary_image[y, x] == 255 and labels[y, x] == 0:
+                current_label += 1
                 queue = deque()
                 queue.append((y, x))
-                component = []
-                visited[y, x] = True
+                labels[y, x] = current_label
+                min_x, min_y, max_x, max_y = x, y, x, y
+                sum_x, sum_y, area = 0, 0, 0
 
                 while queue:
                     cy, cx = queue.popleft()
-                    component.append((cx, cy)) # Store as (x, y)
+                    area += 1
+                    sum_x += cx
+                    sum_y += cy
+                    min_x, max_x = min(min_x, cx), max(max_x, cx)
+                    min_y, max_y = min(min_y, cy), max(max_y, cy)
                     for dy, dx in directions:
                         ny, nx = cy + dy, cx + dx
                         if 0 <= ny < height and 0 <= nx < width:
-                            if binary_image[ny, nx] == 255 and not visited[ny, nx]:
-                                visited[ny, nx] = True
+                            if binary_image[ny, nx] == 255 and labels[ny, nx] == 0:
+                                labels[ny, nx] = current_label
                                 queue.append((ny, nx))
 
-                components.append(component)
+                stats.append((min_x, min_y, max_x - min_x + 1, max_y - min_y + 1, area))
+                centroids.append((sum_x / area, sum_y / area))
 
+    stats = np.array(stats, dtype=np.int32).reshape(-1, 5)
+    centroids = np.array(centroids, dtype=np.float64).reshape(-1, 2)
+    return labels, stats, centroids
+
+# Available labeling engines, selectable by name
+LABELING_ENGINES = {
+    "opencv": _label_components_opencv,
+    "bfs": _label_components_bfs,
+}
+DEFAULT_LABELING_ENGINE = "opencv"
+
+@profiled("image_processing.label_components")
+def label_components(binary_image, connectivity=4, engine=DEFAULT_LABELING_ENGINE):
+    """
+    Labels the connected components (agarras) of a binary image.
+    Args:
+        binary_image (numpy.ndarray): A 2D binary image (0 or 255).
+        connectivity (int): 4 or 8 pixel connectivity.
+        engine (str): Name of the labeling engine (see LABELING_ENGINES).
+    Returns:
+        tuple: (labels, stats, centroids) where labels is an int32 image with
+               0 for the background and k for the k-th component, stats is an
+               (N, 5) int32 array of [x, y, width, height, area] per component
+               (OpenCV CC_STAT_* layout) and centroids is an (N, 2) float64
+               array of (cx, cy). Row k - 1 describes label k. Components are
+               numbered in raster order of their first pixel.
+    """
+    if connectivity not in (4, 8):
+        raise ValueError(f"Conectividade inválida: {connectivity} (use 4 ou 8).")
+    if engine not in LABELING_ENGINES:
+        raise ValueError(f"Motor de rotulação desconhecido: {engine!r}. Opções: {sorted(LABELING_ENGINES)}")
+    return LABELING_ENGINES[engine](binary_image, connectivity)
+
+def components_from_labels(labels, num_components):
+    """
+    Converts a label image into the list-of-pixels representation.
+    Args:
+        labels (numpy.ndarray): Label image as returned by label_components.
+        num_components (int): Number of components in the label image.
+    Returns:
+        list: A list of lists, where each inner list contains (x, y) coordinates
+              of pixels belonging to a connected component, in raster order.
+    """
+    flat_indices = np.flatnonzero(labels)
+    flat_labels = labels.ravel()[flat_indices]
+    order = np.argsort(flat_labels, kind="stable")
+    flat_indices = flat_indices[order]
+    counts = np.bincount(flat_labels, minlength=num_components + 1)[1:]
+    ys, xs = np.divmod(flat_indices, labels.shape[1])
+
+    components = []
+    start = 0
+    for count in counts.tolist():
+        end = start + count
+        components.append(list(zip(xs[start:end].tolist(), ys[start:end].tolist())))
+        start = end
     return components
 
+@profiled("image_processing.bfs_segmentation")
+def bfs_segmentation(binary_image, connectivity=4, engine=DEFAULT_LABELING_ENGINE):
+    """
+    Finds the connected components (agarras) in a binary image.
+    Kept under its historical name; the work is delegated to label_components,
+    which by default uses the OpenCV engine instead of a Python BFS.
+    Args:
+        binary_image (numpy.ndarray): A 2D binary image (0 or 255).
+        connectivity (int): 4 or 8 pixel connectivity.
+        engine (str): Name of the labeling engine (see LABELING_ENGINES).
+    Returns:
+        list: A list of lists, where each inner list contains (x, y) coordinates
+              of pixels belonging to a connected component.
+    """
+    labels, stats, _ = label_components(binary_image, connectivity, engine)
+    return components_from_labels(labels, len(stats))
+
+@profiled("image_processing.segment_holds")
+def segment_holds(binary_image, connectivity=4, engine=DEFAULT_LABELING_ENGINE):
+    """
+    Finds the connected components (agarras) in a binary image and stores
+    them in a compact HoldTable instead of lists of pixel tuples.
+    Args:
+        binary_image (numpy.ndarray): A 2D binary image (0 or 255).
+        connectivity (int): 4 or 8 pixel connectivity.
+        engine (str): Name of the labeling engine (see LABELING_ENGINES).
+    Returns:
+        HoldTable: The detected holds.
+    """
+    labels, stats, centroids = label_components(binary_image, connectivity, engine)
+    return HoldTable.from_labels(labels, stats, centroids)
+
+@profiled("image_processing.segment_image")
+def segment_image(image_np_rgb, base_hsv_color, tol_h, tol_s, tol_v,
+                  erosion_iterations=0, dilation_iterations=0,
+                  connectivity=4, engine=DEFAULT_LABELING_ENGINE,
+                  memory_budget=None, workers=1):
+    """
+    Runs the full segmentation pipeline (HSV filter, morphology and labeling).
+    By default the whole image is processed at once; with a memory_budget or
+    more than one worker it is processed in tiles by segment_image_tiled,
+    which gives exactly the same result.
+    Args:
+        image_np_rgb (numpy.ndarray): Input image as a NumPy array in RGB format.
+        base_hsv_color (tuple): The base color (H, S, V) to filter around (OpenCV range).
+        tol_h (int): Hue tolerance.
+        tol_s (int): Saturation tolerance.
+        tol_v (int): Value tolerance.
+        erosion_iterations (int): Number of erosion passes.
+        dilation_iterations (int): Number of dilation passes.
+        connectivity (int): 4 or 8 pixel connectivity.
+        engine (str): Name of the labeling engine (see LABELING_ENGINES).
+        memory_budget (int or None): Working memory budget in bytes for the
+                                     tiled mode, or None to run untiled.
+        workers (int): Number of bands processed in parallel.
+    Returns:
+        HoldTable: The detected holds.
+    """
+    if memory_budget is not None or workers > 1:
+        from utils.tiled_segmentation import DEFAULT_MEMORY_BUDGET, segment_image_tiled
+        return segment_image_tiled(
+            image_np_rgb, base_hsv_color, tol_h, tol_s, tol_v,
+            erosion_iterations, dilation_iterations, connectivity, engine,
+            memory_budget or DEFAULT_MEMORY_BUDGET, workers
+        )
+
+    mask = hsv_mask(image_np_rgb, base_hsv_color, tol_h, tol_s, tol_v)
+    mask = apply_morphology(mask, erosion_iterations, dilation_iterations)
+    return segment_holds(mask, connectivity, engine)
+
 def calculate_centroid(component):
     """
     Calculates the centroid (average x, y) of a connected component.
     Args:
-        component (list): A list of (x, y) coordinates belonging to a component.
+        component (list or Hold): A list of (x, y) coordinates belonging to a
+                                  component, or a Hold from a HoldTable.
     Returns:
         tuple: (cx, cy) representing the centroid of the component.
     """
+    if isinstance(component, Hold):
+        return component.centroid # Precomputed, no need to walk the pixels
     if not component:
         return (0, 0) # Or handle error appropriately
-    sum_x = sum(p[0] for p in component)
-    sum_y = sum(p[1] for p in component)
-    return (sum_x / len(component), sum_y / len(component))
+    cx, cy = np.asarray(component, dtype=np.float64).reshape(-1, 2).mean(axis=0)
+    return (float(cx), float(cy))
 
 def euclidean_distance(p1, p2):
     """
@@ -109,122 +301,151 @@ def euclidean_distance(p1, p2):
     """
     return sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
 
-def find_fastest_route(all_holds_components, initial_holds_coords, final_hold_coord):
+def _route_holds(all_holds_components, initial_holds_coords, final_hold_coord):
+    """
+    Maps the clicked start/final points to holds.
+    Returns (centroids, spatial index, start indices, final index), or None.
+    """
+    if isinstance(all_holds_components, HoldTable):
+        hold_centroids = all_holds_components.centroid
+        index = all_holds_components.spatial_index
+        # Clicks inside a hold resolve to that hold, others to the closest centroid
+        get_closest_hold_index = all_holds_components.closest_hold
+    else:
+        hold_centroids = np.array([calculate_centroid(comp) for comp in all_holds_components], dtype=np.float64).reshape(-1, 2)
+        index = HoldIndex(hold_centroids)
+        get_closest_hold_index = index.nearest
+
+    initial_hold_indices = [get_closest_hold_index(coord) for coord in initial_holds_coords]
+    final_hold_index = get_closest_hold_index(final_hold_coord)
+
+    if final_hold_index == -1 or any(idx == -1 for idx in initial_hold_indices):
+        logger.warning("Erro: Não foi possível mapear as agarras selecionadas pelo usuário para as agarras detectadas.")
+        return None
+    return hold_centroids, index, initial_hold_indices, final_hold_index
+
+@profiled("image_processing.find_fastest_route")
+def find_fastest_route(all_holds_components, initial_holds_coords, final_hold_coord, max_reach=None, graph=None, trace=None):
     """
-    Finds the fastest route from initial holds to the final hold using a greedy approach.
-    At each step, it selects the closest hold that is at an equal or higher altitude.
+    Finds the shortest route from the initial holds to the final hold (see
+    utils.routing.shortest_route). Every move goes to a hold at an equal or
+    higher altitude, at most max_reach pixels away.
     Args:
-        all_holds_components (list): List of all detected hold components (from bfs_segmentation).
+        all_holds_components (HoldTable or list): All detected holds (from segment_holds),
+                                                  or the legacy list of components.
         initial_holds_coords (list): List of (x, y) coordinates of the initial holds.
         final_hold_coord (tuple): (x, y) coordinate of the final hold.
+        max_reach (float, optional): Maximum distance of a single move, in pixels.
+                                     None or 0 means no limit.
+        graph (ReachGraph, optional): Cached reachability graph of the same holds
+                                      (see utils.routing.reach_graph_for), built for
+                                      at least max_reach (its own reach if max_reach
+                                      is None).
+        trace (SearchTrace, optional): Records the search events (see utils.tracing).
     Returns:
         list: A list of (x, y) coordinates representing the fastest route,
               or None if no route is found.
     """
     if not all_holds_components or not initial_holds_coords or not final_hold_coord:
         return None
+    mapped = _route_holds(all_holds_components, initial_holds_coords, final_hold_coord)
+    if mapped is None:
+        return None
+    hold_centroids, index, initial_hold_indices, final_hold_index = mapped
 
-    hold_centroids = [calculate_centroid(comp) for comp in all_holds_components]
-
-    def get_closest_hold_index(target_coord, centroids):
-        min_dist = float("inf")
-        closest_idx = -1
-        for i, centroid in enumerate(centroids):
-            dist = euclidean_distance(target_coord, centroid)
-            if dist < min_dist:
-                min_dist = dist
-                closest_idx = i
-        return closest_idx
-
-    initial_hold_indices = [get_closest_hold_index(coord, hold_centroids) for coord in initial_holds_coords]
-    final_hold_index = get_closest_hold_index(final_hold_coord, hold_centroids)
-
-    if final_hold_index == -1 or any(idx == -1 for idx in initial_hold_indices):
-        print("Erro: Não foi possível mapear as agarras selecionadas pelo usuário para as agarras detectadas.")
+    if graph is not None:
+        path, _ = graph.route(initial_hold_indices, final_hold_index, trace, max_reach or None)
+    else:
+        path, _ = shortest_route(hold_centroids, initial_hold_indices, final_hold_index, max_reach, index, trace)
+    if path is None:
         return None
+    return [tuple(hold_centroids[i].tolist()) for i in path]
 
-    best_greedy_route = None
-    min_greedy_distance = float("inf")
-
-    # Try building a greedy path from each initial hold
-    for start_hold_idx in initial_hold_indices:
-        print(f"\n--- Iniciando caminho guloso da agarra inicial: {hold_centroids[start_hold_idx]} ---")
-        current_greedy_route = [hold_centroids[start_hold_idx]]
-        current_greedy_distance = 0
-        visited_indices = {start_hold_idx} # To avoid cycles and redundant visits
-        current_hold_idx = start_hold_idx
-
-        step_count = 0
-        while current_hold_idx != final_hold_index:
-            step_count += 1
-            print(f"Passo {step_count}: Agarra atual: {hold_centroids[current_hold_idx]} (Índice: {current_hold_idx})")
-            print(f"  Agarras visitadas: {visited_indices}")
-            
-            next_hold_idx = -1
-            min_dist_to_next = float("inf")
-            
-            potential_neighbors = []
-            for neighbor_idx, neighbor_centroid in enumerate(hold_centroids):
-                if neighbor_idx == current_hold_idx or neighbor_idx in visited_indices:
-                    continue
-                potential_neighbors.append((neighbor_idx, neighbor_centroid))
-            
-            print(f"  Vizinhos potenciais (não visitados): {len(potential_neighbors)}")
-            for idx, centroid in potential_neighbors:
-                print(f"    - Potencial: {centroid} (Índice: {idx}, Y: {centroid[1]:.2f})")
-            
-            valid_neighbors_altitude_filtered = []
-            for neighbor_idx, neighbor_centroid in potential_neighbors:
-                # Condition: next hold must be at a lower or equal y-coordinate (higher or equal altitude)
-                # In image coordinates, lower Y means higher on the image.
-                # So, neighbor_centroid[1] (y) should be <= current_hold_idx's y
-                if neighbor_centroid[1] <= hold_centroids[current_hold_idx][1]:
-                    dist = euclidean_distance(hold_centroids[current_hold_idx], neighbor_centroid)
-                    valid_neighbors_altitude_filtered.append((dist, neighbor_idx, neighbor_centroid))
-            
-            print(f"  Vizinhos válidos (filtrados por altitude): {len(valid_neighbors_altitude_filtered)}")
-            for dist, idx, centroid in valid_neighbors_altitude_filtered:
-                print(f"    - Válido: {centroid} (Índice: {idx}, Y: {centroid[1]:.2f}, Dist: {dist:.2f})")
-            
-            if valid_neighbors_altitude_filtered:
-                # Sort by distance to find the closest
-                valid_neighbors_altitude_filtered.sort(key=lambda x: x[0])
-                min_dist_to_next, next_hold_idx, next_hold_centroid = valid_neighbors_altitude_filtered[0]
-                print(f"  Próxima agarra selecionada: {next_hold_centroid} (Índice: {next_hold_idx}) com distância {min_dist_to_next:.2f}")
-            else:
-                print("  Nenhuma agarra válida encontrada para o próximo passo. Caminho travado.")
-                current_greedy_route = None
-                break # Exit while loop if no valid next hold
-
-            current_greedy_route.append(hold_centroids[next_hold_idx])
-            current_greedy_distance += min_dist_to_next
-            visited_indices.add(next_hold_idx)
-            current_hold_idx = next_hold_idx
-
-        if current_greedy_route and current_hold_idx == final_hold_index:
-            print(f"  Caminho para a agarra final encontrado! Distância total: {current_greedy_distance:.2f}")
-            if current_greedy_distance < min_greedy_distance:
-                min_greedy_distance = current_greedy_distance
-                best_greedy_route = current_greedy_route
-        elif current_greedy_route is None:
-            print("  Caminho não chegou à agarra final (travado).")
-        else:
-            print(f"  Caminho terminou, mas a agarra final não foi alcançada. Última agarra: {hold_centroids[current_hold_idx]}")
-
-    print(f"\n--- Melhor rota gulosa encontrada: {best_greedy_route} ---")
-    return best_greedy_route
-
-def visualize_components_colored(components, image_shape):
-    """
-    Creates an image where each connected component is colored differently.
+@profiled("image_processing.find_routes")
+def find_routes(all_holds_components, initial_holds_coords, final_hold_coord, k=3, max_reach=None, graph=None, trace=None):
+    """
+    Finds the k shortest loopless routes from the initial holds to the
+    final hold (see utils.routing.k_shortest_routes), under the same move
+    rules as find_fastest_route.
+    Args:
+        all_holds_components (HoldTable or list): All detected holds (from segment_holds),
+                                                  or the legacy list of components.
+        initial_holds_coords (list): List of (x, y) coordinates of the initial holds.
+        final_hold_coord (tuple): (x, y) coordinate of the final hold.
+        k (int): Maximum number of routes.
+        max_reach (float, optional): Maximum distance of a single move, in pixels.
+                                     None or 0 means no limit.
+        graph (ReachGraph, optional): Cached reachability graph of the same holds,
+                                      built for at least max_reach (its own reach
+                                      if max_reach is None).
+        trace (SearchTrace, optional): Records the search events (see utils.tracing).
+    Returns:
+        list: Up to k routes (lists of (x, y) coordinates), shortest first.
+    """
+    if not all_holds_components or not initial_holds_coords or not final_hold_coord:
+        return []
+    mapped = _route_holds(all_holds_components, initial_holds_coords, final_hold_coord)
+    if mapped is None:
+        return []
+    hold_centroids, index, initial_hold_indices, final_hold_index = mapped
+
+    if graph is not None:
+        routes = graph.routes(initial_hold_indices, final_hold_index, k, trace, max_reach or None)
+    else:
+        routes = k_shortest_routes(hold_centroids, initial_hold_indices, final_hold_index, k, max_reach, index, trace)
+    return [[tuple(hold_centroids[i].tolist()) for i in path] for path, _ in routes]
+
+@profiled("image_processing.find_routes_for_reaches")
+def find_routes_for_reaches(all_holds_components, initial_holds_coords, final_hold_coord, reaches, graph=None, trace=None):
+    """
+    Finds the shortest route from the initial holds to the final hold for
+    several maximum reaches in one query (see utils.routing.routes_for_reaches),
+    e.g. the routes of shorter and taller climbers.
+    Args:
+        all_holds_components (HoldTable or list): All detected holds (from segment_holds),
+                                                  or the legacy list of components.
+        initial_holds_coords (list): List of (x, y) coordinates of the initial holds.
+        final_hold_coord (tuple): (x, y) coordinate of the final hold.
+        reaches (list): Maximum distances of a single move, in pixels.
+        graph (ReachGraph, optional): Cached reachability graph of the same holds,
+                                      built for at least the largest reach.
+        trace (SearchTrace, optional): Records the search events (see utils.tracing).
+    Returns:
+        list: One route (list of (x, y) coordinates) per reach, or None where
+              no route is found.
+    """
+    if not reaches:
+        return []
+    if not all_holds_components or not initial_holds_coords or not final_hold_coord:
+        return [None] * len(reaches)
+    mapped = _route_holds(all_holds_components, initial_holds_coords, final_hold_coord)
+    if mapped is None:
+        return [None] * len(reaches)
+    hold_centroids, index, initial_hold_indices, final_hold_index = mapped
+
+    if graph is not None:
+        routes = graph.routes_for_reaches(initial_hold_indices, final_hold_index, reaches, trace)
+    else:
+        routes = routes_for_reaches(hold_centroids, initial_hold_indices, final_hold_index, reaches, index, trace)
+    return [None if path is None else [tuple(hold_centroids[i].tolist()) for i in path] for path, _ in routes]
+
+@profiled("image_processing.visualize_components_colored")
+def visualize_components_colored(components, image_shape, palette=None, image=None, opacity=1.0):
+    """
+    Creates an image where each connected component is colored differently,
+    with a single palette lookup over the label image (see utils.rendering).
     Args:
-        components (list): List of connected components (from bfs_segmentation).
+        components (HoldTable or list): The detected holds (from segment_holds),
+                                        or the legacy list of components.
         image_shape (tuple): The (height, width) of the original image.
+        palette (numpy.ndarray, optional): (N + 1, 3) uint8 palette indexed by label
+                                           (e.g. make_palette(len(holds))). By default
+                                           the 21 colors below are cycled.
+        image (numpy.ndarray, optional): RGB photo to blend the colors over.
+        opacity (float): Weight of the component colors over the photo.
     Returns:
         numpy.ndarray: An RGB image with components colored.
     """
-    result = np.zeros((image_shape[0], image_shape[1], 3), dtype=np.uint8)
-    
     # Generate distinct colors. More colors can be added or generated programmatically.
     cores = [
         (255, 0, 0), (0, 255, 0), (0, 0, 255),       # Red, Green, Blue
@@ -235,37 +456,37 @@ def visualize_components_colored(components, image_shape):
         (128, 255, 0), (0, 128, 255), (255, 0, 128), # Lime Green, Sky Blue, Rose
         (75, 0, 130), (0, 100, 0), (255, 165, 0) # Indigo, Dark Green, Orange
     ]
+    if palette is None:
+        # Label k uses cores[(k - 1) % len(cores)], label 0 stays black
+        palette = np.array([(0, 0, 0)] + cores, dtype=np.uint8)
 
-    for idx, comp in enumerate(components):
-        # Use modulo to cycle through colors if there are more components than predefined colors
-        cor = cores[idx % len(cores)]
-        for x, y in comp:
-            if 0 <= y < image_shape[0] and 0 <= x < image_shape[1]: # Basic bounds check
-                result[y, x] = cor
-            
-    return result
+    if not isinstance(components, HoldTable):
+        # The components must lie inside image_shape (they come from an image of that size)
+        components = HoldTable.from_components(components, image_shape)
+    labels = components.labels[:image_shape[0], :image_shape[1]]
+    if labels.shape == tuple(image_shape[:2]):
+        return render_labels(labels, palette, image, opacity)
 
-def visualize_route(image_pil, route_coords):
-    """
-    Visualizes the fastest route on the image, marking holds with numbers.
-    Args:
-        image_pil (PIL.Image.Image): The original image (cropped).
-        route_coords (list): List of (x, y) coordinates representing the route.
-    Returns:
-        PIL.Image.Image: Image with the route drawn.
-    """
-    if not route_coords:
-        return image_pil
+    result = np.zeros((image_shape[0], image_shape[1], 3), dtype=np.uint8)
+    region = None if image is None else image[:labels.shape[0], :labels.shape[1]]
+    result[:labels.shape[0], :labels.shape[1]] = render_labels(labels, palette, region, opacity)
+    return result
 
-    image_np = np.array(image_pil.convert("RGB"))
-    output_image = image_np.copy()
+# Line colors of the routes drawn by visualize_routes, best route first
+ROUTE_COLORS = [
+    (0, 255, 0), (0, 128, 255), (255, 165, 0), (255, 0, 255), (0, 255, 255), (255, 255, 0)
+]
 
+def _draw_route(output_image, route_coords, line_color):
+    # On an RGBA canvas every drawing is opaque
+    opaque = (255,) if output_image.shape[2] == 4 else ()
+    line_color = tuple(line_color) + opaque
     # Draw lines between consecutive holds and number them
     for i in range(len(route_coords)):
         x, y = int(route_coords[i][0]), int(route_coords[i][1])
         
         # Draw circle for the hold
-        cv2.circle(output_image, (x, y), 10, (255, 0, 0), -1) # Red circle
+        cv2.circle(output_image, (x, y), 10, (255, 0, 0) + opaque, -1) # Red circle
 
         # Put number on the hold
         font = cv2.FONT_HERSHEY_SIMPLEX
@@ -275,11 +496,58 @@ def visualize_route(image_pil, route_coords):
         text_size = cv2.getTextSize(text, font, font_scale, font_thickness)[0]
         text_x = x - text_size[0] // 2
         text_y = y + text_size[1] // 2
-        cv2.putText(output_image, text, (text_x, text_y), font, font_scale, (255, 255, 255), font_thickness, cv2.LINE_AA)
+        cv2.putText(output_image, text, (text_x, text_y), font, font_scale, (255, 255, 255) + opaque, font_thickness, cv2.LINE_AA)
 
         # Draw line to next hold
         if i < len(route_coords) - 1:
             next_x, next_y = int(route_coords[i+1][0]), int(route_coords[i+1][1])
-            cv2.line(output_image, (x, y), (next_x, next_y), (0, 255, 0), 2) # Green line
+            cv2.line(output_image, (x, y), (next_x, next_y), line_color, 2)
+
+@profiled("image_processing.visualize_routes")
+def visualize_routes(image_pil, routes):
+    """
+    Draws several routes on one copy of the image, each with its own line
+    color (see ROUTE_COLORS). The first route is drawn last, so it stays on top.
+    Args:
+        image_pil (PIL.Image.Image): The original image (cropped).
+        routes (list): Routes, each a list of (x, y) coordinates, best first.
+    Returns:
+        PIL.Image.Image: Image with the routes drawn.
+    """
+    routes = [route for route in routes if route]
+    if not routes:
+        return image_pil
+
+    output_image = np.array(image_pil.convert("RGB"))
+    for rank in reversed(range(len(routes))):
+        _draw_route(output_image, routes[rank], ROUTE_COLORS[rank % len(ROUTE_COLORS)])
+    return Image.fromarray(output_image)
+
+@profiled("image_processing.routes_layer")
+def routes_layer(image_shape, routes):
+    """
+    Draws routes (as visualize_routes) on a transparent RGBA canvas, to be
+    composited over the photo with utils.rendering.composite_layer.
+    Args:
+        image_shape (tuple): The (height, width) of the image.
+        routes (list): Routes, each a list of (x, y) coordinates, best first.
+    Returns:
+        numpy.ndarray: RGBA layer with premultiplied colors.
+    """
+    layer = np.zeros((image_shape[0], image_shape[1], 4), dtype=np.uint8)
+    routes = [route for route in routes if route]
+    for rank in reversed(range(len(routes))):
+        _draw_route(layer, routes[rank], ROUTE_COLORS[rank % len(ROUTE_COLORS)])
+    return layer
 
-    return Image.fromarray(output_image)
\ No newline at end of file
+@profiled("image_processing.visualize_route")
+def visualize_route(image_pil, route_coords):
+    """
+    Visualizes the fastest route on the image, marking holds with numbers.
+    Args:
+        image_pil (PIL.Image.Image): The original image (cropped).
+        route_coords (list): List of (x, y) coordinates representing the route.
+    Returns:
+        PIL.Image.Image: Image with the route drawn.
+    """
+    return visualize_routes(image_pil, [route_coords])
@@ -0,0 +1,132 @@
+import time
+
+from utils.image_cache import CachedImage, content_key
+from utils.ingestion import decode_preview, decode_region
+from utils.pyramid import MAX_IMAGE_WIDTH
+
+class ImageStore:
+    """
+    Per-session store of the uploaded image, decoded once into a read-only
+    RGB array.
+    Large JPEGs are first decoded at a reduced scale for display and
+    cropping (see utils.ingestion), and only the selected crop is decoded
+    at full resolution; otherwise the crop is kept as an offset and a shape
+    over the decoded array. Either way every stage gets the same crop pixels
+    (with their own cached HSV array and display proxies) instead of a
+    re-encoded copy.
+    """
+
+    def __init__(self):
+        self.name = None
+        self.original = None # Upright image, possibly reduced (see full_size)
+        self.full_size = None # (width, height) of the upright image at native resolution
+        self.crop_box = None # (x, y, width, height) in full-resolution pixels
+        self.report = None # IngestReport of the current upload
+        self._data = None # Encoded upload, kept to decode crops of a reduced image
+        self._orientation = 1
+        self._crop = None
+        self._crop_rgb = None
+
+    def load(self, name, data, max_width=MAX_IMAGE_WIDTH):
+        """
+        Decodes an upload, replacing the current image and its crop.
+        Args:
+            name (str): File name of the upload.
+            data (bytes): Encoded image (PNG, JPEG, ...).
+            max_width (int): Width the image is displayed at for cropping.
+        Returns:
+            CachedImage: The decoded (possibly reduced) image.
+        """
+        rgb, orientation, report = decode_preview(data, max_width)
+        self.name = name
+        self.original = CachedImage(content_key(data), rgb=rgb)
+        self.full_size = report.full_size
+        self.report = report
+        self._orientation = orientation
+        # The encoded bytes are only needed again if the crop has to be decoded
+        self._data = data if self.reduced else None
+        self.reset_crop()
+        return self.original
+
+    @property
+    def reduced(self):
+        """
+        True if the stored image is smaller than the native resolution.
+        """
+        return self.original is not None and self.original.size != self.full_size
+
+    @property
+    def size(self):
+        """
+        (width, height) in full-resolution pixels (the coordinates of the crop box).
+        """
+        return self.full_size
+
+    def set_crop(self, box):
+        """
+        Selects the crop, in full-resolution pixels.
+        Args:
+            box (tuple): (x1, y1, x2, y2) in full-resolution pixels, x2/y2 exclusive.
+        Returns:
+            CachedImage: The crop.
+        """
+        if self.original is None:
+            raise ValueError("Nenhuma imagem carregada para cortar.")
+        x1, y1, x2, y2 = (int(v) for v in box)
+        width, height = self.full_size
+        x1, x2 = max(x1, 0), min(x2, width)
+        y1, y2 = max(y1, 0), min(y2, height)
+        if x2 <= x1 or y2 <= y1:
+            raise ValueError("A área de recorte está vazia.")
+        self.reset_crop()
+        if self.reduced:
+            start = time.perf_counter()
+            self._crop_rgb, peak_bytes = decode_region(self._data, (x1, y1, x2, y2), self._orientation)
+            self.report.crop_seconds = time.perf_counter() - start
+            self.report.peak_bytes = max(self.report.peak_bytes, peak_bytes)
+        self.crop_box = (x1, y1, x2 - x1, y2 - y1)
+        return self.crop
+
+    def reset_crop(self):
+        self.crop_box = None
+        self._crop = None
+        self._crop_rgb = None
+
+    @property
+    def crop(self):
+        """
+        The cropped image (a view over the stored image), or None before cropping.
+        """
+        if self.crop_box is None:
+            return None
+        if self._crop is None:
+            x, y, width, height = self.crop_box
+            if self._crop_rgb is not None:
+                rgb = self._crop_rgb
+            else:
+                rgb = self.original.rgb[y:y + height, x:x + width]
+            self._crop = CachedImage(f"{self.original.key}[{x},{y},{width}x{height}]", rgb=rgb)
+        return self._crop
+
+    @property
+    def nbytes(self):
+        """
+        Bytes held by the store: the decoded image, its derived arrays and
+        those of the crop (whose pixels are shared with the image unless the
+        crop was decoded on its own), plus the encoded upload if still kept.
+        """
+        if self.original is None:
+            return 0
+        total = self.original.nbytes + len(self._data or b"")
+        if self._crop is not None:
+            total += self._crop.nbytes
+        return total
+
+    def clear(self):
+        self.name = None
+        self.original = None
+        self.full_size = None
+        self.report = None
+        self._data = None
+        self._orientation = 1
+        self.reset_crop()
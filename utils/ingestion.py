@@ -0,0 +1,164 @@
+import time
+from io import BytesIO
+
+import numpy as np
+import cv2
+from PIL import Image
+
+from utils.profiling import profiled
+from utils.pyramid import MAX_IMAGE_WIDTH
+
+# EXIF tag holding the orientation of the camera
+EXIF_ORIENTATION = 0x0112
+
+# EXIF orientations that swap width and height
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+def read_orientation(image_pil):
+    """
+    Reads the EXIF orientation of an opened (not yet decoded) image.
+    Args:
+        image_pil (PIL.Image.Image): The image, as returned by Image.open.
+    Returns:
+        int: EXIF orientation (1 to 8, 1 when absent or invalid).
+    """
+    try:
+        orientation = int(image_pil.getexif().get(EXIF_ORIENTATION, 1))
+    except Exception:
+        return 1
+    return orientation if 1 <= orientation <= 8 else 1
+
+def oriented_size(size, orientation):
+    """
+    (width, height) of an image once its EXIF orientation is applied.
+    """
+    return (size[1], size[0]) if orientation in TRANSPOSED_ORIENTATIONS else tuple(size)
+
+def oriented_view(image_np, orientation):
+    """
+    Applies an EXIF orientation as a NumPy view (flips and transposes only
+    change strides). Same result as PIL's ImageOps.exif_transpose. The view
+    is not contiguous unless orientation is 1: callers handing it to OpenCV
+    copy it, or only the part of it they keep.
+    Args:
+        image_np (numpy.ndarray): Decoded (H, W) or (H, W, C) array.
+        orientation (int): EXIF orientation (1 to 8).
+    Returns:
+        numpy.ndarray: The upright view (may not be contiguous).
+    """
+    axes = (1, 0) + tuple(range(2, image_np.ndim))
+    if orientation == 2:
+        return image_np[:, ::-1]
+    if orientation == 3:
+        return image_np[::-1, ::-1]
+    if orientation == 4:
+        return image_np[::-1]
+    if orientation == 5:
+        return image_np.transpose(axes)
+    if orientation == 6:
+        return image_np.transpose(axes)[:, ::-1]
+    if orientation == 7:
+        return image_np[::-1, ::-1].transpose(axes)
+    if orientation == 8:
+        return image_np.transpose(axes)[::-1]
+    return image_np
+
+class IngestReport:
+    """
+    Cost of ingesting one upload:
+        full_size (tuple): upright (width, height) at native resolution.
+        preview_size (tuple): upright (width, height) of the decoded preview.
+        draft_scale (int): JPEG reduction of the preview (1, 2, 4 or 8).
+        first_image_seconds (float): time until the preview array is ready.
+        crop_seconds (float): time to decode the selected crop, if any.
+        peak_bytes (int): largest amount of pixel buffers alive at once
+                          (decoded image plus the arrays made from it).
+    """
+
+    def __init__(self, full_size, preview_size, draft_scale, first_image_seconds, peak_bytes):
+        self.full_size = full_size
+        self.preview_size = preview_size
+        self.draft_scale = draft_scale
+        self.first_image_seconds = first_image_seconds
+        self.crop_seconds = None
+        self.peak_bytes = peak_bytes
+
+    def to_dict(self):
+        return dict(vars(self))
+
+@profiled("ingestion.decode_preview")
+def decode_preview(data, max_width=MAX_IMAGE_WIDTH):
+    """
+    Decodes an upload for display and cropping. JPEGs are decoded at the
+    smallest DCT scale (1/2, 1/4 or 1/8, PIL's draft mode) that still gives
+    at least max_width pixels on both sides; other formats are decoded at
+    full resolution. The EXIF orientation is applied, which copies the
+    preview once when the image is flipped or rotated.
+    Args:
+        data (bytes): Encoded image.
+        max_width (int): Width the preview is displayed at.
+    Returns:
+        tuple: (upright read-only RGB array, EXIF orientation, IngestReport).
+    """
+    start = time.perf_counter()
+    image = Image.open(BytesIO(data))
+    orientation = read_orientation(image)
+    full_size = oriented_size(image.size, orientation)
+    if image.format == "JPEG":
+        image.draft("RGB", (max_width, max_width))
+    draft_scale = max(1, round(full_size[0] / oriented_size(image.size, orientation)[0]))
+    image.load()
+    decoded_bytes = image.width * image.height * len(image.getbands())
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+        decoded_bytes += image.width * image.height * 3
+    rgb = np.asarray(image)
+    peak_bytes = decoded_bytes + rgb.nbytes
+    del image
+    if orientation != 1:
+        # OpenCV needs contiguous rows: the upright preview is copied once,
+        # after the decoded image is freed
+        rgb = np.ascontiguousarray(oriented_view(rgb, orientation))
+        peak_bytes = max(peak_bytes, 2 * rgb.nbytes)
+    rgb.flags.writeable = False
+    report = IngestReport(full_size, (rgb.shape[1], rgb.shape[0]), draft_scale,
+                          time.perf_counter() - start, peak_bytes)
+    return rgb, orientation, report
+
+@profiled("ingestion.decode_region")
+def decode_region(data, box, orientation=1):
+    """
+    Decodes an upload at full resolution and keeps only a region of it.
+    The decoders cannot skip the rest of the image, but the upright region
+    is copied straight out of the decoded buffer, which is freed right away,
+    so only the region stays in memory.
+    Args:
+        data (bytes): Encoded image.
+        box (tuple): (x1, y1, x2, y2) in upright full-resolution pixels, x2/y2 exclusive.
+        orientation (int): EXIF orientation of the image.
+    Returns:
+        tuple: (contiguous RGB array of the region, peak bytes of pixel buffers).
+    """
+    x1, y1, x2, y2 = box
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    decoded = None
+    if Image.open(BytesIO(data)).format == "JPEG":
+        # OpenCV decodes straight into one array (the orientation is applied below as a view)
+        decoded = cv2.imdecode(buffer, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+    if decoded is not None:
+        region = np.ascontiguousarray(oriented_view(decoded, orientation)[y1:y2, x1:x2])
+        peak_bytes = decoded.nbytes + region.nbytes
+        del decoded
+        cv2.cvtColor(region, cv2.COLOR_BGR2RGB, dst=region)
+        return region, peak_bytes
+
+    image = Image.open(BytesIO(data))
+    image.load()
+    decoded_bytes = image.width * image.height * len(image.getbands())
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+        decoded_bytes += image.width * image.height * 3
+    rgb = np.asarray(image)
+    del image
+    region = np.ascontiguousarray(oriented_view(rgb, orientation)[y1:y2, x1:x2])
+    return region, decoded_bytes + rgb.nbytes + region.nbytes
@@ -0,0 +1,300 @@
+import threading
+
+from utils.filter_stage import HSVFilterStage, MorphologyCache
+from utils.hsv_threshold import threshold_hsv
+from utils.image_processing import (
+    DEFAULT_LABELING_ENGINE, find_routes, find_routes_for_reaches, segment_holds, segment_image,
+)
+from utils.image_store import ImageStore
+from utils.profiling import span
+from utils.routing import reach_graph_for
+
+# Stages in dependency order: each one depends on the one before it
+STAGES = ("decode", "crop", "hsv", "threshold", "morphology", "label", "stats", "graph", "route", "variants")
+
+# Parameters of a new pipeline (same defaults as the app)
+DEFAULT_PARAMETERS = {
+    "color_hsv": None,           # threshold
+    "tolerances": (4, 100, 100), # threshold: (H, S, V)
+    "erosion": 0,                # morphology
+    "dilation": 0,               # morphology
+    "connectivity": 4,           # label
+    "engine": DEFAULT_LABELING_ENGINE, # label
+    "memory_budget": None,       # label: tiled segmentation budget (same result, not part of the key)
+    "max_reach": None,           # graph
+    "reach_variants": (),        # graph, variants: reaches of the extra routes, relative to max_reach
+    "starts": (),                # route: (x, y) clicks on the initial holds
+    "finish": None,              # route: (x, y) click on the final hold
+    "k": 1,                      # route: number of routes
+}
+
+class Pipeline:
+    """
+    Hold detection and route search as a chain of memoized stages:
+        decode -> crop -> hsv -> threshold -> morphology -> label -> stats -> graph -> route
+                                                                               -> variants
+    Parameters are changed with set() and nothing runs until a result is
+    requested. Every stage keeps its latest result with the key of its
+    inputs (the key of the stage before it plus its own parameters), so
+    changing one parameter only recomputes the stages after it, and only
+    when one of their results is asked for.
+    Decoding and cropping are done by the ImageStore, and the HSV array is
+    cached by the crop itself (see CachedImage).
+    """
+
+    def __init__(self, store=None):
+        self.store = store if store is not None else ImageStore()
+        self.params = dict(DEFAULT_PARAMETERS)
+        # Times each stage was computed (the crop and its HSV array are cached by the store)
+        self.runs = {stage: 0 for stage in STAGES if stage not in ("crop", "hsv")}
+        self._results = {}
+        self._morphology = MorphologyCache()
+        self._preview = HSVFilterStage()
+        self._lock = threading.RLock()
+
+    def load(self, name, data):
+        """
+        Decodes a new upload, dropping every result of the previous one.
+        """
+        with self._lock, span("pipeline.decode", bytes=len(data)):
+            self.store.load(name, data)
+            self._results.clear()
+            self.runs["decode"] += 1
+            return self.store.original
+
+    def set(self, **params):
+        """
+        Changes parameters (see DEFAULT_PARAMETERS). Nothing is recomputed here.
+        """
+        unknown = set(params) - set(DEFAULT_PARAMETERS)
+        if unknown:
+            raise ValueError(f"Parâmetros desconhecidos do pipeline: {', '.join(sorted(unknown))}")
+        if "tolerances" in params:
+            params["tolerances"] = tuple(int(t) for t in params["tolerances"])
+        if params.get("color_hsv") is not None:
+            params["color_hsv"] = tuple(int(c) for c in params["color_hsv"])
+        if "starts" in params:
+            params["starts"] = tuple(tuple(point) for point in params["starts"] or ())
+        if params.get("finish") is not None:
+            params["finish"] = tuple(params["finish"])
+        if "reach_variants" in params:
+            params["reach_variants"] = tuple(float(factor) for factor in params["reach_variants"] or ())
+        with self._lock:
+            self.params.update(params)
+
+    def reset(self):
+        """
+        Restores the default parameters (the loaded image and crop are kept).
+        """
+        with self._lock:
+            self.params = dict(DEFAULT_PARAMETERS)
+
+    def clear(self):
+        """
+        Drops the image and every result.
+        """
+        with self._lock:
+            self.store.clear()
+            self._results.clear()
+            self.reset()
+
+    def key(self, stage):
+        """
+        Key of the inputs of a stage for the current parameters, or None if
+        the stage cannot run yet (no image, no crop or no color).
+        """
+        p = self.params
+        if stage == "decode":
+            return self.store.original.key if self.store.original is not None else None
+        if stage in ("crop", "hsv"):
+            crop = self.store.crop
+            return crop.key if crop is not None else None
+        if stage == "threshold":
+            upstream = self.key("crop")
+            if upstream is None or p["color_hsv"] is None:
+                return None
+            return (upstream, p["color_hsv"], p["tolerances"])
+        if stage == "morphology":
+            upstream = self.key("threshold")
+            return upstream and (upstream, int(p["erosion"]), int(p["dilation"]))
+        if stage in ("label", "stats"):
+            upstream = self.key("morphology")
+            return upstream and (upstream, int(p["connectivity"]), p["engine"])
+        if stage == "graph":
+            upstream = self.key("label")
+            return upstream and (upstream, self._graph_reach())
+        if stage == "route":
+            upstream = self.key("graph")
+            return upstream and (upstream, p["max_reach"] or None, p["starts"], p["finish"], int(p["k"]))
+        if stage == "variants":
+            upstream = self.key("graph")
+            return upstream and (upstream, p["max_reach"] or None, p["reach_variants"], p["starts"], p["finish"])
+        raise ValueError(f"Etapa desconhecida do pipeline: {stage}")
+
+    def _graph_reach(self):
+        # The graph is built for the largest reach asked for; smaller reaches skip its longer edges
+        max_reach = self.params["max_reach"]
+        if not max_reach:
+            return None
+        return float(max_reach) * max((1.0,) + self.params["reach_variants"])
+
+    def _memo(self, stage, compute):
+        key = self.key(stage)
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._results.get(stage)
+            if entry is not None and entry[0] == key:
+                return entry[1]
+            with span(f"pipeline.{stage}"):
+                value = compute()
+            self.runs[stage] += 1
+            self._results[stage] = (key, value)
+            return value
+
+    def cached(self, stage):
+        """
+        Result of a stage if it is up to date with the parameters, without computing it.
+        """
+        key = self.key(stage)
+        entry = self._results.get(stage)
+        if key is None or entry is None or entry[0] != key:
+            return None
+        return entry[1]
+
+    # --- Stages ---
+
+    def image(self):
+        """
+        The decoded upload (CachedImage), or None.
+        """
+        return self.store.original
+
+    def crop(self):
+        """
+        The crop (CachedImage), or None before cropping.
+        """
+        return self.store.crop
+
+    def hsv(self):
+        """
+        HSV array of the crop.
+        """
+        crop = self.store.crop
+        return crop.hsv if crop is not None else None
+
+    def threshold(self):
+        """
+        Binary mask (255 = selected) of the crop pixels within the color tolerances.
+        """
+        def compute():
+            return threshold_hsv(self.hsv(), self.params["color_hsv"], *self.params["tolerances"])
+        return self._memo("threshold", compute)
+
+    def morphology(self):
+        """
+        The threshold mask after erosion and dilation. Slider moves are
+        incremental (see MorphologyCache); the mask is owned by the pipeline.
+        """
+        def compute():
+            mask = self.threshold()
+            threshold_key = self.key("threshold")
+            if self._morphology.key != threshold_key:
+                self._morphology.reset(threshold_key, mask)
+            return self._morphology.get(int(self.params["erosion"]), int(self.params["dilation"]))
+        return self._memo("morphology", compute)
+
+    def holds(self):
+        """
+        The detected holds (HoldTable). With a memory_budget the crop is
+        segmented tile by tile straight from the image, without building
+        the full-size threshold and morphology masks.
+        """
+        def compute():
+            p = self.params
+            if p["memory_budget"]:
+                return segment_image(
+                    self.crop().rgb, p["color_hsv"], *p["tolerances"], int(p["erosion"]), int(p["dilation"]),
+                    int(p["connectivity"]), p["engine"], memory_budget=p["memory_budget"]
+                )
+            return segment_holds(self.morphology(), int(p["connectivity"]), p["engine"])
+        return self._memo("label", compute)
+
+    def stats(self):
+        """
+        Per-hold statistics (ComponentStats) of the detected holds.
+        """
+        return self._memo("stats", lambda: self.holds().stats)
+
+    def graph(self):
+        """
+        Reachability graph of the holds (ReachGraph), or None without a
+        maximum reach. It is built for the largest of max_reach and its
+        variants, and a new hold set updates the previous graph in place
+        when it can (see reach_graph_for).
+        """
+        def compute():
+            graph_reach = self._graph_reach()
+            if not graph_reach:
+                return None
+            previous = self._results.get("graph")
+            return reach_graph_for(self.holds(), graph_reach, previous[1] if previous else None)
+        return self._memo("graph", compute)
+
+    def routes(self):
+        """
+        Up to k shortest routes from the start clicks to the finish click
+        (lists of (x, y) hold centroids), or None without clicks.
+        """
+        if not self.params["starts"] or self.params["finish"] is None:
+            return None
+        def compute():
+            p = self.params
+            return find_routes(self.holds(), list(p["starts"]), p["finish"], k=int(p["k"]),
+                               max_reach=p["max_reach"], graph=self.graph())
+        return self._memo("route", compute)
+
+    def variant_routes(self):
+        """
+        The shortest route for every reach variant (max_reach times each
+        factor of reach_variants), all from one query over the graph (see
+        find_routes_for_reaches). Returns a list with one route (or None)
+        per variant, empty without variants, and None without clicks.
+        """
+        p = self.params
+        if not p["starts"] or p["finish"] is None:
+            return None
+        if not p["max_reach"] or not p["reach_variants"]:
+            return []
+        def compute():
+            reaches = [float(p["max_reach"]) * factor for factor in p["reach_variants"]]
+            return find_routes_for_reaches(self.holds(), list(p["starts"]), p["finish"], reaches, graph=self.graph())
+        return self._memo("variants", compute)
+
+    def preview(self, max_width):
+        """
+        Display-size preview of the filter (see HSVFilterStage): the proxy of
+        the crop with the pixels outside the mask in black, and the mask.
+        Both are buffers owned by the pipeline.
+        Returns:
+            tuple: (preview RGB, mask), or (None, None) without a crop or color.
+        """
+        crop = self.store.crop
+        p = self.params
+        if crop is None or p["color_hsv"] is None:
+            return None, None
+        proxy = crop.proxy(max_width)
+        with self._lock:
+            return self._preview.run(proxy.rgb, p["color_hsv"], *p["tolerances"],
+                                     int(p["erosion"]), int(p["dilation"]), image_hsv=proxy.hsv)
+
+    @property
+    def nbytes(self):
+        """
+        Bytes held by the image store, the stage results and the stage buffers.
+        """
+        total = self.store.nbytes + self._morphology.nbytes + self._preview.nbytes
+        for stage, (_, value) in list(self._results.items()):
+            if stage in ("threshold", "label", "graph"):
+                total += getattr(value, "nbytes", 0)
+        return total
@@ -0,0 +1,367 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+# Reruns kept by a Profiler (the oldest are dropped)
+DEFAULT_MAX_RERUNS = 20
+
+# Spans recorded per rerun at most (a runaway loop cannot fill the memory)
+MAX_SPANS_PER_RERUN = 10_000
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def current_rss():
+    """
+    Resident memory of this process in bytes, or None where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+class _Binding(threading.local):
+    # Profiler recording the current thread (Streamlit runs each rerun on its own thread)
+    profiler = None
+
+_binding = _Binding()
+
+# Reruns being recorded on any thread: while it is 0 spans skip even the thread-local lookup
+_recording = 0
+_recording_lock = threading.Lock()
+
+class Span:
+    """
+    One timed stage of a rerun:
+        name (str): stage name, e.g. "image_processing.segment_holds".
+        start, end (float): perf_counter times, in seconds.
+        depth (int): nesting level inside the rerun (0 = top level).
+        rss (int): resident memory at the end of the span, in bytes (None if unknown).
+        rss_delta (int): change of the resident memory over the span, in bytes.
+        alloc_peak (int): peak of the Python/NumPy allocations made inside
+                          the span, in bytes (None unless the profiler traces allocations).
+        args (dict): extra values shown in the trace.
+    """
+    __slots__ = ("name", "start", "end", "depth", "rss", "rss_delta", "alloc_peak", "args")
+
+    @property
+    def seconds(self):
+        return self.end - self.start
+
+class Rerun:
+    """
+    The spans recorded during one run of the script.
+    """
+
+    def __init__(self, label, start):
+        self.label = label
+        self.start = start
+        self.end = None
+        self.interrupted = False # Stopped by st.rerun/st.stop before reaching the end of the script
+        self.spans = []
+        self.dropped = 0
+
+    @property
+    def seconds(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+class _SpanContext:
+    __slots__ = ("profiler", "span", "rss", "alloc_base", "alloc_floor")
+
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        span = self.span = Span()
+        span.name = name
+        span.args = args
+        span.rss = None
+        span.rss_delta = None
+        span.alloc_peak = None
+
+    def __enter__(self):
+        profiler = self.profiler
+        span = self.span
+        span.depth = len(profiler._stack)
+        profiler._stack.append(self)
+        if profiler.allocations and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            # The peak of the enclosing span is kept here, as reset_peak drops it
+            if profiler._stack[:-1]:
+                parent = profiler._stack[-2]
+                parent.alloc_floor = max(parent.alloc_floor, peak)
+            tracemalloc.reset_peak()
+            self.alloc_base = current
+            self.alloc_floor = current
+        else:
+            self.alloc_base = None
+        self.rss = current_rss() if profiler.memory else None
+        span.start = time.perf_counter()
+        return span
+
+    def __exit__(self, *exc_info):
+        span = self.span
+        span.end = time.perf_counter()
+        profiler = self.profiler
+        if self.rss is not None:
+            span.rss = current_rss()
+            span.rss_delta = span.rss - self.rss if span.rss is not None else None
+        if self.alloc_base is not None and tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1], self.alloc_floor)
+            span.alloc_peak = peak - self.alloc_base
+            if len(profiler._stack) > 1:
+                parent = profiler._stack[-2]
+                parent.alloc_floor = max(parent.alloc_floor, peak)
+        profiler._stack.pop()
+        profiler._add(span)
+        return False
+
+class _NullSpan:
+    # Context manager used when nothing is being recorded
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class Profiler:
+    """
+    Records timing and memory spans of the pipeline stages, grouped by rerun.
+    A rerun is recorded between begin() and end() (or inside session())
+    on the thread that runs the script; stages wrapped with span() or @profiled on that thread are
+    added to it. While no rerun is being recorded a span only checks a
+    module counter, so the instrumentation can stay in the hot paths.
+    """
+
+    def __init__(self, memory=True, allocations=False, max_reruns=DEFAULT_MAX_RERUNS):
+        """
+        Args:
+            memory (bool): Record the change of the resident memory over every span.
+            allocations (bool): Record the allocation peak of every span with
+                                tracemalloc (slows the stages down noticeably).
+            max_reruns (int): Number of reruns kept.
+        """
+        self.memory = memory
+        self.allocations = allocations
+        self.reruns = deque(maxlen=max_reruns)
+        self.epoch = time.perf_counter()
+        self._current = None
+        self._stack = []
+        self._started_tracemalloc = False
+
+    def begin(self, label=None):
+        """
+        Starts recording a rerun on the calling thread. A rerun still open
+        (the script stopped early) is closed as interrupted.
+        """
+        interrupted = self._current
+        if interrupted is not None:
+            self.end()
+            # It ended somewhere after its last span, not when this rerun started
+            interrupted.interrupted = True
+            interrupted.end = max((span.end for span in interrupted.spans), default=interrupted.start)
+        if self.allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._current = Rerun(label or f"rerun {len(self.reruns) + 1}", time.perf_counter())
+        self.reruns.append(self._current)
+        self._stack = []
+        _binding.profiler = self
+        global _recording
+        with _recording_lock:
+            _recording += 1
+        return self._current
+
+    def end(self):
+        """
+        Stops recording the current rerun.
+        Returns:
+            Rerun: The rerun just recorded, or None.
+        """
+        global _recording
+        rerun = self._current
+        if rerun is not None:
+            rerun.end = time.perf_counter()
+            with _recording_lock:
+                _recording -= 1
+        self._current = None
+        self._stack = []
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        if _binding.profiler is self:
+            _binding.profiler = None
+        return rerun
+
+    @contextlib.contextmanager
+    def session(self, label=None):
+        """
+        Records one rerun around a block of code (begin/end):
+            with profiler.session():
+                ...
+        The rerun is ended even when the block raises (st.rerun and st.stop
+        raise too), and is then marked interrupted, so no rerun is left
+        recording and tracemalloc is stopped.
+        """
+        rerun = self.begin(label)
+        try:
+            yield rerun
+        except BaseException:
+            rerun.interrupted = True
+            raise
+        finally:
+            self.end()
+
+    def span(self, name, **args):
+        """
+        Context manager timing one stage of the current rerun.
+        """
+        if self._current is None:
+            return _NULL_SPAN
+        return _SpanContext(self, name, args)
+
+    def _add(self, span):
+        rerun = self._current
+        if rerun is None:
+            return
+        if len(rerun.spans) < MAX_SPANS_PER_RERUN:
+            rerun.spans.append(span)
+        else:
+            rerun.dropped += 1
+
+    @property
+    def last(self):
+        """
+        The latest finished rerun, or None.
+        """
+        for rerun in reversed(self.reruns):
+            if rerun.end is not None:
+                return rerun
+        return None
+
+    def summary(self, rerun=None):
+        """
+        Spans of a rerun (the latest finished one by default) aggregated by name.
+        Returns:
+            list: One dict per stage (name, calls, total_ms, max_ms, rss_delta_mb
+                  and alloc_peak_mb), slowest first.
+        """
+        rerun = rerun or self.last
+        if rerun is None:
+            return []
+        stages = {}
+        for span in rerun.spans:
+            stage = stages.setdefault(span.name, {"name": span.name, "calls": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                                  "rss_delta_mb": None, "alloc_peak_mb": None})
+            milliseconds = span.seconds * 1e3
+            stage["calls"] += 1
+            stage["total_ms"] += milliseconds
+            stage["max_ms"] = max(stage["max_ms"], milliseconds)
+            if span.rss_delta is not None:
+                stage["rss_delta_mb"] = (stage["rss_delta_mb"] or 0.0) + span.rss_delta / 1e6
+            if span.alloc_peak is not None:
+                stage["alloc_peak_mb"] = max(stage["alloc_peak_mb"] or 0.0, span.alloc_peak / 1e6)
+        return sorted(stages.values(), key=lambda stage: stage["total_ms"], reverse=True)
+
+    def to_chrome_trace(self):
+        """
+        The recorded reruns in the Chrome trace event format (opens in
+        Perfetto or chrome://tracing): one complete event per rerun and per
+        span, and a counter with the resident memory at the end of every span.
+        """
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": "Quero Beta"}}]
+
+        def microseconds(t):
+            return round((t - self.epoch) * 1e6, 1)
+
+        for tid, rerun in enumerate(self.reruns, start=1):
+            end = rerun.end if rerun.end is not None else time.perf_counter()
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": rerun.label}})
+            events.append({
+                "name": rerun.label, "cat": "rerun", "ph": "X", "pid": pid, "tid": tid,
+                "ts": microseconds(rerun.start), "dur": round((end - rerun.start) * 1e6, 1),
+                "args": {"interrupted": rerun.interrupted, "dropped_spans": rerun.dropped},
+            })
+            for span in sorted(rerun.spans, key=lambda s: (s.start, s.depth)):
+                args = {key: _plain(value) for key, value in span.args.items()}
+                if span.rss_delta is not None:
+                    args["rss_delta_bytes"] = span.rss_delta
+                if span.alloc_peak is not None:
+                    args["alloc_peak_bytes"] = span.alloc_peak
+                events.append({
+                    "name": span.name, "cat": span.name.split(".")[0], "ph": "X", "pid": pid, "tid": tid,
+                    "ts": microseconds(span.start), "dur": round(span.seconds * 1e6, 1), "args": args,
+                })
+                if span.rss is not None:
+                    events.append({"name": "rss", "ph": "C", "pid": pid, "tid": tid,
+                                   "ts": microseconds(span.end), "args": {"MB": round(span.rss / 1e6, 2)}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, file):
+        """
+        Writes the Chrome trace as JSON.
+        Args:
+            file (str or file object): Path or open text file.
+        """
+        if isinstance(file, str):
+            with open(file, "w", encoding="utf-8") as f:
+                json.dump(self.to_chrome_trace(), f, separators=(",", ":"))
+        else:
+            json.dump(self.to_chrome_trace(), file, separators=(",", ":"))
+
+    def clear(self):
+        self.reruns.clear()
+
+def _plain(value):
+    # Trace arguments must be JSON values
+    if isinstance(value, (bool, int, float, str)) or value is None:
+        return value
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return str(value)
+
+def active():
+    """
+    The profiler recording the calling thread, or None.
+    """
+    return _binding.profiler
+
+def span(name, **args):
+    """
+    Times a stage on the profiler recording the calling thread, if any:
+        with span("cropper.display"):
+            ...
+    """
+    if not _recording:
+        return _NULL_SPAN
+    profiler = _binding.profiler
+    if profiler is None:
+        return _NULL_SPAN
+    return profiler.span(name, **args)
+
+def profiled(name):
+    """
+    Decorator timing every call of a function as a span (see span).
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _recording:
+                return function(*args, **kwargs)
+            profiler = _binding.profiler
+            if profiler is None:
+                return function(*args, **kwargs)
+            with profiler.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
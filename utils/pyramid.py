@@ -0,0 +1,97 @@
+import numpy as np
+import cv2
+from PIL import Image
+
+# Width of the interactive previews (cropping, color picking, sliders)
+MAX_IMAGE_WIDTH = 500 # pixels
+
+def display_scale(width, max_width=MAX_IMAGE_WIDTH):
+    """
+    Factor between full-resolution and display coordinates (never below 1,
+    small images are shown as they are).
+    Args:
+        width (int): Full-resolution width.
+        max_width (int): Maximum display width.
+    Returns:
+        float: full_resolution / display.
+    """
+    return max(1.0, width / max_width)
+
+def downscale_image(image_pil, max_width=MAX_IMAGE_WIDTH):
+    """
+    Builds the display proxy of an image (area-averaged).
+    Args:
+        image_pil (PIL.Image.Image): Full-resolution image.
+        max_width (int): Maximum display width.
+    Returns:
+        PIL.Image.Image: The proxy, or the image itself if it is already small enough.
+    """
+    scale = display_scale(image_pil.width, max_width)
+    if scale == 1.0:
+        return image_pil
+    size = (max(1, round(image_pil.width / scale)), max(1, round(image_pil.height / scale)))
+    return image_pil.resize(size, Image.Resampling.BOX)
+
+def downscale_array(image_np, max_width=MAX_IMAGE_WIDTH, nearest=False):
+    """
+    Builds the display proxy of an array (area-averaged, or nearest
+    neighbour for label images and masks, so no new values are created).
+    Args:
+        image_np (numpy.ndarray): Full-resolution array (2D or 3D).
+        max_width (int): Maximum display width.
+        nearest (bool): Use nearest-neighbour sampling.
+    Returns:
+        numpy.ndarray: The proxy, or the array itself if it is already small enough.
+    """
+    height, width = image_np.shape[:2]
+    scale = display_scale(width, max_width)
+    if scale == 1.0:
+        return image_np
+    size = (max(1, round(width / scale)), max(1, round(height / scale)))
+    if nearest:
+        # Sample the center of each proxy pixel
+        xs = np.minimum(((np.arange(size[0]) + 0.5) * width / size[0]).astype(np.intp), width - 1)
+        ys = np.minimum(((np.arange(size[1]) + 0.5) * height / size[1]).astype(np.intp), height - 1)
+        return image_np[ys[:, np.newaxis], xs]
+    return cv2.resize(image_np, size, interpolation=cv2.INTER_AREA)
+
+def to_full_resolution(point, full_size, display_size):
+    """
+    Maps a point clicked on the proxy to full-resolution pixel coordinates.
+    Args:
+        point (tuple): (x, y) on the proxy.
+        full_size (tuple): (width, height) of the full-resolution image.
+        display_size (tuple): (width, height) of the proxy.
+    Returns:
+        tuple: (x, y) integer pixel coordinates in the full-resolution image.
+    """
+    x = int((point[0] + 0.5) * full_size[0] / display_size[0])
+    y = int((point[1] + 0.5) * full_size[1] / display_size[1])
+    return min(max(x, 0), full_size[0] - 1), min(max(y, 0), full_size[1] - 1)
+
+def to_display(point, full_size, display_size):
+    """
+    Maps a full-resolution point to proxy coordinates.
+    Args:
+        point (tuple): (x, y) in the full-resolution image.
+        full_size (tuple): (width, height) of the full-resolution image.
+        display_size (tuple): (width, height) of the proxy.
+    Returns:
+        tuple: (x, y) float coordinates on the proxy.
+    """
+    return (point[0] * display_size[0] / full_size[0], point[1] * display_size[1] / full_size[1])
+
+def box_to_full_resolution(box, full_size, display_size):
+    """
+    Maps a (x1, y1, x2, y2) box drawn on the proxy to full resolution.
+    Args:
+        box (tuple): (x1, y1, x2, y2) on the proxy, x2/y2 exclusive.
+        full_size (tuple): (width, height) of the full-resolution image.
+        display_size (tuple): (width, height) of the proxy.
+    Returns:
+        tuple: (x1, y1, x2, y2) in full-resolution pixels, clipped to the image.
+    """
+    sx, sy = full_size[0] / display_size[0], full_size[1] / display_size[1]
+    x1, y1, x2, y2 = (round(box[0] * sx), round(box[1] * sy), round(box[2] * sx), round(box[3] * sy))
+    return (min(max(x1, 0), full_size[0]), min(max(y1, 0), full_size[1]),
+            min(max(x2, 0), full_size[0]), min(max(y2, 0), full_size[1]))
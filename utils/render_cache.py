@@ -0,0 +1,124 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+
+from utils.profiling import span
+
+# Maximum bytes of encoded images kept by a RenderCache
+DEFAULT_ENCODED_CACHE_BYTES = 32 * 1024 * 1024
+
+# Quality of the JPEG encoding used for photo-like views
+JPEG_QUALITY = 90
+
+def encode_image(image_np, image_format="PNG", quality=JPEG_QUALITY):
+    """
+    Encodes an RGB array for st.image.
+    Args:
+        image_np (numpy.ndarray): RGB (or grayscale) image.
+        image_format (str): "PNG" or "JPEG".
+        quality (int): JPEG quality (0 to 100).
+    Returns:
+        bytes: The encoded image.
+    """
+    if image_np.ndim == 3:
+        image_np = cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR)
+    if image_format == "JPEG":
+        ok, data = cv2.imencode(".jpg", image_np, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    elif image_format == "PNG":
+        ok, data = cv2.imencode(".png", image_np)
+    else:
+        raise ValueError(f"Formato de imagem não suportado: {image_format}")
+    if not ok:
+        raise ValueError("Não foi possível codificar a imagem.")
+    return data.tobytes()
+
+class RenderCache:
+    """
+    Per-session cache of rendered layers and of the encoded views shown
+    with st.image.
+    Every layer (e.g. the hold colors or the routes) keeps its latest
+    rendering with the key of its inputs, so a rerun only re-renders the
+    layers whose inputs changed; composited views are cached as encoded
+    bytes (LRU, up to max_bytes), so unchanged views are not composited
+    or encoded again.
+    Keys must be hashable tuples of plain values: use HoldTable.token or
+    CachedImage.key rather than the objects, so cached views do not keep
+    them alive.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_ENCODED_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.renders = 0 # Layers rendered so far
+        self.encodes = 0 # Views encoded so far
+        self._layers = {}
+        self._encoded = OrderedDict()
+        self._lock = threading.Lock()
+
+    def layer(self, name, key, render):
+        """
+        Returns the layer rendered for key, calling render() only if the
+        layer was last rendered for other inputs.
+        Args:
+            name (str): Layer name.
+            key (tuple): Inputs of the layer.
+            render (callable): Builds the layer.
+        Returns:
+            The rendered layer (treat it as read-only).
+        """
+        with self._lock:
+            entry = self._layers.get(name)
+            if entry is not None and entry[0] == key:
+                return entry[1]
+        with span("render_cache.layer", layer=name):
+            value = render()
+        self.renders += 1
+        with self._lock:
+            self._layers[name] = (key, value)
+        return value
+
+    def encoded(self, name, key, compose, image_format="PNG", quality=JPEG_QUALITY):
+        """
+        Returns the encoded bytes of a view, composing and encoding it only
+        if it is not cached.
+        Args:
+            name (str): View name.
+            key (tuple): Inputs of the view (layer keys, opacity, ...).
+            compose (callable): Builds the RGB view from its layers.
+            image_format (str): "PNG" or "JPEG".
+            quality (int): JPEG quality.
+        Returns:
+            bytes: The encoded view.
+        """
+        cache_key = (name, key, image_format, quality)
+        with self._lock:
+            data = self._encoded.get(cache_key)
+            if data is not None:
+                self._encoded.move_to_end(cache_key)
+                return data
+        with span("render_cache.compose", view=name):
+            image_np = compose()
+        with span("render_cache.encode", view=name, format=image_format):
+            data = encode_image(image_np, image_format, quality)
+        self.encodes += 1
+        with self._lock:
+            self._encoded[cache_key] = data
+            total = sum(len(d) for d in self._encoded.values())
+            while total > self.max_bytes and len(self._encoded) > 1:
+                _, dropped = self._encoded.popitem(last=False)
+                total -= len(dropped)
+        return data
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            layers = 0
+            for _, value in self._layers.values():
+                parts = value if isinstance(value, tuple) else (value,)
+                layers += sum(getattr(part, "nbytes", 0) for part in parts)
+            return layers + sum(len(d) for d in self._encoded.values())
+
+    def clear(self):
+        with self._lock:
+            self._layers.clear()
+            self._encoded.clear()
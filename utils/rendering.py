@@ -0,0 +1,97 @@
+import numpy as np
+import cv2
+
+# Hue step between consecutive labels: the golden ratio spreads any number
+# of hues around the circle with consecutive labels far apart
+GOLDEN_RATIO_STEP = 0.618033988749895
+
+# Saturation/value pairs cycled through on top of the hue step, so labels
+# whose hues land close together still differ in shade
+PALETTE_SHADES = [(230, 255), (255, 190), (170, 235)]
+
+def make_palette(num_colors):
+    """
+    Generates a palette for a label image: black for label 0 and one
+    color per label, consecutive labels getting far apart hues.
+    Args:
+        num_colors (int): Number of labels (without the background).
+    Returns:
+        numpy.ndarray: (num_colors + 1, 3) uint8 RGB palette, row 0 black.
+    """
+    index = np.arange(num_colors)
+    hsv = np.empty((1, num_colors, 3), dtype=np.uint8)
+    hsv[0, :, 0] = (np.mod(index * GOLDEN_RATIO_STEP, 1.0) * 180).astype(np.uint8)
+    shades = np.array(PALETTE_SHADES, dtype=np.uint8)[index % len(PALETTE_SHADES)]
+    hsv[0, :, 1:] = shades
+    palette = np.zeros((num_colors + 1, 3), dtype=np.uint8)
+    if num_colors:
+        palette[1:] = cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB)[0]
+    return palette
+
+def render_labels(labels, palette=None, image=None, opacity=1.0):
+    """
+    Colors a label image with a single palette lookup, optionally blended
+    over a photo.
+    Args:
+        labels (numpy.ndarray): Label image (0 for the background).
+        palette (numpy.ndarray, optional): (N + 1, 3) uint8 palette indexed by
+                                           label (see make_palette); it is
+                                           cycled if it has fewer colors.
+        image (numpy.ndarray, optional): RGB photo of the same size. The
+                                         background shows the photo, and
+                                         the holds are blended over it.
+        opacity (float): Weight of the hold colors over the photo (0 to 1).
+    Returns:
+        numpy.ndarray: RGB rendering.
+    """
+    if palette is None:
+        palette = make_palette(int(labels.max()) if labels.size else 0)
+    palette = np.asarray(palette, dtype=np.uint8)
+    if labels.size and labels.max() >= len(palette):
+        # Cycle the palette colors (row 0 stays the background)
+        cycle = len(palette) - 1
+        lut = np.concatenate([palette[:1], palette[1 + np.arange(int(labels.max())) % cycle]])
+    else:
+        lut = palette
+    # Pack each color in one uint32, so the lookup gathers 4 bytes per pixel at once
+    packed = np.zeros((len(lut), 4), dtype=np.uint8)
+    packed[:, :3] = lut
+    gathered = np.take(packed.view(np.uint32).ravel(), labels)
+    colored = cv2.cvtColor(gathered.view(np.uint8).reshape(labels.shape + (4,)), cv2.COLOR_RGBA2RGB)
+    if image is None:
+        return colored
+    return blend_labels(image, colored, labels, opacity, out=colored)
+
+def blend_labels(image, colored, labels, opacity=1.0, out=None):
+    """
+    Blends a colored label layer (from render_labels) over a photo; the
+    background keeps the photo untouched.
+    Args:
+        image (numpy.ndarray): RGB photo.
+        colored (numpy.ndarray): RGB label colors of the same size.
+        labels (numpy.ndarray): The label image (0 for the background).
+        opacity (float): Weight of the hold colors over the photo (0 to 1).
+        out (numpy.ndarray, optional): Output buffer (may be colored itself).
+    Returns:
+        numpy.ndarray: RGB rendering.
+    """
+    if out is None:
+        out = np.empty_like(image)
+    cv2.addWeighted(image, 1.0 - opacity, colored, opacity, 0.0, dst=out)
+    background = cv2.compare(labels, 0, cv2.CMP_EQ)
+    cv2.copyTo(image, background, out)
+    return out
+
+def composite_layer(image, layer):
+    """
+    Draws an RGBA overlay (premultiplied colors, as left by OpenCV drawing
+    on a transparent canvas) over an RGB image.
+    Args:
+        image (numpy.ndarray): RGB base image.
+        layer (numpy.ndarray): RGBA layer of the same size.
+    Returns:
+        numpy.ndarray: New RGB image.
+    """
+    alpha = layer[:, :, 3:].astype(np.uint16)
+    out = (image * (255 - alpha) + 127) // 255 + layer[:, :, :3]
+    return np.minimum(out, 255).astype(np.uint8)
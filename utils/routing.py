@@ -0,0 +1,745 @@
+import heapq
+
+import numpy as np
+
+from utils.spatial_index import HoldIndex
+from utils.tracing import NEIGHBORS, STEPS, SUMMARY
+
+# Default maximum move, as a fraction of the wall (crop) height
+DEFAULT_REACH_FRACTION = 0.25
+# Reach of the alternative routes for shorter and taller climbers, relative to the chosen reach
+REACH_VARIANTS = (0.8, 1.25)
+
+# A ReachGraph is compacted once the holds changed since its last build
+# exceed this fraction of its nodes
+COMPACT_FRACTION = 0.25
+
+# Direction sectors of the moves out of a hold (over the half-turn above it):
+# a reach graph only keeps the moves no other move of their sector dominates
+# (see reach_moves). None keeps every move within reach.
+REACH_SECTORS = 16
+
+# reach_moves first looks at every move up to this many grid cells of the
+# spatial index, then only where a sector may still hold undominated moves
+NEAR_CELLS = 2
+
+def _can_reach_goal(centroids, goal_index):
+    # Moves never go down the wall, so holds above the goal are dead ends
+    return centroids[:, 1] >= centroids[goal_index, 1]
+
+def _a_star(centroids, start_costs, goal_index, neighbors, heuristic=None, blocked=None, trace=None):
+    """
+    Multi-source A* over holds. start_costs maps every start hold to its
+    initial cost, and neighbors(index) returns the candidate holds of a
+    move and their distances (or None to compute them); the altitude rule
+    is applied here. The heuristic defaults to the straight-line distance
+    to the goal, and blocked holds (boolean mask) are never entered.
+    """
+    # Decided once, so a disabled trace costs nothing inside the loop
+    trace_steps = trace is not None and trace.enabled(STEPS)
+    trace_neighbors = trace is not None and trace.enabled(NEIGHBORS)
+    if trace is not None:
+        trace.record(SUMMARY, "search", len(start_costs), goal_index,
+                     "straight-line" if heuristic is None else "exact")
+    if heuristic is None:
+        heuristic = np.hypot(*(centroids - centroids[goal_index]).T)
+    reachable = _can_reach_goal(centroids, goal_index) & np.isfinite(heuristic)
+    if blocked is not None:
+        reachable &= ~blocked
+
+    cost = np.full(len(centroids), np.inf)
+    parent = np.full(len(centroids), -1, dtype=np.intp)
+    closed = np.zeros(len(centroids), dtype=bool)
+    queue = []
+    for start, start_cost in start_costs.items():
+        if reachable[start] and start_cost < cost[start]:
+            cost[start] = start_cost
+            heapq.heappush(queue, (start_cost + heuristic[start], start))
+
+    while queue:
+        _, current = heapq.heappop(queue)
+        if closed[current]:
+            continue
+        if current == goal_index:
+            path = [current]
+            while parent[path[-1]] >= 0:
+                path.append(int(parent[path[-1]]))
+            if trace is not None:
+                trace.record(SUMMARY, "found", float(cost[current]), len(path), int(closed.sum()))
+            return path[::-1], float(cost[current])
+        closed[current] = True
+        if trace_steps:
+            trace.record(STEPS, "expand", current, float(cost[current]), float(cost[current] + heuristic[current]))
+
+        x, y = centroids[current]
+        candidates, distance = neighbors(current)
+        keep = (centroids[candidates, 1] <= y) & reachable[candidates] & ~closed[candidates]
+        candidates = candidates[keep]
+        if distance is None:
+            distance = np.hypot(*(centroids[candidates] - (x, y)).T)
+        else:
+            distance = distance[keep]
+        new_cost = cost[current] + distance
+        improved = new_cost < cost[candidates]
+        if trace_neighbors:
+            trace.record(NEIGHBORS, "neighbors", current, candidates, candidates[improved])
+        candidates, new_cost = candidates[improved], new_cost[improved]
+        cost[candidates] = new_cost
+        parent[candidates] = current
+        for neighbor, neighbor_cost in zip(candidates.tolist(), (new_cost + heuristic[candidates]).tolist()):
+            heapq.heappush(queue, (neighbor_cost, neighbor))
+    if trace is not None:
+        trace.record(SUMMARY, "exhausted", int(closed.sum()))
+    return None, float("inf")
+
+def _distances_to_goal(centroids, goal_index, neighbors, lowest_y):
+    """
+    Dijkstra from the goal over reversed moves: the exact length of the
+    shortest route from every hold (down to lowest_y) to the goal.
+    """
+    cost = np.full(len(centroids), np.inf)
+    closed = np.zeros(len(centroids), dtype=bool)
+    cost[goal_index] = 0.0
+    queue = [(0.0, goal_index)]
+    while queue:
+        current_cost, current = heapq.heappop(queue)
+        if closed[current]:
+            continue
+        closed[current] = True
+
+        x, y = centroids[current]
+        candidates, distance = neighbors(current)
+        candidate_y = centroids[candidates, 1]
+        keep = (candidate_y >= y) & (candidate_y <= lowest_y) & ~closed[candidates]
+        candidates = candidates[keep]
+        if distance is None:
+            distance = np.hypot(*(centroids[candidates] - (x, y)).T)
+        else:
+            distance = distance[keep]
+        new_cost = current_cost + distance
+        improved = new_cost < cost[candidates]
+        candidates, new_cost = candidates[improved], new_cost[improved]
+        cost[candidates] = new_cost
+        for neighbor, neighbor_cost in zip(candidates.tolist(), new_cost.tolist()):
+            heapq.heappush(queue, (neighbor_cost, neighbor))
+    return cost
+
+def _path_steps(centroids, path):
+    # Cumulative route length at every hold of the path
+    return np.concatenate([[0.0], np.cumsum(np.hypot(*np.diff(centroids[path], axis=0).T))])
+
+def _k_shortest(centroids, start_indices, goal_index, k, neighbors, trace=None):
+    """
+    Yen's k shortest loopless paths. All start holds hang from a virtual
+    source, so the first spur of every route can switch start hold. The
+    spur searches use the exact distances to the goal (one reverse
+    Dijkstra) as A* heuristic, which stays admissible when holds and
+    moves are removed, so each spur search walks almost straight to the goal.
+    """
+    starts = sorted(set(start_indices))
+    remaining = _distances_to_goal(centroids, goal_index, neighbors, centroids[starts, 1].max())
+    path, length = _a_star(centroids, {start: 0.0 for start in starts}, goal_index, neighbors, remaining, trace=trace)
+    if path is None:
+        return []
+
+    routes = [(path, length)]
+    candidates, seen = [], {tuple(path)}
+    blocked = np.zeros(len(centroids), dtype=bool)
+    while len(routes) < k:
+        last_path = routes[-1][0]
+        steps = _path_steps(centroids, last_path)
+        # Spur from the virtual source (position -1) and from every hold but the goal
+        for position in range(-1, len(last_path) - 1):
+            root = last_path[:position + 1]
+            banned = {route[position + 1] for route, _ in routes if route[:position + 1] == root}
+            blocked[root] = True
+            if position < 0:
+                start_costs = {start: 0.0 for start in starts if start not in banned}
+            else:
+                spur_node = root[-1]
+                nodes, distance = neighbors(spur_node)
+                if distance is None:
+                    distance = np.hypot(*(centroids[nodes] - centroids[spur_node]).T)
+                keep = (centroids[nodes, 1] <= centroids[spur_node, 1]) & ~blocked[nodes]
+                start_costs = {}
+                for node, node_distance in zip(nodes[keep].tolist(), distance[keep].tolist()):
+                    if node not in banned:
+                        start_costs[node] = min(start_costs.get(node, np.inf), steps[position] + node_distance)
+            if trace is not None:
+                trace.record(STEPS, "spur", position, len(start_costs), sorted(banned))
+            spur_path, spur_length = _a_star(centroids, start_costs, goal_index, neighbors, remaining, blocked, trace)
+            blocked[root] = False
+            if spur_path is not None:
+                full_path = root + spur_path
+                if tuple(full_path) not in seen:
+                    seen.add(tuple(full_path))
+                    heapq.heappush(candidates, (spur_length, full_path))
+        if not candidates:
+            break
+        length, path = heapq.heappop(candidates)
+        routes.append((path, length))
+    return routes
+
+def _within(neighbors, max_reach):
+    # Moves of a larger-reach graph that are at most max_reach long
+    def masked(current):
+        nodes, distance = neighbors(current)
+        keep = distance <= max_reach
+        return nodes[keep], distance[keep]
+    return masked
+
+def _routes_for_reaches(centroids, start_indices, goal_index, reaches, neighbors, trace=None):
+    """
+    Shortest route for every reach limit in one query. neighbors gives the
+    moves of the largest reach; the exact distances to the goal under it
+    (one reverse Dijkstra) never overestimate the distances under a smaller
+    reach, which only loses moves, so they are the A* heuristic of every
+    search and each search walks almost straight to the goal.
+    """
+    starts = sorted(set(start_indices))
+    remaining = _distances_to_goal(centroids, goal_index, neighbors, centroids[starts, 1].max())
+    largest = max(reaches)
+    results = []
+    for reach in reaches:
+        reach_neighbors = neighbors if reach >= largest else _within(neighbors, reach)
+        results.append(_a_star(centroids, {start: 0.0 for start in starts}, goal_index,
+                               reach_neighbors, remaining, trace=trace))
+    return results
+
+def _index_neighbors(centroids, max_reach, index):
+    if not max_reach:
+        every_hold = np.arange(len(centroids))
+        return lambda current: (every_hold, None)
+    if index is None:
+        index = HoldIndex(centroids)
+    return lambda current: (index.within(centroids[current], max_reach), None)
+
+def _sector_bounds(sectors):
+    # Extreme sines and cosines of the move angles of every sector (0 = right, pi/2 = up, pi = left)
+    edges = np.linspace(0.0, np.pi, sectors + 1)
+    low, high = edges[:-1], edges[1:]
+    # Rounded so that sin(pi) and cos(pi / 2) are exactly 0: level moves stay inside the search boxes
+    sin, cos = np.round(np.sin(edges), 12), np.round(np.cos(edges), 12)
+    sin_min = np.minimum(sin[:-1], sin[1:])
+    sin_max = np.where((low <= np.pi / 2) & (high >= np.pi / 2), 1.0, np.maximum(sin[:-1], sin[1:]))
+    return sin_min, sin_max, cos[1:], cos[:-1]
+
+def _upward_moves(centroids, source, target, max_reach, sectors):
+    """
+    Filters candidate moves source -> target down to the upward ones within
+    reach. Returns the indices of the kept candidates, their lengths and
+    their sectors.
+    """
+    delta = centroids[target] - centroids[source]
+    distance = np.hypot(delta[:, 0], delta[:, 1])
+    keep = np.flatnonzero((delta[:, 1] <= 0) & (distance <= max_reach) & (source != target))
+    delta = delta[keep]
+    # 0.0 - dy: a horizontal move gets the angle of +0.0, not of -0.0 (-pi)
+    angle = np.arctan2(0.0 - delta[:, 1], delta[:, 0])
+    sector = np.minimum((angle * (sectors / np.pi)).astype(np.intp), sectors - 1)
+    return keep, distance[keep], sector
+
+def _skyline(centroids, source, target, distance, sector, sectors):
+    """
+    Keeps the candidate moves that no other move of the same source and
+    sector dominates. A move u -> w is dominated by a move u -> v that is
+    not longer and ends at the same altitude as w or lower: v -> w is then
+    a move too, and shorter than u -> w. Moves of length zero (holds with
+    the same centroid) dominate nothing.
+    Returns:
+        tuple: (source, target, distance, sector) of the kept moves, and the
+               largest y reached by a dominating move of every (hold, sector),
+               -inf where there is none, as a (holds, sectors) array.
+    """
+    lowest = np.full((len(centroids), sectors), -np.inf)
+    group = source * sectors + sector
+    # Most groups hold a single move, kept as is: only the others are sorted
+    single = np.bincount(group, minlength=len(centroids) * sectors)[group] == 1
+    moved = single & (distance > 0)
+    lowest.reshape(-1)[group[moved]] = centroids[target[moved], 1]
+    kept = (source[single], target[single], distance[single], sector[single])
+    source, target, distance, sector, group = (a[~single] for a in (source, target, distance, sector, group))
+    if len(source):
+        levels, rank = np.unique(centroids[:, 1], return_inverse=True)
+        rank = rank[target]
+        order = np.lexsort((-rank, distance, group))
+        source, target, distance, sector, group, rank = (
+            a[order] for a in (source, target, distance, sector, group, rank))
+        # Exact running maximum of the y ranks within every group: the groups are
+        # offset so that a maximum never carries over into the next one
+        base = group * (len(levels) + 1)
+        level = base + 1 + rank
+        running = np.maximum.accumulate(np.where(distance > 0, level, base))
+        first = np.ones(len(group), dtype=bool)
+        first[1:] = group[1:] != group[:-1]
+        keep = first.copy()
+        keep[1:] |= level[1:] > running[:-1]
+        last = np.flatnonzero(np.append(first[1:], True))
+        reached = running[last] - base[last]
+        lowest.reshape(-1)[group[last[reached > 0]]] = levels[reached[reached > 0] - 1]
+        kept = tuple(np.concatenate([a, b[keep]]) for a, b in zip(kept, (source, target, distance, sector)))
+    return (*kept, lowest)
+
+def _sector_moves(centroids, index, max_reach, sectors, sources):
+    """
+    Undominated moves (see _skyline) out of the source holds, searched over
+    the spatial index in rings of doubling radius. The first ring takes
+    every move up to a few grid cells. Past the lowest target found in a
+    sector, a move can only be undominated if it ends lower still, in a
+    thin band just above its source: the next rings only visit the cells
+    of these bands (the whole sector while it has no move yet).
+    Returns:
+        tuple: (source, target, distance) arrays of the directed moves.
+    """
+    x, y = centroids[sources, 0], centroids[sources, 1]
+    radius = NEAR_CELLS * index.cell_size
+    # One more ring would take about every move again: take them in one go
+    radius = max_reach if max_reach <= 2 * radius else radius
+    box, target = index.in_boxes(np.stack([x - radius, y - radius, x + radius, y], axis=1))
+    source = sources[box]
+    keep, distance, sector = _upward_moves(centroids, source, target, radius, sectors)
+    moves = _skyline(centroids, source[keep], target[keep], distance, sector, sectors)
+
+    sin_min, sin_max, cos_min, cos_max = _sector_bounds(sectors)
+    while radius < max_reach:
+        outer = min(2 * radius, max_reach)
+        lowest = moves[4][sources]
+        rise = np.where(np.isfinite(lowest), y[:, None] - lowest, max_reach)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            far = np.minimum(outer, rise / sin_min)
+        ring_source, ring_sector = np.nonzero(far > radius)
+        if not len(ring_source):
+            break
+        # Bounding box of the part of the sector between radius and far, below the lowest target
+        far = far[ring_source, ring_sector]
+        rx, ry = x[ring_source], y[ring_source]
+        cos_low, cos_high = cos_min[ring_sector], cos_max[ring_sector]
+        boxes = np.stack([
+            rx + np.minimum(radius * cos_low, far * cos_low),
+            np.maximum(lowest[ring_source, ring_sector], ry - far * sin_max[ring_sector]),
+            rx + np.maximum(radius * cos_high, far * cos_high),
+            ry - radius * sin_min[ring_sector],
+        ], axis=1)
+        box, target = index.in_boxes(boxes)
+        source = sources[ring_source[box]]
+        keep, distance, sector = _upward_moves(centroids, source, target, outer, sectors)
+        # Moves up to radius were all seen by the previous rings
+        ring = (distance > radius) & (sector == ring_sector[box[keep]])
+        keep = keep[ring]
+        # Dominated moves of the previous rings stay dominated by their kept ones
+        moves = _skyline(centroids, np.concatenate([moves[0], source[keep]]),
+                         np.concatenate([moves[1], target[keep]]),
+                         np.concatenate([moves[2], distance[ring]]),
+                         np.concatenate([moves[3], sector[ring]]), sectors)
+        radius = outer
+    return moves[:3]
+
+def reach_moves(centroids, max_reach, index=None, sectors=REACH_SECTORS):
+    """
+    Moves of a reach graph, as undirected pairs of holds. Without sectors
+    these are all the pairs at most max_reach apart, whose number grows with
+    the square of the reach. With sectors, the directions above every hold
+    are split into that many sectors, and in each one only the moves that
+    no other move dominates (a shorter one ending no higher) are kept, a
+    few per sector. Any route over all the moves then has a counterpart
+    over the kept ones at most 1 / (1 - 2 sin(pi / (2 sectors))) times
+    longer (1.24 for 16 sectors, and a few thousandths on average on the
+    example walls), and the same goes for any smaller reach.
+    Args:
+        centroids (numpy.ndarray): (N, 2) array of (cx, cy) hold centroids.
+        max_reach (float): Maximum distance of a single move, in pixels.
+        index (HoldIndex, optional): Spatial index over the same centroids.
+        sectors (int, optional): Number of direction sectors; None keeps every move.
+    Returns:
+        tuple: (first, second, distance) arrays, one entry per pair with first < second.
+    """
+    centroids = np.asarray(centroids, dtype=np.float64).reshape(-1, 2)
+    if index is None:
+        index = HoldIndex(centroids)
+    if sectors is None:
+        return index.pairs_within(max_reach)
+    return _undirected(len(centroids), *_sector_moves(centroids, index, max_reach, sectors, np.arange(len(centroids))))
+
+def _undirected(count, source, target, distance):
+    # Each move once, as a pair first < second
+    first, second = np.minimum(source, target), np.maximum(source, target)
+    _, unique = np.unique(first * count + second, return_index=True)
+    return first[unique], second[unique], distance[unique]
+
+def _csr_edges(count, first, second, distance):
+    """
+    CSR arrays (indptr, indices, weights) of the undirected edges first[i] - second[i].
+    """
+    source = np.concatenate([first, second])
+    order = np.argsort(source, kind="stable")
+    indices = np.concatenate([second, first])[order]
+    weights = np.concatenate([distance, distance])[order]
+    indptr = np.zeros(count + 1, dtype=np.intp)
+    np.cumsum(np.bincount(source, minlength=count), out=indptr[1:])
+    return indptr, indices, weights
+
+def _csr_neighbors(indptr, indices, weights):
+    return lambda current: (indices[indptr[current]:indptr[current + 1]],
+                            weights[indptr[current]:indptr[current + 1]])
+
+def shortest_route(centroids, start_indices, goal_index, max_reach=None, index=None, trace=None):
+    """
+    Finds the shortest route between holds with a multi-source A* search.
+    A move goes from a hold to any hold at the same or a higher altitude
+    (lower or equal y) whose centroid is at most max_reach away, and costs
+    the distance between the centroids. Every start hold is a source of
+    the same search, and the straight-line distance to the goal is used as
+    heuristic: it never overestimates the remaining cost, so the first
+    time the goal is taken from the queue its route is the shortest one.
+    Args:
+        centroids (numpy.ndarray): (N, 2) array of (cx, cy) hold centroids.
+        start_indices (list): Indices of the start holds.
+        goal_index (int): Index of the goal hold.
+        max_reach (float, optional): Maximum distance of a single move, in pixels.
+                                     None or 0 means no limit.
+        index (HoldIndex, optional): Spatial index over the same centroids.
+        trace (SearchTrace, optional): Records the search events (see utils.tracing).
+    Returns:
+        tuple: (list of hold indices from a start hold to the goal, route length),
+               or (None, inf) if the goal cannot be reached.
+    """
+    centroids = np.asarray(centroids, dtype=np.float64).reshape(-1, 2)
+    neighbors = _index_neighbors(centroids, max_reach, index)
+    return _a_star(centroids, {start: 0.0 for start in start_indices}, goal_index, neighbors, trace=trace)
+
+def k_shortest_routes(centroids, start_indices, goal_index, k, max_reach=None, index=None, trace=None,
+                      sectors=REACH_SECTORS):
+    """
+    Finds the k shortest loopless routes between holds (Yen's algorithm),
+    under the same move rules as shortest_route. The first route is the
+    shortest one; the others are the next best alternatives, each
+    differing from the previous ones in at least one hold. With a reach
+    limit the routes run over the moves kept by reach_moves.
+    Args:
+        centroids (numpy.ndarray): (N, 2) array of (cx, cy) hold centroids.
+        start_indices (list): Indices of the start holds.
+        goal_index (int): Index of the goal hold.
+        k (int): Maximum number of routes.
+        max_reach (float, optional): Maximum distance of a single move, in pixels.
+                                     None or 0 means no limit.
+        index (HoldIndex, optional): Spatial index over the same centroids.
+        trace (SearchTrace, optional): Records the search events (see utils.tracing).
+        sectors (int, optional): Direction sectors of the moves (see reach_moves);
+                                 None keeps every move.
+    Returns:
+        list: Up to k (list of hold indices, route length) tuples, shortest first.
+    """
+    centroids = np.asarray(centroids, dtype=np.float64).reshape(-1, 2)
+    if max_reach:
+        # Every hold is expanded by the reverse search: build the edges in one go
+        if index is None:
+            index = HoldIndex(centroids)
+        edges = _csr_edges(len(centroids), *reach_moves(centroids, max_reach, index, sectors))
+        neighbors = _csr_neighbors(*edges)
+    else:
+        neighbors = _index_neighbors(centroids, max_reach, index)
+    return _k_shortest(centroids, start_indices, goal_index, k, neighbors, trace)
+
+def routes_for_reaches(centroids, start_indices, goal_index, reaches, index=None, trace=None,
+                       sectors=REACH_SECTORS):
+    """
+    Finds the shortest route between holds for several maximum reaches at
+    once (e.g. shorter and taller climbers), under the same move rules as
+    shortest_route. The moves are built once, for the largest reach (see
+    reach_moves), and the searches share one tree of distances to the goal.
+    Args:
+        centroids (numpy.ndarray): (N, 2) array of (cx, cy) hold centroids.
+        start_indices (list): Indices of the start holds.
+        goal_index (int): Index of the goal hold.
+        reaches (list): Maximum distances of a single move, in pixels (all positive).
+        index (HoldIndex, optional): Spatial index over the same centroids.
+        trace (SearchTrace, optional): Records the search events (see utils.tracing).
+        sectors (int, optional): Direction sectors of the moves (see reach_moves);
+                                 None keeps every move.
+    Returns:
+        list: One (list of hold indices, route length) tuple per reach, in the
+              order of reaches, with (None, inf) where the goal cannot be reached.
+    """
+    if not reaches:
+        return []
+    if min(reaches) <= 0:
+        raise ValueError("Os alcances das rotas precisam ser positivos.")
+    centroids = np.asarray(centroids, dtype=np.float64).reshape(-1, 2)
+    if index is None:
+        index = HoldIndex(centroids)
+    neighbors = _csr_neighbors(*_csr_edges(len(centroids), *reach_moves(centroids, max(reaches), index, sectors)))
+    return _routes_for_reaches(centroids, start_indices, goal_index, reaches, neighbors, trace)
+
+def _hold_keys(holds):
+    # Unchanged holds keep the same pixels, hence the same centroid and area
+    return [(cx, cy, area) for (cx, cy), area in zip(np.round(holds.centroid, 3).tolist(), holds.area.tolist())]
+
+class ReachGraph:
+    """
+    Sparse reachability graph of a set of holds: undirected edges join the
+    holds whose centroids are at most max_reach apart (only the moves kept
+    by reach_moves, unless sectors is None), stored in CSR arrays (indptr,
+    indices, weights) so route queries only run the search. When the holds
+    change (new segmentation, morphology tweak), update_from matches the
+    new holds to the graph nodes by centroid and area: removed holds are
+    switched off and their neighbours get back the moves they dominated,
+    new (or merged) holds get edges to every hold within reach, both in a
+    small overlay, and the CSR arrays are rebuilt from the existing edges
+    once the changes pile up.
+    Graph nodes are not hold indices after an update: use route, which
+    takes and returns hold indices of the current table.
+    Queries may ask for a smaller reach than the graph's: the longer edges
+    are skipped, so one graph built for the largest reach answers them all.
+    """
+
+    def __init__(self, holds, max_reach, sectors=REACH_SECTORS):
+        """
+        Args:
+            holds (HoldTable): The detected holds.
+            max_reach (float): Maximum distance of a single move, in pixels.
+            sectors (int, optional): Direction sectors of the moves (see reach_moves);
+                                     None keeps every move.
+        """
+        if not max_reach or max_reach <= 0:
+            raise ValueError("O grafo de alcance precisa de um alcance máximo positivo.")
+        self.max_reach = float(max_reach)
+        self.sectors = sectors
+        self.table = holds
+        self._set_nodes(holds.centroid, holds.area)
+        self._build_edges()
+
+    def _set_nodes(self, centroid, area):
+        self.centroid = np.array(centroid, dtype=np.float64).reshape(-1, 2)
+        self.area = np.array(area, dtype=np.int64)
+        count = len(self.area)
+        self.alive = np.ones(count, dtype=bool)
+        self.node_of = np.arange(count) # hold index -> node
+        self.hold_of = np.arange(count) # node -> hold index (-1 if removed)
+        self._keys = _hold_keys(self.table)
+
+    def _build_edges(self):
+        self._set_edges(*reach_moves(self.table.centroid, self.max_reach, self.table.spatial_index, self.sectors))
+
+    def _set_edges(self, first, second, distance):
+        self.indptr, self.indices, self.weights = _csr_edges(len(self.area), first, second, distance)
+        self._overlay = {} # node -> [neighbor arrays, weight arrays] added since the build
+        self._changes = 0
+
+    @property
+    def num_edges(self):
+        overlay = sum(len(n) for parts in self._overlay.values() for n in parts[0])
+        return (len(self.indices) + overlay) // 2
+
+    @property
+    def nbytes(self):
+        arrays = (self.centroid, self.area, self.alive, self.node_of, self.hold_of,
+                  self.indices, self.weights, self.indptr)
+        overlay = sum(a.nbytes for parts in self._overlay.values() for chunk in parts for a in chunk)
+        return sum(a.nbytes for a in arrays) + overlay
+
+    def neighbors(self, node):
+        """
+        Returns the live neighbours of a node and the distance to each of them.
+        """
+        if node < len(self.indptr) - 1:
+            start, end = self.indptr[node], self.indptr[node + 1]
+            nodes, weights = self.indices[start:end], self.weights[start:end]
+        else:
+            nodes, weights = self.indices[:0], self.weights[:0]
+        extra = self._overlay.get(node)
+        if extra:
+            nodes = np.concatenate([nodes] + extra[0])
+            weights = np.concatenate([weights] + extra[1])
+        keep = self.alive[nodes]
+        return nodes[keep], weights[keep]
+
+    def _link(self, node, others, distance):
+        parts = self._overlay.setdefault(node, [[], []])
+        parts[0].append(others)
+        parts[1].append(distance)
+
+    def _add_nodes(self, centroid, area):
+        first = len(self.area)
+        self.centroid = np.concatenate([self.centroid, centroid])
+        self.area = np.concatenate([self.area, area])
+        self.alive = np.concatenate([self.alive, np.ones(len(area), dtype=bool)])
+        self.hold_of = np.concatenate([self.hold_of, np.full(len(area), -1)])
+        index = HoldIndex(self.centroid)
+        for node in range(first, len(self.area)):
+            others = index.within(self.centroid[node], self.max_reach)
+            # Edges between two new nodes are linked from the later one
+            others = others[self.alive[others] & (others < node)]
+            distance = np.hypot(*(self.centroid[others] - self.centroid[node]).T)
+            self._link(node, others, distance)
+            for other, other_distance in zip(others.tolist(), distance.tolist()):
+                self._link(other, np.array([node]), np.array([other_distance]))
+        return np.arange(first, len(self.area))
+
+    def _remove_nodes(self, nodes):
+        nodes = np.asarray(nodes, dtype=np.intp)
+        neighbors = [self.neighbors(node)[0] for node in nodes.tolist()]
+        self.alive[nodes] = False
+        self.hold_of[nodes] = -1
+        for node in nodes.tolist():
+            self._overlay.pop(node, None)
+        if self.sectors is not None and neighbors:
+            # A removed hold may have dominated moves of its neighbours (see reach_moves)
+            neighbors = np.unique(np.concatenate(neighbors))
+            self._relink(neighbors[self.alive[neighbors]])
+
+    def _relink(self, nodes):
+        """
+        Links the moves kept by reach_moves out of the given live nodes,
+        among the live nodes, that the graph does not have yet.
+        """
+        live = np.flatnonzero(self.alive)
+        position = np.full(len(self.alive), -1)
+        position[live] = np.arange(len(live))
+        centroid = self.centroid[live]
+        moves = _sector_moves(centroid, HoldIndex(centroid), self.max_reach, self.sectors, position[nodes])
+        first, second, distance = _undirected(len(live), *moves)
+        first, second = live[first], live[second]
+        count = len(self.alive)
+        existing = [node * count + self.neighbors(node)[0] for node in np.unique(first).tolist()]
+        missing = ~np.isin(first * count + second, np.concatenate(existing)) if existing else []
+        for node, other, other_distance in zip(first[missing].tolist(), second[missing].tolist(),
+                                               distance[missing].tolist()):
+            self._link(node, np.array([other]), np.array([other_distance]))
+            self._link(other, np.array([node]), np.array([other_distance]))
+
+    def update_from(self, holds):
+        """
+        Brings the graph up to date with a new set of holds, reusing the
+        nodes and edges of the holds that did not change.
+        Args:
+            holds (HoldTable): The new detected holds.
+        Returns:
+            ReachGraph: self.
+        """
+        if holds is self.table:
+            return self
+        free = {}
+        for node in np.flatnonzero(self.alive).tolist():
+            free.setdefault(self._keys[node], []).append(node)
+        new_keys = _hold_keys(holds)
+        node_of = np.full(len(holds), -1)
+        for index, key in enumerate(new_keys):
+            matches = free.get(key)
+            if matches:
+                node_of[index] = matches.pop()
+        removed = [node for nodes in free.values() for node in nodes]
+        added = np.flatnonzero(node_of < 0)
+
+        if len(added) > COMPACT_FRACTION * len(holds):
+            # Mostly new holds: building from scratch is cheaper than the overlay
+            self.table = holds
+            self._set_nodes(holds.centroid, holds.area)
+            self._build_edges()
+            return self
+
+        self.table = holds
+        self._changes += len(removed) + len(added)
+        self._remove_nodes(removed)
+        node_of[added] = self._add_nodes(holds.centroid[added], holds.area[added])
+        self._keys += [new_keys[index] for index in added.tolist()]
+        self.node_of = node_of
+        self.hold_of[node_of] = np.arange(len(holds))
+        if self._changes > COMPACT_FRACTION * max(len(holds), 1):
+            self.compact()
+        return self
+
+    def compact(self):
+        """
+        Rebuilds the CSR arrays from the current edges (base plus overlay,
+        without removed holds), numbering the nodes as the holds of the table.
+        """
+        source = np.repeat(np.arange(len(self.indptr) - 1), np.diff(self.indptr))
+        sources, targets, weights = [source], [self.indices], [self.weights]
+        for node, (nodes, distances) in self._overlay.items():
+            for chunk, chunk_distance in zip(nodes, distances):
+                sources.append(np.full(len(chunk), node))
+                targets.append(chunk)
+                weights.append(chunk_distance)
+        source, target, weight = np.concatenate(sources), np.concatenate(targets), np.concatenate(weights)
+        keep = self.alive[source] & self.alive[target] & (source < target)
+        first, second = self.hold_of[source[keep]], self.hold_of[target[keep]]
+
+        self._set_nodes(self.table.centroid, self.table.area)
+        self._set_edges(np.minimum(first, second), np.maximum(first, second), weight[keep])
+
+    def _neighbors_within(self, max_reach):
+        if max_reach is None or max_reach >= self.max_reach:
+            if max_reach is not None and max_reach > self.max_reach:
+                raise ValueError("O alcance pedido é maior que o do grafo de alcance.")
+            return self.neighbors
+        return _within(self.neighbors, max_reach)
+
+    def _path_holds(self, path):
+        return None if path is None else [int(self.hold_of[node]) for node in path]
+
+    def route(self, start_indices, goal_index, trace=None, max_reach=None):
+        """
+        Shortest route between holds of the current table (see shortest_route).
+        Args:
+            start_indices (list): Hold indices of the start holds.
+            goal_index (int): Hold index of the goal hold.
+            trace (SearchTrace, optional): Records the search events (holds are graph nodes).
+            max_reach (float, optional): Reach of the query, at most the graph's (the default).
+        Returns:
+            tuple: (list of hold indices from a start hold to the goal, route length),
+                   or (None, inf) if the goal cannot be reached.
+        """
+        starts = {int(self.node_of[index]): 0.0 for index in start_indices}
+        path, length = _a_star(self.centroid, starts, int(self.node_of[goal_index]),
+                               self._neighbors_within(max_reach), trace=trace)
+        return self._path_holds(path), length
+
+    def routes(self, start_indices, goal_index, k, trace=None, max_reach=None):
+        """
+        The k shortest loopless routes between holds of the current table
+        (see k_shortest_routes).
+        Args:
+            start_indices (list): Hold indices of the start holds.
+            goal_index (int): Hold index of the goal hold.
+            k (int): Maximum number of routes.
+            trace (SearchTrace, optional): Records the search events (holds are graph nodes).
+            max_reach (float, optional): Reach of the query, at most the graph's (the default).
+        Returns:
+            list: Up to k (list of hold indices, route length) tuples, shortest first.
+        """
+        starts = [int(self.node_of[index]) for index in start_indices]
+        routes = _k_shortest(self.centroid, starts, int(self.node_of[goal_index]), k,
+                             self._neighbors_within(max_reach), trace)
+        return [(self._path_holds(path), length) for path, length in routes]
+
+    def routes_for_reaches(self, start_indices, goal_index, reaches, trace=None):
+        """
+        Shortest route between holds of the current table for several
+        reaches, all at most the graph's (see routes_for_reaches).
+        Returns:
+            list: One (list of hold indices, route length) tuple per reach,
+                  with (None, inf) where the goal cannot be reached.
+        """
+        if not reaches:
+            return []
+        if max(reaches) > self.max_reach:
+            raise ValueError("O alcance pedido é maior que o do grafo de alcance.")
+        starts = [int(self.node_of[index]) for index in start_indices]
+        routes = _routes_for_reaches(self.centroid, starts, int(self.node_of[goal_index]), reaches,
+                                     self._neighbors_within(max(reaches)), trace)
+        return [(self._path_holds(path), length) for path, length in routes]
+
+def reach_graph_for(holds, max_reach, graph=None):
+    """
+    Returns a ReachGraph for the holds, updating a previous graph when it
+    has the same reach and building a new one otherwise.
+    Args:
+        holds (HoldTable): The detected holds.
+        max_reach (float): Maximum distance of a single move, in pixels.
+        graph (ReachGraph, optional): Graph cached from a previous query.
+    Returns:
+        ReachGraph: Graph of the holds.
+    """
+    if graph is None or graph.max_reach != float(max_reach):
+        return ReachGraph(holds, max_reach)
+    return graph.update_from(holds)
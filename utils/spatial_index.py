@@ -0,0 +1,198 @@
+import numpy as np
+
+# Average number of holds per grid cell when the cell size is chosen automatically
+HOLDS_PER_CELL = 2.0
+
+class HoldIndex:
+    """
+    Uniform-grid spatial index over hold centroids.
+    The holds are bucketed by grid cell and stored sorted by cell (CSR-style
+    cell_start offsets), so nearest-hold and radius queries only visit the
+    cells around the query point instead of scanning every hold.
+    """
+
+    def __init__(self, centroids, cell_size=None):
+        """
+        Args:
+            centroids (numpy.ndarray): (N, 2) array of (cx, cy) hold centroids.
+            cell_size (float, optional): Side of a grid cell in pixels. By
+                                         default it is chosen so that a cell
+                                         holds about HOLDS_PER_CELL holds.
+        """
+        self.centroids = np.asarray(centroids, dtype=np.float64).reshape(-1, 2)
+        count = len(self.centroids)
+        if count:
+            self.origin = self.centroids.min(axis=0)
+            extent = np.maximum(self.centroids.max(axis=0) - self.origin, 1.0)
+        else:
+            self.origin = np.zeros(2)
+            extent = np.ones(2)
+        if cell_size is None:
+            cell_size = np.sqrt(extent[0] * extent[1] * HOLDS_PER_CELL / max(count, 1))
+        self.cell_size = max(float(cell_size), 1e-6)
+
+        cells = self._cell_of(self.centroids)
+        # Taken from the cells themselves: extent // cell_size may round one
+        # below the division of _cell_of, leaving the last holds off the grid
+        self.shape = (int(cells[:, 1].max()) + 1, int(cells[:, 0].max()) + 1) if count else (1, 1)
+        cell_ids = cells[:, 1] * self.shape[1] + cells[:, 0]
+        self.order = np.argsort(cell_ids, kind="stable")
+        self.cell_start = np.searchsorted(
+            cell_ids[self.order], np.arange(self.shape[0] * self.shape[1] + 1)
+        )
+
+    def __len__(self):
+        return len(self.centroids)
+
+    def _cell_of(self, points):
+        return np.floor((np.asarray(points, dtype=np.float64) - self.origin) / self.cell_size).astype(np.int64)
+
+    def _holds_in_rows(self, row_range, col_range):
+        rows, cols = self.shape
+        col0, col1 = max(col_range[0], 0), min(col_range[1], cols - 1)
+        if col0 > col1:
+            return []
+        chunks = []
+        for row in range(max(row_range[0], 0), min(row_range[1], rows - 1) + 1):
+            start = self.cell_start[row * cols + col0]
+            end = self.cell_start[row * cols + col1 + 1]
+            if end > start:
+                chunks.append(self.order[start:end])
+        return chunks
+
+    def _ring(self, center, ring):
+        """
+        Holds in the cells at Chebyshev distance `ring` from the center cell.
+        """
+        cx, cy = center
+        if ring == 0:
+            return self._holds_in_rows((cy, cy), (cx, cx))
+        chunks = self._holds_in_rows((cy - ring, cy - ring), (cx - ring, cx + ring))
+        chunks += self._holds_in_rows((cy + ring, cy + ring), (cx - ring, cx + ring))
+        for col in (cx - ring, cx + ring):
+            chunks += self._holds_in_rows((cy - ring + 1, cy + ring - 1), (col, col))
+        return chunks
+
+    def nearest(self, point, max_y=None, exclude=None):
+        """
+        Finds the hold whose centroid is closest to a point.
+        Args:
+            point (tuple): (x, y) query point.
+            max_y (float, optional): Only consider holds with cy <= max_y
+                                     (at the same height or higher on the wall).
+            exclude (set, optional): Hold indices to skip.
+        Returns:
+            int: Index of the closest hold (lowest index on ties), or -1 if none.
+        """
+        if not len(self):
+            return -1
+        point = np.asarray(point, dtype=np.float64)
+        cx, cy = self._cell_of(point)
+        rows, cols = self.shape
+        max_ring = max(abs(cx), abs(cols - 1 - cx), abs(cy), abs(rows - 1 - cy))
+
+        best_dist, best_idx = np.inf, -1
+        for ring in range(max_ring + 1):
+            chunks = self._ring((cx, cy), ring)
+            if chunks:
+                candidates = np.concatenate(chunks)
+                if max_y is not None:
+                    candidates = candidates[self.centroids[candidates, 1] <= max_y]
+                if exclude:
+                    candidates = candidates[[c not in exclude for c in candidates.tolist()]]
+                if len(candidates):
+                    dists = np.hypot(*(self.centroids[candidates] - point).T)
+                    for dist, idx in zip(dists.tolist(), candidates.tolist()):
+                        if dist < best_dist or (dist == best_dist and idx < best_idx):
+                            best_dist, best_idx = dist, idx
+            # Holds in farther rings are at least `ring` cells away
+            if best_idx >= 0 and best_dist <= ring * self.cell_size:
+                break
+        return best_idx
+
+    def within(self, point, radius, max_y=None):
+        """
+        Finds every hold whose centroid lies within a radius of a point.
+        Args:
+            point (tuple): (x, y) query point.
+            radius (float): Search radius in pixels.
+            max_y (float, optional): Only consider holds with cy <= max_y.
+        Returns:
+            numpy.ndarray: Sorted indices of the matching holds.
+        """
+        point = np.asarray(point, dtype=np.float64)
+        top = point[1] - radius
+        bottom = point[1] + radius if max_y is None else min(point[1] + radius, max_y)
+        (col0, row0), (col1, row1) = self._cell_of([(point[0] - radius, top), (point[0] + radius, bottom)])
+        chunks = self._holds_in_rows((row0, row1), (col0, col1))
+        if not chunks:
+            return np.empty(0, dtype=np.intp)
+        candidates = np.concatenate(chunks)
+        offsets = self.centroids[candidates] - point
+        keep = offsets[:, 0] ** 2 + offsets[:, 1] ** 2 <= radius ** 2
+        if max_y is not None:
+            keep &= self.centroids[candidates, 1] <= max_y
+        return np.sort(candidates[keep])
+
+    def in_boxes(self, boxes):
+        """
+        Finds the holds inside several axis-aligned boxes in one go: each box
+        visits only the cells it overlaps.
+        Args:
+            boxes (numpy.ndarray): (M, 4) array of (x0, y0, x1, y1) boxes, edges included.
+        Returns:
+            tuple: (box, hold) index arrays, one entry per hold inside a box.
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        rows, cols = self.shape
+        low, high = self._cell_of(boxes[:, :2]), self._cell_of(boxes[:, 2:])
+        col0, col1 = np.maximum(low[:, 0], 0), np.minimum(high[:, 0], cols - 1)
+        row0, row1 = np.maximum(low[:, 1], 0), np.minimum(high[:, 1], rows - 1)
+        box = np.flatnonzero((col0 <= col1) & (row0 <= row1))
+        # One run of consecutive cells per box row, then one entry per hold of the run
+        count = row1[box] - row0[box] + 1
+        box = np.repeat(box, count)
+        row = row0[box] + np.arange(len(box)) - np.repeat(np.cumsum(count) - count, count)
+        start = self.cell_start[row * cols + col0[box]]
+        count = self.cell_start[row * cols + col1[box] + 1] - start
+        box = np.repeat(box, count)
+        offsets = np.arange(len(box)) - np.repeat(np.cumsum(count) - count, count)
+        hold = self.order[np.repeat(start, count) + offsets]
+        point = self.centroids[hold]
+        inside = ((point[:, 0] >= boxes[box, 0]) & (point[:, 0] <= boxes[box, 2]) &
+                  (point[:, 1] >= boxes[box, 1]) & (point[:, 1] <= boxes[box, 3]))
+        return box[inside], hold[inside]
+
+    def pairs_within(self, radius):
+        """
+        Finds every pair of holds whose centroids are at most a radius apart.
+        The holds are bucketed in cells at least radius wide, so only the
+        holds of a cell and of its neighbouring cells are compared.
+        Args:
+            radius (float): Maximum distance in pixels.
+        Returns:
+            tuple: (first, second, distance) arrays, one entry per pair with first < second.
+        """
+        grid = self if self.cell_size >= radius else HoldIndex(self.centroids, cell_size=radius)
+        cells = grid._cell_of(grid.centroids)
+        rows, cols = grid.shape
+        first, second = [], []
+        # Half of the 3x3 neighbourhood, so every pair of cells is visited once
+        for dx, dy in ((0, 0), (1, 0), (-1, 1), (0, 1), (1, 1)):
+            col, row = cells[:, 0] + dx, cells[:, 1] + dy
+            holds = np.flatnonzero((col >= 0) & (col < cols) & (row < rows))
+            cell = row[holds] * cols + col[holds]
+            start = grid.cell_start[cell]
+            count = grid.cell_start[cell + 1] - start
+            owner = np.repeat(holds, count)
+            offsets = np.arange(len(owner)) - np.repeat(np.cumsum(count) - count, count)
+            other = grid.order[np.repeat(start, count) + offsets]
+            if dx == dy == 0:
+                keep = owner < other
+                owner, other = owner[keep], other[keep]
+            first.append(np.minimum(owner, other))
+            second.append(np.maximum(owner, other))
+        first, second = np.concatenate(first), np.concatenate(second)
+        distance = np.hypot(*(self.centroids[first] - self.centroids[second]).T)
+        keep = distance <= radius
+        return first[keep], second[keep], distance[keep]
@@ -0,0 +1,279 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.hold_table import HoldTable
+from utils.image_processing import (
+    DEFAULT_LABELING_ENGINE,
+    apply_morphology,
+    hsv_mask,
+    label_components,
+)
+
+# Default working-memory budget for the tiled pipeline (bytes)
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+# Approximate working bytes per tile pixel: HSV copy (3), mask and morphology
+# temporaries (3), labeler input (1), local labels (4) plus OpenCV's own buffers
+BYTES_PER_TILE_PIXEL = 16
+
+# Rows scanned at a time when locating the first pixel of each label
+FIRST_PIXEL_CHUNK_ROWS = 64
+
+# Tiles thinner than this fall back from full-width bands to square tiles
+MIN_BAND_HEIGHT = 64
+
+def _tile_shape(height, width, halo, memory_budget):
+    """
+    Picks the largest tile (core size, without halo) whose working set fits
+    the memory budget. Full-width bands are preferred since they only have
+    horizontal seams; very wide images fall back to square tiles.
+    """
+    max_pixels = memory_budget // BYTES_PER_TILE_PIXEL
+    band_height = max_pixels // (width + 2 * halo) - 2 * halo
+    if band_height >= min(MIN_BAND_HEIGHT, height):
+        return min(band_height, height), width
+
+    side = int(np.sqrt(max_pixels)) - 2 * halo
+    if side < 1:
+        raise ValueError(
+            f"Orçamento de memória muito pequeno ({memory_budget} bytes) "
+            f"para uma borda de {halo} pixels."
+        )
+    return min(side, height), min(side, width)
+
+def _tile_grid(height, width, tile_height, tile_width):
+    """
+    Yields the (y0, y1, x0, x1) core box of every tile in raster order.
+    """
+    for y0 in range(0, height, tile_height):
+        for x0 in range(0, width, tile_width):
+            yield y0, min(y0 + tile_height, height), x0, min(x0 + tile_width, width)
+
+def _first_pixels(labels):
+    """
+    Returns the flat index of the first pixel of every label, in label order.
+    Labels are numbered in raster order of their first pixel, so the running
+    maximum of the flattened label image steps up exactly at those pixels.
+    It is evaluated a few rows at a time to keep the temporaries small.
+    """
+    height, width = labels.shape
+    firsts = []
+    carry = 0
+    for y in range(0, height, FIRST_PIXEL_CHUNK_ROWS):
+        running_max = np.maximum.accumulate(labels[y:y + FIRST_PIXEL_CHUNK_ROWS].ravel())
+        np.maximum(running_max, carry, out=running_max)
+        steps = np.flatnonzero(running_max[1:] != running_max[:-1]) + 1
+        if running_max[0] != carry:
+            steps = np.concatenate(([0], steps))
+        firsts.append(steps + y * width)
+        carry = running_max[-1]
+    return np.concatenate(firsts) if firsts else np.empty(0, dtype=np.int64)
+
+def _segment_tile(image_np_rgb, labels_out, box, halo, base_hsv_color, tolerances,
+                  erosion_iterations, dilation_iterations, connectivity, engine):
+    """
+    Filters, cleans and labels one tile. The tile is read with a halo of
+    erosion + dilation pixels so the morphology of its core is exact; only
+    the core is labeled, and its local labels are written to labels_out.
+    Tiles never overlap in labels_out, so several can run concurrently.
+    Returns:
+        tuple: Per-component arrays in image coordinates: area, min_x, min_y,
+               max_x, max_y, sum_x, sum_y, first_index.
+    """
+    height, width = image_np_rgb.shape[:2]
+    y0, y1, x0, x1 = box
+    hy0, hy1 = max(0, y0 - halo), min(height, y1 + halo)
+    hx0, hx1 = max(0, x0 - halo), min(width, x1 + halo)
+
+    mask = hsv_mask(image_np_rgb[hy0:hy1, hx0:hx1], base_hsv_color, *tolerances)
+    mask = apply_morphology(mask, erosion_iterations, dilation_iterations)
+    core = mask[y0 - hy0:y1 - hy0, x0 - hx0:x1 - hx0]
+    labels, stats, centroids = label_components(core, connectivity, engine)
+
+    area = stats[:, 4].astype(np.int64)
+    min_x = stats[:, 0].astype(np.int64) + x0
+    min_y = stats[:, 1].astype(np.int64) + y0
+    max_x = min_x + stats[:, 2] - 1
+    max_y = min_y + stats[:, 3] - 1
+    # Recover the exact integer coordinate sums from the mean centroids
+    sum_x = np.rint(centroids[:, 0] * area).astype(np.int64) + x0 * area
+    sum_y = np.rint(centroids[:, 1] * area).astype(np.int64) + y0 * area
+
+    first_y, first_x = np.divmod(_first_pixels(labels), x1 - x0)
+    first_index = (first_y + y0) * width + (first_x + x0)
+
+    labels_out[y0:y1, x0:x1] = labels
+    return area, min_x, min_y, max_x, max_y, sum_x, sum_y, first_index
+
+def _offset_tile(labels_out, box, offset):
+    """
+    Moves the local labels of one tile into its range of provisional labels.
+    """
+    y0, y1, x0, x1 = box
+    tile = labels_out[y0:y1, x0:x1]
+    np.add(tile, offset, out=tile, where=tile > 0)
+
+def _seam_pairs(labels, boxes, connectivity):
+    """
+    Collects the pairs of provisional labels that touch across tile seams.
+    """
+    height, width = labels.shape
+    rows = sorted({y0 for y0, _, _, _ in boxes if y0 > 0})
+    cols = sorted({x0 for _, _, x0, _ in boxes if x0 > 0})
+
+    pairs = []
+    def add(a, b):
+        touching = (a > 0) & (b > 0)
+        if touching.any():
+            pairs.append(np.stack([a[touching], b[touching]], axis=1))
+
+    for y in rows:
+        above, below = labels[y - 1], labels[y]
+        add(above, below)
+        if connectivity == 8:
+            add(above[:-1], below[1:])
+            add(above[1:], below[:-1])
+    for x in cols:
+        left, right = labels[:, x - 1], labels[:, x]
+        add(left, right)
+        if connectivity == 8:
+            add(left[:-1], right[1:])
+            add(left[1:], right[:-1])
+
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int32)
+    return np.unique(np.concatenate(pairs), axis=0)
+
+def _resolve_roots(num_labels, pairs):
+    """
+    Union-find over the provisional labels joined by the seam pairs.
+    Returns the root of every provisional label (index 0 is the background).
+    """
+    parent = np.arange(num_labels + 1)
+
+    def find(a):
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    for a, b in pairs.tolist():
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    # Flatten the remaining chains with vectorized pointer jumping
+    while True:
+        grandparent = parent[parent]
+        if np.array_equal(grandparent, parent):
+            return parent
+        parent = grandparent
+
+def _merge_tiles(labels, boxes, tile_stats, connectivity, memory_budget):
+    """
+    Merges components across tile seams, renumbers them in raster order of
+    their first pixel (as the untiled labeler does) and rewrites the label
+    image in place, a bounded number of rows at a time.
+    """
+    height, width = labels.shape
+    columns = [np.concatenate(column) for column in zip(*tile_stats)]
+    area, min_x, min_y, max_x, max_y, sum_x, sum_y, first_index = columns
+    num_labels = len(area)
+
+    roots = _resolve_roots(num_labels, _seam_pairs(labels, boxes, connectivity))[1:] - 1
+
+    # Order the merged components by the first pixel of any of their pieces
+    root_first = np.full(num_labels, np.iinfo(np.int64).max)
+    np.minimum.at(root_first, roots, first_index)
+    unique_roots = np.unique(roots)
+    ordered_roots = unique_roots[np.argsort(root_first[unique_roots], kind="stable")]
+    final_of_root = np.zeros(num_labels, dtype=np.int32)
+    final_of_root[ordered_roots] = np.arange(len(ordered_roots), dtype=np.int32)
+    final = final_of_root[roots]
+
+    count = len(ordered_roots)
+    merged_area = np.bincount(final, weights=area, minlength=count).astype(np.int64)
+    merged_sum_x = np.zeros(count, dtype=np.int64)
+    merged_sum_y = np.zeros(count, dtype=np.int64)
+    np.add.at(merged_sum_x, final, sum_x)
+    np.add.at(merged_sum_y, final, sum_y)
+    merged_min_x = np.full(count, width, dtype=np.int64)
+    merged_min_y = np.full(count, height, dtype=np.int64)
+    merged_max_x = np.zeros(count, dtype=np.int64)
+    merged_max_y = np.zeros(count, dtype=np.int64)
+    np.minimum.at(merged_min_x, final, min_x)
+    np.minimum.at(merged_min_y, final, min_y)
+    np.maximum.at(merged_max_x, final, max_x)
+    np.maximum.at(merged_max_y, final, max_y)
+
+    # Provisional label -> final label lookup table
+    lut = np.zeros(num_labels + 1, dtype=np.int32)
+    lut[1:] = final + 1
+    rows_per_chunk = max(1, memory_budget // (BYTES_PER_TILE_PIXEL * width))
+    for y in range(0, height, rows_per_chunk):
+        chunk = labels[y:y + rows_per_chunk]
+        chunk[...] = lut[chunk]
+
+    bbox = np.stack([
+        merged_min_x,
+        merged_min_y,
+        merged_max_x - merged_min_x + 1,
+        merged_max_y - merged_min_y + 1,
+    ], axis=1)
+    centroid = np.stack([merged_sum_x / merged_area, merged_sum_y / merged_area], axis=1)
+    return HoldTable(labels, merged_area, bbox, centroid)
+
+def segment_image_tiled(image_np_rgb, base_hsv_color, tol_h, tol_s, tol_v,
+                        erosion_iterations=0, dilation_iterations=0,
+                        connectivity=4, engine=DEFAULT_LABELING_ENGINE,
+                        memory_budget=DEFAULT_MEMORY_BUDGET, workers=1):
+    """
+    Runs the segmentation pipeline (HSV filter, morphology and labeling) tile
+    by tile, so the working memory is bounded by memory_budget instead of
+    being several full-size copies of the image. Components crossing tile
+    seams are merged afterwards; the result matches segment_image exactly.
+    With workers > 1 the crop is split into at least that many bands, which
+    are processed concurrently by a thread pool (OpenCV and NumPy release the
+    GIL, and threads can share the output label image without copies).
+    Args:
+        image_np_rgb (numpy.ndarray): Input image as a NumPy array in RGB format.
+        base_hsv_color (tuple): The base color (H, S, V) to filter around (OpenCV range).
+        tol_h (int): Hue tolerance.
+        tol_s (int): Saturation tolerance.
+        tol_v (int): Value tolerance.
+        erosion_iterations (int): Number of erosion passes.
+        dilation_iterations (int): Number of dilation passes.
+        connectivity (int): 4 or 8 pixel connectivity.
+        engine (str): Name of the labeling engine (see LABELING_ENGINES).
+        memory_budget (int): Working memory budget in bytes. The output label
+                             image (4 bytes per pixel) is not part of it.
+                             It is shared by all workers.
+        workers (int): Number of tiles processed concurrently.
+    Returns:
+        HoldTable: The detected holds.
+    """
+    height, width = image_np_rgb.shape[:2]
+    halo = erosion_iterations + dilation_iterations
+    workers = max(1, int(workers))
+    tile_height, tile_width = _tile_shape(height, width, halo, memory_budget // workers)
+    if workers > 1:
+        # Make sure every worker gets at least one band
+        tile_height = min(tile_height, -(-height // workers))
+    boxes = list(_tile_grid(height, width, tile_height, tile_width))
+
+    labels = np.zeros((height, width), dtype=np.int32)
+
+    def segment(box):
+        return _segment_tile(
+            image_np_rgb, labels, box, halo, base_hsv_color, (tol_h, tol_s, tol_v),
+            erosion_iterations, dilation_iterations, connectivity, engine
+        )
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        tile_stats = list(pool.map(segment, boxes))
+
+        # Give every tile its own range of provisional labels
+        offsets = np.cumsum([0] + [len(stats[0]) for stats in tile_stats[:-1]]).tolist()
+        list(pool.map(_offset_tile, [labels] * len(boxes), boxes, offsets))
+
+    return _merge_tiles(labels, boxes, tile_stats, connectivity, memory_budget)
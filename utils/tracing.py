@@ -0,0 +1,122 @@
+import json
+import logging
+
+# Trace levels: each one also records the events of the levels below it
+OFF = 0
+SUMMARY = 1   # one event per search (start, result)
+STEPS = 2     # one event per expanded hold
+NEIGHBORS = 3 # the candidate holds of every expansion
+
+LEVEL_NAMES = {OFF: "off", SUMMARY: "summary", STEPS: "steps", NEIGHBORS: "neighbors"}
+
+# Field names of the events recorded by the route search, used by dump
+# to store every event as a compact list of values
+EVENT_FIELDS = {
+    "search": ("sources", "goal", "heuristic"),
+    "expand": ("hold", "cost", "estimate"),
+    "neighbors": ("hold", "candidates", "improved"),
+    "spur": ("position", "sources", "banned"),
+    "found": ("length", "holds", "expanded"),
+    "exhausted": ("expanded",),
+}
+
+logger = logging.getLogger("querobeta.routing")
+
+class SearchTrace:
+    """
+    Records the events of route searches for offline debugging.
+    Searches take an optional trace and only check it once per search to
+    decide which events to build, so passing None (the default) costs
+    nothing. Events above `level` are dropped, and only one in every
+    `sample_every` STEPS/NEIGHBORS events is kept.
+    """
+
+    def __init__(self, level=STEPS, sample_every=1, callback=None, max_events=100_000):
+        """
+        Args:
+            level (int): Most detailed level recorded (SUMMARY, STEPS or NEIGHBORS).
+            sample_every (int): Keep one in every N detailed events.
+            callback (callable, optional): Called as callback(name, fields) for
+                                           every kept event (see log_event).
+            max_events (int): Maximum number of events kept in memory; the
+                              callback still sees the later ones.
+        """
+        if sample_every < 1:
+            raise ValueError("A amostragem do trace deve ser de pelo menos 1 evento.")
+        self.level = level
+        self.sample_every = sample_every
+        self.callback = callback
+        self.max_events = max_events
+        self.events = []
+        self.dropped = 0
+        self._seen = 0
+
+    def enabled(self, level):
+        return OFF < level <= self.level
+
+    def record(self, level, name, *values):
+        """
+        Records one event. values follow EVENT_FIELDS[name].
+        """
+        if not self.enabled(level):
+            return
+        if level > SUMMARY:
+            self._seen += 1
+            if (self._seen - 1) % self.sample_every:
+                return
+        if len(self.events) < self.max_events:
+            self.events.append((name, values))
+        else:
+            self.dropped += 1
+        if self.callback is not None:
+            self.callback(name, dict(zip(EVENT_FIELDS.get(name, ()), values)))
+
+    def clear(self):
+        self.events = []
+        self.dropped = 0
+        self._seen = 0
+
+    def to_dict(self):
+        """
+        Compact form of the trace: the field names once per event type and
+        every event as [name, value, ...].
+        """
+        names = {name for name, _ in self.events}
+        return {
+            "level": LEVEL_NAMES.get(self.level, self.level),
+            "sample_every": self.sample_every,
+            "dropped": self.dropped,
+            "fields": {name: list(EVENT_FIELDS.get(name, ())) for name in sorted(names)},
+            "events": [[name, *(_plain(v) for v in values)] for name, values in self.events],
+        }
+
+    def dump(self, file):
+        """
+        Writes the compact trace as JSON.
+        Args:
+            file (str or file object): Path or open text file.
+        """
+        if isinstance(file, str):
+            with open(file, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, separators=(",", ":"))
+        else:
+            json.dump(self.to_dict(), file, separators=(",", ":"))
+
+    def __len__(self):
+        return len(self.events)
+
+def _plain(value):
+    # NumPy arrays and scalars are stored as plain JSON values, floats rounded
+    if hasattr(value, "tolist"):
+        value = value.tolist()
+    if isinstance(value, float):
+        return round(value, 3)
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+def log_event(name, fields):
+    """
+    SearchTrace callback that sends the events to the routing logger (DEBUG).
+    """
+    logger.debug("%s %s", name, fields)